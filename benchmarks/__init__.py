@@ -0,0 +1,8 @@
+"""
+Бенчмарки производительности.
+
+Запуск из корня проекта, например:
+    python -m benchmarks.bench_cart_backends
+
+Каждый бенчмарк работает в отдельной базе (bench_<NAME>), а не в рабочей.
+"""
@@ -0,0 +1,85 @@
+"""
+Личный кабинет оптового покупателя (по умолчанию 10000 заказов): прежняя
+загрузка всех заказов пользователя с агрегацией истории для шапки против
+одной страницы по курсору и строки UserOrderStats. Последние строки -
+HTTP-запрос /users/account/: первая страница и страница из середины истории.
+
+    python -m benchmarks.bench_account_history
+    BENCH_ACCOUNT_ORDERS=50000 python -m benchmarks.bench_account_history
+"""
+import os
+from decimal import Decimal
+
+from benchmarks.utils import count_queries, measure, print_table, setup_django, summarize
+
+ORDERS = int(os.getenv('BENCH_ACCOUNT_ORDERS', 10000))
+REPEAT = 20
+
+
+def build_data():
+    from orders.models import Order
+    from orders.stats import rebuild
+    from users.models import User
+
+    user = User.objects.create_user(username='wholesale', password='bench')
+    Order.objects.bulk_create([
+        Order(user=user, total_price=Decimal('120.00')) for _ in range(ORDERS)
+    ], batch_size=5000)
+    rebuild([user.id])
+    return user
+
+
+def main():
+    setup_django()
+
+    from django.db.models import Count, Max, Sum
+    from django.test import Client
+
+    from orders.models import Order, UserOrderStats
+    from users.views import OrderHistoryPagination
+
+    user = build_data()
+    history = Order.objects.filter(user=user)
+
+    def old():
+        orders = list(history.order_by('-created_at'))
+        header = history.aggregate(count=Count('id'), spent=Sum('total_price'),
+                                   last=Max('created_at'))
+        return orders, header
+
+    def new():
+        orders = list(history.order_by(*OrderHistoryPagination.ordering)
+                      .only('id', 'status', 'total_price', 'created_at')
+                      [:OrderHistoryPagination.page_size])
+        return orders, UserOrderStats.objects.get(user=user)
+
+    rows = []
+    for label, fn in (('all orders + aggregate', old), ('cursor page + stats row', new)):
+        with count_queries() as counter:
+            fn()
+        stats = summarize(measure(fn, REPEAT))
+        rows.append((label, ORDERS, counter.total, stats['p50'], stats['p99']))
+
+    client = Client()
+    client.force_login(user)
+    first = client.get('/users/account/')
+    deep_url = first.context['next_page_url']
+    for _ in range(ORDERS // OrderHistoryPagination.page_size // 2):
+        deep_url = client.get(deep_url).context['next_page_url']
+
+    for label, url in (('GET /users/account/', '/users/account/'),
+                       ('GET /users/account/ (middle page)', deep_url)):
+        def page(url=url):
+            assert client.get(url).status_code == 200
+
+        page()
+        with count_queries() as counter:
+            page()
+        stats = summarize(measure(page, REPEAT))
+        rows.append((label, OrderHistoryPagination.page_size, counter.total, stats['p50'],
+                     stats['p99']))
+    print_table(('path', 'orders', 'queries', 'p50 ms', 'p99 ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Сравнение бэкендов корзины: задержка add/update/remove и число записей в БД
+на запрос для корзин из 1, 20 и 100 строк.
+
+    python -m benchmarks.bench_cart_backends
+"""
+import contextlib
+import io
+
+from benchmarks.utils import count_queries, measure, print_table, setup_django, summarize
+
+BACKENDS = [
+    'orders.cart_backends.SessionCartBackend',
+    'orders.cart_backends.CacheCartBackend',
+    'orders.cart_backends.DatabaseCartBackend',
+]
+CART_SIZES = (1, 20, 100)
+REPEAT = 50
+
+
+def create_catalog(size):
+    from products.models import Category, Product
+
+    category = Category.objects.create(name='Bench', slug='bench')
+    return Product.objects.bulk_create([
+        Product(name=f'Bench {i}', slug=f'bench-{i}', category=category,
+                description='', price='9.99', stock=1_000_000)
+        for i in range(size)
+    ])
+
+
+def run_operation(client, url, data):
+    with count_queries() as counter:
+        client.post(url, data)
+    return counter.writes
+
+
+def bench_backend(backend, products, cart_size):
+    from django.test import Client, override_settings
+
+    with override_settings(CART_BACKEND=backend):
+        client = Client()
+        for product in products[:cart_size]:
+            client.post(f'/orders/cart/add/{product.id}/', {'quantity': 1})
+
+        target = products[cart_size]
+        operations = {
+            'add': (f'/orders/cart/add/{target.id}/', {'quantity': 1}),
+            'update': (f'/orders/cart/update/{target.id}/', {'quantity': 2}),
+            'remove': (f'/orders/cart/remove/{target.id}/', {}),
+        }
+        rows = []
+        for name, (url, data) in operations.items():
+            writes = []
+            samples = measure(lambda: writes.append(run_operation(client, url, data)), REPEAT)
+            stats = summarize(samples)
+            rows.append((backend.rsplit('.', 1)[1], cart_size, name,
+                         stats['p50'], stats['p99'], sum(writes) / len(writes)))
+        return rows
+
+
+def main():
+    setup_django()
+    products = create_catalog(max(CART_SIZES) + 1)
+
+    rows = []
+    with contextlib.redirect_stderr(io.StringIO()):
+        for backend in BACKENDS:
+            for cart_size in CART_SIZES:
+                rows.extend(bench_backend(backend, products, cart_size))
+
+    print_table(('backend', 'lines', 'op', 'p50 ms', 'p99 ms', 'db writes/req'), rows)
+
+
+if __name__ == '__main__':
+    main()
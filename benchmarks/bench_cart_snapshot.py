@@ -0,0 +1,95 @@
+"""
+Загрузка товаров корзины: прежний проход по всем колонкам Product (включая
+description) на каждую итерацию против снимка get_lines() с проекцией полей
+и присоединённой категорией. Плюс время и число запросов к товарам для
+страниц корзины и оформления заказа.
+
+    python -m benchmarks.bench_cart_snapshot
+"""
+import uuid
+from decimal import Decimal
+
+from benchmarks.utils import count_queries, measure, print_table, setup_django, summarize
+
+CART_SIZES = (10, 100)
+REPEAT = 200
+
+
+def legacy_iteration(cart):
+    """Прежний Cart.__iter__: новый запрос всех колонок на каждую итерацию."""
+    from products.models import Product
+
+    products = Product.objects.filter(id__in=cart.cart.keys())
+    return [
+        (product, Decimal(cart.cart[str(product.id)]['price']))
+        for product in products
+    ]
+
+
+def build_client(size, user):
+    from django.conf import settings
+    from django.test import Client
+
+    from products.models import Category, Product
+
+    category, _ = Category.objects.get_or_create(name='Bench', slug='bench')
+    products = Product.objects.bulk_create([
+        Product(name=f's{size}-{i}', slug=f's{size}-{i}', category=category,
+                description='Lorem ipsum ' * 200, price=Decimal('3.49'), stock=1000)
+        for i in range(size)
+    ])
+    client = Client()
+    client.force_login(user)
+    session = client.session
+    session[settings.CART_SESSION_ID] = {
+        str(product.id): {'quantity': 1, 'price': str(product.price)} for product in products
+    }
+    session[settings.CART_KEY_SESSION_ID] = uuid.uuid4().hex
+    session.save()
+    return client
+
+
+def product_queries(counter):
+    return sum(1 for sql in counter.queries if 'FROM "products_product"' in sql)
+
+
+def main():
+    setup_django()
+
+    from django.test import RequestFactory
+
+    from orders.cart import Cart
+    from users.models import User
+
+    user = User.objects.create_user(username='bench', password='bench')
+
+    loader_rows = []
+    page_rows = []
+    for size in CART_SIZES:
+        client = build_client(size, user)
+        request = RequestFactory().get('/')
+        request.session = client.session
+
+        def snapshot():
+            return Cart(request).get_lines()
+
+        # Шаблон оформления заказа и view проходили по корзине дважды
+        legacy = summarize(measure(lambda: [legacy_iteration(Cart(request)) for _ in range(2)],
+                                   REPEAT))
+        current = summarize(measure(snapshot, REPEAT))
+        loader_rows.append((size, 'legacy x2', legacy['p50'], legacy['p99']))
+        loader_rows.append((size, 'snapshot', current['p50'], current['p99']))
+
+        for path in ('/orders/cart/', '/orders/checkout/'):
+            with count_queries() as counter:
+                client.get(path)
+            stats = summarize(measure(lambda: client.get(path), REPEAT))
+            page_rows.append((size, path, product_queries(counter), stats['p50'], stats['p99']))
+
+    print_table(('lines', 'loader', 'p50 ms', 'p99 ms'), loader_rows)
+    print()
+    print_table(('lines', 'page', 'product queries', 'p50 ms', 'p99 ms'), page_rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Стоимость чтения счётчиков корзины (len(cart) + get_total_price()) на корзинах
+из сотен строк: полный пересчёт против инкрементальных значений.
+
+    python -m benchmarks.bench_cart_totals
+"""
+import contextlib
+import io
+from decimal import Decimal
+
+from benchmarks.utils import measure, print_table, setup_django, summarize
+
+CART_SIZES = (100, 300, 1000)
+REPEAT = 2000
+
+
+def full_recalculation(cart):
+    """Прежняя реализация: каждый вызов проходит по всей корзине."""
+    count = sum(item['quantity'] for item in cart.cart.values())
+    total = sum(Decimal(item['price']) * item['quantity'] for item in cart.cart.values())
+    return count, total
+
+
+def build_cart(size):
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.test import RequestFactory
+
+    from orders.cart import Cart
+    from products.models import Category, Product
+
+    category, _ = Category.objects.get_or_create(name='Bench', slug='bench')
+    products = Product.objects.bulk_create([
+        Product(name=f'p{size}-{i}', slug=f'p{size}-{i}', category=category,
+                description='', price=Decimal('3.49'), stock=1000)
+        for i in range(size)
+    ])
+
+    request = RequestFactory().get('/')
+    request.session = SessionStore()
+    cart = Cart(request)
+    for product in products:
+        cart.add(product, quantity=2)
+    return cart
+
+
+def main():
+    setup_django()
+
+    rows = []
+    for size in CART_SIZES:
+        with contextlib.redirect_stderr(io.StringIO()):
+            cart = build_cart(size)
+        before = summarize(measure(lambda: full_recalculation(cart), REPEAT))
+        after = summarize(measure(lambda: (len(cart), cart.get_total_price()), REPEAT))
+        rows.append((size, 'recalculate', before['p50'] * 1000, before['p99'] * 1000))
+        rows.append((size, 'incremental', after['p50'] * 1000, after['p99'] * 1000))
+
+    print_table(('lines', 'mode', 'p50 us', 'p99 us'), rows)
+
+
+if __name__ == '__main__':
+    main()
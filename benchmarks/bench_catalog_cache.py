@@ -0,0 +1,82 @@
+"""
+Пропускная способность страниц и API каталога с холодным и тёплым кэшем
+ответов (products.cache). Холодный кэш очищается перед каждым запросом
+(вместе с историей троттлинга DRF, иначе API упрётся в лимит), тёплый -
+ответ уже лежит в кэше. Последняя колонка - повторный запрос с
+If-None-Match (304 без тела).
+
+    python -m benchmarks.bench_catalog_cache
+"""
+from benchmarks.utils import count_queries, measure, print_table, setup_django, summarize
+
+PRODUCTS = 200
+REVIEWS_PER_PRODUCT = 3
+REPEAT = 200
+
+
+def build_catalog():
+    from products.models import Category, Product
+    from reviews.models import Review
+    from users.models import User
+
+    hops = Category.objects.create(name='Hops', slug='hops')
+    Category.objects.create(name='Citrus', slug='citrus', parent=hops)
+    products = Product.objects.bulk_create([
+        Product(name=f'Hop {i}', slug=f'hop-{i}', category=hops,
+                description='Bright citrus hop', price='1.00', stock=100)
+        for i in range(PRODUCTS)
+    ])
+    users = [User.objects.create_user(username=f'bench{i}', password='x')
+             for i in range(REVIEWS_PER_PRODUCT)]
+    for product in products[:12]:
+        for i, user in enumerate(users):
+            Review.objects.create(product=product, user=user, rating=i + 3, text='ok')
+    return products
+
+
+def main():
+    setup_django()
+
+    from django.test import Client
+
+    from django.core.cache import cache
+
+    products = build_catalog()
+    client = Client()
+    urls = [
+        ('home', '/'),
+        ('product list', '/products/'),
+        ('product detail', f'/product/{products[0].slug}/'),
+        ('api list', '/api/products/'),
+        ('api detail', f'/api/products/{products[0].id}/'),
+    ]
+
+    def cold(url):
+        cache.clear()
+        return client.get(url)
+
+    rows = []
+    for label, url in urls:
+        with count_queries() as cold_queries:
+            cold(url)
+        with count_queries() as warm_queries:
+            etag = client.get(url)['ETag']
+
+        cold_stats = summarize(measure(lambda: cold(url), REPEAT))
+        warm_stats = summarize(measure(lambda: client.get(url), REPEAT))
+        not_modified = summarize(
+            measure(lambda: client.get(url, HTTP_IF_NONE_MATCH=etag), REPEAT)
+        )
+        rows.append((
+            label, cold_queries.total, warm_queries.total,
+            round(1000 / cold_stats['mean']), round(1000 / warm_stats['mean']),
+            round(1000 / not_modified['mean']),
+        ))
+    print_table(
+        ('endpoint', 'cold queries', 'warm queries', 'cold req/s', 'warm req/s', '304 req/s'),
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
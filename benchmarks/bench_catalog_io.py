@@ -0,0 +1,148 @@
+"""
+Потоковый импорт и экспорт каталога (по умолчанию 1M товаров) через
+products.catalog_io: первичная загрузка, выгрузка slug,price,stock и
+синхронизация цен и остатков по этой выгрузке, когда меняется 10% и 100%
+товаров, - с COPY (PostgreSQL) и через bulk_create/bulk_update. Для
+сравнения - построчный Product.save() на небольшой выборке, пересчитанный
+на полный объём. maxrss - пик памяти процесса после шага.
+
+    python -m benchmarks.bench_catalog_io
+    BENCH_CATALOG_SIZE=100000 python -m benchmarks.bench_catalog_io
+"""
+import csv
+import functools
+import os
+import random
+import resource
+import tempfile
+import time
+
+from benchmarks.utils import count_queries, print_table, setup_django
+
+CATALOG_SIZE = int(os.getenv('BENCH_CATALOG_SIZE', 1_000_000))
+# bulk_update строит CASE WHEN на каждую строку, поэтому без COPY - выборка поменьше
+BULK_SIZE = min(CATALOG_SIZE, int(os.getenv('BENCH_BULK_SIZE', 50_000)))
+PER_ROW_SIZE = 2000
+CATEGORIES = 20
+
+
+def write_catalog(path, size, rng):
+    """Полный каталог: все колонки, slug product-0 ... product-(size - 1)."""
+    with open(path, 'w', newline='', encoding='utf-8') as stream:
+        writer = csv.writer(stream)
+        writer.writerow(('slug', 'name', 'category', 'description', 'price', 'stock'))
+        for i in range(size):
+            writer.writerow((f'product-{i}', f'Product {i}', f'cat-{i % CATEGORIES}',
+                             'Imported product', f'{rng.randint(100, 20000) / 100:.2f}',
+                             rng.randint(0, 100)))
+
+
+def write_sync(export_path, path, changed, rng):
+    """Синхронизация по выгрузке slug,price,stock: у доли changed товаров новые цена и остаток."""
+    with open(export_path, newline='', encoding='utf-8') as source, \
+            open(path, 'w', newline='', encoding='utf-8') as stream:
+        reader = csv.reader(source)
+        writer = csv.writer(stream)
+        writer.writerow(next(reader))
+        for slug, price, stock in reader:
+            if rng.random() < changed:
+                price = f'{rng.randint(100, 20000) / 100:.2f}'
+                stock = int(stock) + 1
+            writer.writerow((slug, price, stock))
+
+
+def maxrss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+
+def clear_products():
+    from django.db import connection
+
+    from products.models import Product
+
+    if connection.vendor == 'postgresql':
+        # delete() собирал бы каскады по миллиону товаров в памяти
+        with connection.cursor() as cursor:
+            cursor.execute('TRUNCATE products_product CASCADE')
+    else:
+        Product.objects.all().delete()
+
+
+def timed_import(path, use_copy):
+    from products.catalog_io import import_catalog
+
+    with open(path, newline='', encoding='utf-8') as stream, count_queries() as counter:
+        start = time.perf_counter()
+        result = import_catalog(stream, 'csv', use_copy=use_copy)
+        seconds = time.perf_counter() - start
+    return result, counter.total, seconds
+
+
+def per_row_sync(path, limit):
+    """Как раньше через админку/API: чтение и save() на каждую строку."""
+    from products.models import Product
+
+    with open(path, newline='', encoding='utf-8') as stream:
+        reader = csv.DictReader(stream)
+        start = time.perf_counter()
+        for row, _ in zip(reader, range(limit)):
+            product = Product.objects.get(slug=row['slug'])
+            product.price = row['price']
+            product.stock = row['stock']
+            product.save()
+        return time.perf_counter() - start
+
+
+def timed_export(path, fields):
+    from products.catalog_io import export_catalog
+
+    with open(path, 'w', newline='', encoding='utf-8') as stream, count_queries() as counter:
+        start = time.perf_counter()
+        count = export_catalog(stream, 'csv', fields)
+        seconds = time.perf_counter() - start
+    return count, counter.total, seconds
+
+
+def main():
+    setup_django()
+
+    from django.db import connection
+
+    from products.models import Category
+
+    for i in range(CATEGORIES):
+        Category.objects.create(name=f'Category {i}', slug=f'cat-{i}')
+    rng = random.Random(42)
+    workdir = tempfile.mkdtemp(prefix='bench_catalog_io_')
+    path = functools.partial(os.path.join, workdir)
+
+    rows = []
+    modes = [('bulk_create/bulk_update', False, BULK_SIZE)]
+    if connection.vendor == 'postgresql':
+        modes.insert(0, ('COPY', True, CATALOG_SIZE))
+    for label, use_copy, size in modes:
+        clear_products()
+        write_catalog(path('catalog.csv'), size, rng)
+        result, queries, seconds = timed_import(path('catalog.csv'), use_copy)
+        rows.append((f'load {size}', label, result.created, queries, round(seconds, 2),
+                     maxrss_mb()))
+
+        count, queries, seconds = timed_export(path('export.csv'), ('slug', 'price', 'stock'))
+        rows.append((f'export {size}', 'iterator()', count, queries, round(seconds, 2),
+                     maxrss_mb()))
+
+        for changed in (0.1, 1):
+            write_sync(path('export.csv'), path('sync.csv'), changed, rng)
+            result, queries, seconds = timed_import(path('sync.csv'), use_copy)
+            rows.append((f'price/stock sync {size}, {changed:.0%} changed', label,
+                         result.updated, queries, round(seconds, 2), maxrss_mb()))
+
+    seconds = per_row_sync(path('sync.csv'), PER_ROW_SIZE)
+    rows.append((f'price/stock sync {CATALOG_SIZE}', f'save() per row (est. from '
+                 f'{PER_ROW_SIZE})', '-', CATALOG_SIZE * 2,
+                 round(seconds * CATALOG_SIZE / PER_ROW_SIZE, 2), maxrss_mb()))
+    print_table(('step', 'mode', 'rows', 'queries', 'seconds', 'maxrss MB'), rows)
+
+
+if __name__ == '__main__':
+    main()
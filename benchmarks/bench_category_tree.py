@@ -0,0 +1,89 @@
+"""
+Товары категории вместе с подкатегориями: обход списка смежности (запрос
+на каждый уровень дерева, затем category_id IN (...)) против одного запроса
+по материализованному пути. Плюс список категорий из БД против дерева
+в памяти процесса.
+
+    python -m benchmarks.bench_category_tree
+"""
+from benchmarks.utils import count_queries, measure, print_table, setup_django, summarize
+
+FANOUT = 6
+DEPTH = 4
+PRODUCTS_PER_CATEGORY = 20
+REPEAT = 200
+
+
+def build_tree():
+    from products.models import Category, Product
+
+    root = Category.objects.create(name='Root', slug='root')
+    level = [root]
+    for depth in range(1, DEPTH):
+        next_level = []
+        for parent in level:
+            for i in range(FANOUT):
+                slug = f'{parent.slug}-{i}'
+                next_level.append(Category.objects.create(name=slug, slug=slug, parent=parent))
+        level = next_level
+
+    Product.objects.bulk_create([
+        Product(name=f'{category.slug} {i}', slug=f'{category.slug}-p{i}', category=category,
+                description='', price='1.00', stock=1)
+        for category in Category.objects.all()
+        for i in range(PRODUCTS_PER_CATEGORY)
+    ])
+    return root
+
+
+def adjacency_page(category):
+    """Прежний способ: спуск по parent уровень за уровнем."""
+    from products.models import Category, Product
+
+    ids, frontier = [category.id], [category.id]
+    while frontier:
+        frontier = list(
+            Category.objects.filter(parent_id__in=frontier).values_list('id', flat=True)
+        )
+        ids.extend(frontier)
+    queryset = Product.objects.filter(is_active=True, category_id__in=ids)
+    return queryset.count(), list(queryset[:12])
+
+
+def path_page(category):
+    from products.models import Product
+
+    queryset = Product.objects.filter(is_active=True, category__path__startswith=category.path)
+    return queryset.count(), list(queryset[:12])
+
+
+def main():
+    setup_django()
+
+    from products.category_tree import get_category_tree
+    from products.models import Category
+
+    root = build_tree()
+    subtree = Category.objects.get(slug='root-0')
+
+    rows = []
+    for label, category in (('root', root), ('subtree', subtree)):
+        for mode, page in (('adjacency', adjacency_page), ('path', path_page)):
+            with count_queries() as counter:
+                page(category)
+            stats = summarize(measure(lambda: page(category), REPEAT))
+            rows.append((label, mode, counter.total, stats['p50'], stats['p99']))
+    print_table(('category', 'mode', 'queries', 'p50 ms', 'p99 ms'), rows)
+
+    get_category_tree()
+    from_db = summarize(measure(lambda: list(Category.objects.all()), REPEAT))
+    cached = summarize(measure(lambda: get_category_tree().categories, REPEAT))
+    print()
+    print_table(('categories', 'p50 ms', 'p99 ms'), [
+        ('Category.objects.all()', from_db['p50'], from_db['p99']),
+        ('get_category_tree()', cached['p50'], cached['p99']),
+    ])
+
+
+if __name__ == '__main__':
+    main()
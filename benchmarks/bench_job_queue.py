@@ -0,0 +1,115 @@
+"""
+Очередь задач (jobs): пропускная способность run_pool() при разном числе
+процессов и потоков на BENCH_JOBS задачах (по умолчанию 2000) трёх видов:
+пустой обработчик (накладные расходы claim/run), обработчик с ожиданием
+BENCH_JOBS_IO_MS миллисекунд (как SMTP) и настоящая задача orders.record_sales.
+Отдельно - работа, которую оформление заказа делало в запросе (дневные
+сводки и письмо), против одного INSERT двух задач.
+
+Параллельные воркеры требуют SKIP LOCKED, поэтому пул больше 1x1 запускается
+только на PostgreSQL.
+
+    python -m benchmarks.bench_job_queue
+    BENCH_JOBS=10000 BENCH_JOBS_IO_MS=20 python -m benchmarks.bench_job_queue
+"""
+import os
+import time
+
+from benchmarks.utils import measure, print_table, setup_django, summarize
+
+JOBS = int(os.getenv('BENCH_JOBS', 2000))
+IO_MS = float(os.getenv('BENCH_JOBS_IO_MS', 5))
+POOLS = ((1, 1), (1, 4), (1, 16), (4, 1), (4, 4))
+REPEAT = 200
+
+
+def register_handlers():
+    from jobs.queue import task
+
+    task('bench.noop')(lambda **payload: None)
+    task('bench.io')(lambda **payload: time.sleep(IO_MS / 1000))
+
+
+def build_order():
+    from decimal import Decimal
+
+    from orders.models import Order, OrderItem
+    from products.models import Category, Product
+    from users.models import User
+
+    category = Category.objects.create(name='Bench', slug='bench')
+    products = Product.objects.bulk_create([
+        Product(name=f'p{i}', slug=f'p{i}', category=category, description='',
+                price=Decimal('2.50'), stock=1000)
+        for i in range(10)
+    ])
+    user = User.objects.create_user(username='bench', email='bench@example.com')
+    order = Order.objects.create(user=user, total_price=Decimal('25.00'))
+    items = OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, price=product.price, quantity=1)
+        for product in products
+    ])
+    return order, items
+
+
+def bench_pool(name, payload, processes, threads):
+    from jobs.queue import enqueue_many, new_job
+    from jobs.worker import run_pool
+
+    enqueue_many([new_job(name, payload) for _ in range(JOBS)])
+    start = time.perf_counter()
+    processed = run_pool(processes, threads, batch_size=20, burst=True)
+    seconds = time.perf_counter() - start
+    assert processed == JOBS, processed
+    return seconds
+
+
+def main():
+    setup_django()
+    register_handlers()
+
+    from django.db import connection, transaction
+
+    from jobs.queue import enqueue_many, new_job
+    from orders import sales, tasks
+    from orders.models import DailyProductSales, DailySales
+
+    order, items = build_order()
+    contribution = sales.order_contribution(order, items)
+
+    def inline():
+        with transaction.atomic():
+            sales.record_contribution(**contribution)
+            tasks.send_order_confirmation(order.id)
+
+    def enqueue():
+        with transaction.atomic():
+            enqueue_many([new_job(tasks.RECORD_SALES, contribution),
+                          new_job(tasks.SEND_ORDER_CONFIRMATION, {'order_id': order.id})])
+
+    rows = []
+    for label, fn in (('sales rollups + email inline', inline),
+                      ('enqueue 2 jobs', enqueue)):
+        stats = summarize(measure(fn, REPEAT))
+        rows.append((label, stats['p50'], stats['p99']))
+    print_table(('checkout follow-up work', 'p50 ms', 'p99 ms'), rows)
+    print()
+
+    from jobs.models import Job
+
+    Job.objects.all().delete()
+    pools = POOLS if connection.vendor == 'postgresql' else POOLS[:1]
+    cases = (('bench.noop', {}), ('bench.io', {}), (tasks.RECORD_SALES, contribution))
+    rows = []
+    for name, payload in cases:
+        for processes, threads in pools:
+            seconds = bench_pool(name, payload, processes, threads)
+            rows.append((name, f'{processes}x{threads}', JOBS, round(seconds * 1000),
+                         round(JOBS / seconds)))
+        DailySales.objects.all().delete()
+        DailyProductSales.objects.all().delete()
+    print_table(('job', 'processes x threads', 'jobs', 'total ms', 'jobs/s'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Накладные расходы на запрос при просмотре каталога авторизованным
+пользователем: со старым CartTransferMiddleware и без него (перенос корзины
+теперь выполняется один раз по сигналу user_logged_in).
+
+    python -m benchmarks.bench_login_merge
+"""
+from django.utils.deprecation import MiddlewareMixin
+
+from benchmarks.utils import count_queries, measure, print_table, setup_django, summarize
+
+REPEAT = 300
+
+
+class LegacyCartTransferMiddleware(MiddlewareMixin):
+    """Проверка из прежнего CartTransferMiddleware, выполнявшаяся на каждом запросе."""
+
+    def process_request(self, request):
+        if request.user.is_authenticated:
+            for key in ['cart_before_login', 'saved_cart', 'cart_backup']:
+                if key in request.session:
+                    request.session.pop(key)
+                    break
+        return None
+
+
+def create_catalog():
+    from products.models import Category, Product
+    from users.models import User
+
+    category = Category.objects.create(name='Bench', slug='bench')
+    products = Product.objects.bulk_create([
+        Product(name=f'Bench {i}', slug=f'bench-{i}', category=category,
+                description='', price='9.99', stock=100)
+        for i in range(20)
+    ])
+    user = User.objects.create_user(username='bench', password='bench')
+    return products, user
+
+
+def browse(products, user, middleware):
+    from django.conf import settings
+    from django.test import Client, override_settings
+
+    with override_settings(MIDDLEWARE=middleware):
+        client = Client()
+        client.force_login(user)
+        urls = ['/', '/products/'] + [f'/product/{p.slug}/' for p in products]
+        client.get(urls[0])
+
+        calls = iter(range(REPEAT * 10))
+        samples = measure(lambda: client.get(urls[next(calls) % len(urls)]), REPEAT)
+        with count_queries() as counter:
+            client.get(urls[1])
+    label = 'with CartTransferMiddleware' if middleware != settings.MIDDLEWARE else 'without'
+    stats = summarize(samples)
+    return label, stats['p50'], stats['p99'], stats['mean'], counter.total
+
+
+def main():
+    from django.conf import settings
+
+    setup_django()
+    products, user = create_catalog()
+    legacy = list(settings.MIDDLEWARE) + [
+        'benchmarks.bench_login_merge.LegacyCartTransferMiddleware',
+    ]
+    rows = [
+        browse(products, user, legacy),
+        browse(products, user, list(settings.MIDDLEWARE)),
+    ]
+    print_table(('middleware', 'p50 ms', 'p99 ms', 'mean ms', 'queries (list page)'), rows)
+
+
+if __name__ == '__main__':
+    main()
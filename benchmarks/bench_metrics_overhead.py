@@ -0,0 +1,58 @@
+"""
+Накладные расходы инструментирования: время запроса с MetricsMiddleware и без
+неё, а также стоимость одиночных Histogram.observe() и Counter.inc().
+
+    python -m benchmarks.bench_metrics_overhead
+"""
+from benchmarks.utils import measure, print_table, setup_django, summarize
+
+REPEAT = 500
+MICRO_REPEAT = 20000
+
+
+def bench_requests(client, path, middleware):
+    from django.test import override_settings
+
+    with override_settings(MIDDLEWARE=middleware):
+        client.get(path)
+        return summarize(measure(lambda: client.get(path), REPEAT))
+
+
+def main():
+    setup_django()
+
+    from django.conf import settings
+    from django.test import Client
+
+    from config import metrics
+    from products.models import Category, Product
+
+    category = Category.objects.create(name='Hops', slug='hops')
+    product = Product.objects.create(
+        name='Cascade', slug='cascade', price='2.50', category=category, stock=100
+    )
+
+    with_metrics = list(settings.MIDDLEWARE)
+    without_metrics = [m for m in with_metrics if m != 'config.metrics.MetricsMiddleware']
+    client = Client()
+
+    rows = []
+    for path in ('/', f'/product/{product.slug}/'):
+        for label, middleware in (('without', without_metrics), ('with', with_metrics)):
+            stats = bench_requests(client, path, middleware)
+            rows.append((path, label, stats['p50'], stats['p99'], stats['mean']))
+    print_table(('path', 'metrics', 'p50 ms', 'p99 ms', 'mean ms'), rows)
+
+    observe = summarize(measure(
+        lambda: metrics.REQUEST_LATENCY.observe(0.012, 'home', 'GET'), MICRO_REPEAT
+    ))
+    inc = summarize(measure(lambda: metrics.CART_OPERATIONS.inc('add', 'success'), MICRO_REPEAT))
+    print()
+    print_table(('call', 'p50 us', 'mean us'), [
+        ('Histogram.observe', observe['p50'] * 1000, observe['mean'] * 1000),
+        ('Counter.inc', inc['p50'] * 1000, inc['mean'] * 1000),
+    ])
+
+
+if __name__ == '__main__':
+    main()
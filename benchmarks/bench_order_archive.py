@@ -0,0 +1,208 @@
+"""
+Архивация заказов: размер горячих таблиц orders_order/orders_orderitem с
+индексами и задержка типичных запросов к ним до и после archive_orders
+(завершённые заказы старше 12 месяцев) на BENCH_ARCHIVE_ORDERS заказах
+(по умолчанию 2M) за три года.
+
+Размеры - после VACUUM (место удалённых строк переиспользуется, но файлы не
+сжимаются) и после VACUUM FULL (то, что вернёт pg_repack/VACUUM FULL). Данные
+генерируются одним INSERT ... SELECT generate_series на PostgreSQL; на других
+СУБД - bulk_create меньшего объёма и только задержки.
+
+    python -m benchmarks.bench_order_archive
+    BENCH_ARCHIVE_ORDERS=500000 python -m benchmarks.bench_order_archive
+"""
+import os
+import time
+
+from benchmarks.utils import measure, print_table, setup_django, summarize
+
+ORDERS = int(os.getenv('BENCH_ARCHIVE_ORDERS', 2_000_000))
+FALLBACK_ORDERS = 50_000
+USERS = 1000
+PRODUCTS = 200
+DAYS = 3 * 365
+ARCHIVE_MONTHS = 12
+REPEAT = 50
+
+TABLES = ('orders_order', 'orders_orderitem')
+
+
+def build_data(orders):
+    from django.db import connection
+
+    from products.models import Category, Product
+    from users.models import User
+
+    category = Category.objects.create(name='Bench', slug='bench')
+    Product.objects.bulk_create([
+        Product(name=f'p{i}', slug=f'p{i}', category=category, description='', price='2.50',
+                stock=100)
+        for i in range(PRODUCTS)
+    ])
+    User.objects.bulk_create([User(username=f'u{i}') for i in range(USERS)])
+    if connection.vendor == 'postgresql':
+        generate_postgresql(orders)
+    else:
+        generate_orm(orders)
+
+
+def generate_postgresql(orders):
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        # Старше месяца - почти все доставлены или отменены; свежие - в работе
+        cursor.execute(
+            """
+            INSERT INTO orders_order (user_id, status, total_price, full_name, phone, city,
+                                      address, payment_method, created_at, updated_at, is_paid)
+            SELECT (SELECT min(id) FROM users_user) + i %% %(users)s,
+                   CASE WHEN age < 30 THEN (ARRAY['pending', 'paid', 'shipped'])[1 + i %% 3]
+                        WHEN i %% 50 = 0 THEN 'cancelled'
+                        ELSE 'delivered' END,
+                   2.50 * (1 + i %% 4), 'Bench Customer', '+1 555 0100', 'Springfield',
+                   '742 Evergreen Terrace', 'debit', now() - age * interval '1 day', now(),
+                   age >= 30
+            FROM (SELECT i, i %% %(days)s AS age FROM generate_series(1, %(orders)s) AS i) s
+            """,
+            {'users': USERS, 'days': DAYS, 'orders': orders},
+        )
+        cursor.execute(
+            """
+            INSERT INTO orders_orderitem (order_id, product_id, quantity, price)
+            SELECT o.id, (SELECT min(id) FROM products_product) + (o.id + k) %% %(products)s,
+                   1 + o.id %% 4, 2.50
+            FROM orders_order o, generate_series(1, 2) AS k
+            """,
+            {'products': PRODUCTS},
+        )
+        cursor.execute('ANALYZE orders_order')
+        cursor.execute('ANALYZE orders_orderitem')
+
+
+def generate_orm(orders):
+    from datetime import timedelta
+    from decimal import Decimal
+
+    from django.utils import timezone
+
+    from orders.models import Order, OrderItem
+    from products.models import Product
+    from users.models import User
+
+    users = list(User.objects.values_list('id', flat=True))
+    products = list(Product.objects.values_list('id', flat=True))
+    created = Order.objects.bulk_create([
+        Order(user_id=users[i % USERS], total_price=Decimal('2.50'),
+              status='delivered' if i % DAYS >= 30 else 'pending')
+        for i in range(orders)
+    ], batch_size=5000)
+    now = timezone.now()
+    for i, order in enumerate(created):
+        order.created_at = now - timedelta(days=i % DAYS)
+    Order.objects.bulk_update(created, ['created_at'], batch_size=5000)
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product_id=products[order.id % PRODUCTS], quantity=1,
+                  price=Decimal('2.50'))
+        for order in created
+    ], batch_size=5000)
+
+
+def table_sizes():
+    """{таблица: (данные, индексы)} в МБ."""
+    from django.db import connection
+
+    if connection.vendor != 'postgresql':
+        return {}
+    sizes = {}
+    with connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute('SELECT pg_table_size(%s), pg_indexes_size(%s)', [table, table])
+            sizes[table] = tuple(round(size / 2 ** 20, 1) for size in cursor.fetchone())
+    return sizes
+
+
+def vacuum(full=False):
+    from django.db import connection
+
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(f'VACUUM {"FULL " if full else ""}ANALYZE {table}')
+
+
+def query_cases(user_id):
+    from django.db.models import Count
+
+    from orders.models import Order
+    from users.views import OrderHistoryPagination
+
+    history = OrderHistoryPagination.ordering
+    return [
+        ('admin list: newest 100', lambda: list(Order.objects.order_by('-created_at')[:100])),
+        ('admin list: is_paid=False', lambda: list(
+            Order.objects.filter(is_paid=False).order_by('-created_at')[:100])),
+        ('account: first page', lambda: list(
+            Order.objects.filter(user_id=user_id).order_by(*history)[:20])),
+        ('orders by status', lambda: list(
+            Order.objects.order_by().values('status').annotate(n=Count('id')))),
+        ('COUNT(*)', lambda: Order.objects.count()),
+        ('items of newest 100', lambda: list(Order.objects.order_by('-created_at')
+                                             .prefetch_related('items')[:100])),
+    ]
+
+
+def latencies(cases):
+    results = {}
+    for label, fn in cases:
+        fn()
+        results[label] = summarize(measure(fn, REPEAT))['p50']
+    return results
+
+
+def main():
+    setup_django()
+
+    from django.db import connection
+    from django.db.models import Count
+
+    from orders.archive import archive, months_ago
+    from orders.models import ArchivedOrder, Order
+
+    orders = ORDERS if connection.vendor == 'postgresql' else min(ORDERS, FALLBACK_ORDERS)
+    start = time.perf_counter()
+    build_data(orders)
+    print(f'generated {orders} orders in {time.perf_counter() - start:.1f} s')
+
+    user_id = (Order.objects.order_by().values('user_id').annotate(n=Count('id'))
+               .order_by('-n').values_list('user_id', flat=True).first())
+    cases = query_cases(user_id)
+    vacuum()
+    sizes_before, before = table_sizes(), latencies(cases)
+
+    start = time.perf_counter()
+    archived = archive(months_ago(ARCHIVE_MONTHS), batch_size=5000)
+    archive_seconds = time.perf_counter() - start
+    print(f'archived {archived} orders ({ArchivedOrder.objects.count()} in archive, '
+          f'{Order.objects.count()} left) in {archive_seconds:.1f} s')
+
+    vacuum()
+    sizes_vacuum, after = table_sizes(), latencies(cases)
+    vacuum(full=True)
+    sizes_full, after_full = table_sizes(), latencies(cases)
+
+    if sizes_before:
+        print_table(
+            ('table', 'before data/idx MB', 'VACUUM data/idx MB', 'VACUUM FULL data/idx MB'),
+            [(table, '/'.join(map(str, sizes_before[table])),
+              '/'.join(map(str, sizes_vacuum[table])), '/'.join(map(str, sizes_full[table])))
+             for table in TABLES],
+        )
+        print()
+    print_table(('query (hot table)', 'before p50 ms', 'VACUUM p50 ms', 'VACUUM FULL p50 ms'),
+                [(label, before[label], after[label], after_full[label]) for label, _ in cases])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Сериализация заказов пользователя с 1000 заказов (по 3 позиции): штатный
+OrderSerializer на прежнем queryset (N+1 по позициям и пользователю), он же
+с select_related/prefetch_related и быстрый путь OrderViewSet - строки
+values() и скомпилированный сериализатор (config.serializers). Время
+включает запросы и рендеринг JSON. Последняя строка - HTTP-запрос страницы
+из 100 заказов к /api/orders/.
+
+    python -m benchmarks.bench_order_serialization
+    BENCH_ORDERS=5000 python -m benchmarks.bench_order_serialization
+"""
+import os
+from decimal import Decimal
+
+from benchmarks.utils import count_queries, measure, print_table, setup_django, summarize
+
+ORDERS = int(os.getenv('BENCH_ORDERS', 1000))
+ITEMS_PER_ORDER = 3
+PRODUCTS = 50
+REPEAT = 20
+
+
+def build_data():
+    from orders.models import Order, OrderItem
+    from products.models import Category, Product
+    from users.models import User
+
+    category = Category.objects.create(name='Bench', slug='bench')
+    products = Product.objects.bulk_create([
+        Product(name=f'p{i}', slug=f'p{i}', category=category, description='',
+                price=Decimal('2.50'), stock=100)
+        for i in range(PRODUCTS)
+    ])
+    user = User.objects.create_user(username='bench', password='bench')
+    orders = Order.objects.bulk_create([
+        Order(user=user, total_price=Decimal('7.50'), full_name='Bench User', phone='+1 555',
+              city='Berlin', address='Street 1')
+        for _ in range(ORDERS)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=products[(index + offset) % PRODUCTS], quantity=1,
+                  price=Decimal('2.50'))
+        for index, order in enumerate(orders)
+        for offset in range(ITEMS_PER_ORDER)
+    ], batch_size=5000)
+    return user
+
+
+def main():
+    setup_django()
+
+    from django.db.models import Prefetch
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIClient
+
+    from orders.models import Order, OrderItem
+    from orders.serializers import OrderSerializer, order_reader
+
+    user = build_data()
+    renderer = JSONRenderer()
+    old = Order.objects.filter(user=user).order_by('-created_at', '-id')
+    prefetched = old.select_related('user').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.order_by('id'))
+    )
+
+    paths = [
+        ('ModelSerializer, old queryset',
+         lambda: renderer.render(OrderSerializer(old.all(), many=True).data)),
+        ('ModelSerializer, select/prefetch',
+         lambda: renderer.render(OrderSerializer(prefetched.all(), many=True).data)),
+        ('compiled, values()',
+         lambda: renderer.render(order_reader.serialize(list(order_reader.values(prefetched))))),
+    ]
+    outputs = set()
+    rows = []
+    for label, fn in paths:
+        with count_queries() as counter:
+            outputs.add(fn())
+        stats = summarize(measure(fn, REPEAT))
+        rows.append((label, ORDERS, counter.total, stats['p50'], stats['p99']))
+    assert len(outputs) == 1, 'fast path output differs from OrderSerializer'
+
+    client = APIClient()
+    client.force_authenticate(user)
+
+    def page():
+        response = client.get('/api/orders/', {'cursor': '', 'page_size': 100})
+        assert response.status_code == 200
+
+    page()
+    with count_queries() as counter:
+        page()
+    stats = summarize(measure(page, REPEAT))
+    rows.append(('GET /api/orders/?cursor=&page_size=100', 100, counter.total, stats['p50'],
+                 stats['p99']))
+    print_table(('path', 'orders', 'queries', 'p50 ms', 'p99 ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
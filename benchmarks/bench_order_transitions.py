@@ -0,0 +1,97 @@
+"""
+Смена статуса партии из BENCH_TRANSITION_ORDERS заказов (по умолчанию 10000):
+прежний путь - save() каждого заказа со сводками продаж и покупателя, как
+раньше при правке в админке (замеряется на BENCH_TRANSITION_LEGACY заказах и
+пересчитывается на всю партию), - против orders.transitions.transition():
+проверка, один UPDATE и bulk_create журнала OrderStatusEvent.
+
+    python -m benchmarks.bench_order_transitions
+    BENCH_TRANSITION_ORDERS=50000 python -m benchmarks.bench_order_transitions
+"""
+import os
+import time
+from decimal import Decimal
+
+from benchmarks.utils import count_queries, print_table, setup_django
+
+ORDERS = int(os.getenv('BENCH_TRANSITION_ORDERS', 10000))
+LEGACY_ORDERS = int(os.getenv('BENCH_TRANSITION_LEGACY', 1000))
+CUSTOMERS = 100
+
+
+def build_orders(count, status):
+    from orders import sales
+    from orders.models import Order, OrderItem
+    from orders.stats import rebuild
+    from products.models import Category, Product
+    from users.models import User
+
+    category, _ = Category.objects.get_or_create(name='Bench', slug='bench')
+    products = Product.objects.bulk_create([
+        Product(name=f'{status}-{i}', slug=f'{status}-{i}', category=category,
+                description='', price=Decimal('2.50'), stock=1000)
+        for i in range(10)
+    ])
+    users = User.objects.bulk_create([
+        User(username=f'{status}-{i}') for i in range(CUSTOMERS)
+    ])
+    orders = Order.objects.bulk_create([
+        Order(user=users[i % CUSTOMERS], status=status, total_price=Decimal('7.50'),
+              payment_method='cash')
+        for i in range(count)
+    ], batch_size=5000)
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=products[i % 10], price=Decimal('2.50'), quantity=3)
+        for i, order in enumerate(orders)
+    ], batch_size=5000)
+    sales.rebuild()
+    rebuild([user.id for user in users])
+    return [order.id for order in orders]
+
+
+def legacy_transition(order_ids, status):
+    """Прежний путь: заказ за заказом, как раньше в OrderAdmin.save_model."""
+    from django.db import transaction
+
+    from orders import sales, stats
+    from orders.models import Order
+
+    for order in Order.objects.filter(id__in=order_ids):
+        with transaction.atomic():
+            previous_status, previous_total = order.status, order.total_price
+            sales.subtract(Order.objects.filter(pk=order.pk))
+            order.status = status
+            order.save()
+            stats.record_change(order, previous_status, previous_total)
+            sales.add(Order.objects.filter(pk=order.pk))
+
+
+def timed(fn):
+    with count_queries() as counter:
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+    return elapsed, counter.total
+
+
+def main():
+    setup_django()
+
+    from orders.transitions import transition
+
+    rows = []
+    legacy_ids = build_orders(LEGACY_ORDERS, 'paid')
+    elapsed, queries = timed(lambda: legacy_transition(legacy_ids, 'shipped'))
+    rows.append(('save() per order', 'paid -> shipped', LEGACY_ORDERS, queries,
+                 round(elapsed), round(elapsed * ORDERS / LEGACY_ORDERS)))
+
+    order_ids = build_orders(ORDERS, 'pending')
+    for source, target in (('pending', 'shipped'), ('shipped', 'delivered')):
+        elapsed, queries = timed(lambda: transition(order_ids, target))
+        rows.append(('transition()', f'{source} -> {target}', ORDERS, queries,
+                     round(elapsed), round(elapsed)))
+    print_table(('path', 'transition', 'orders', 'queries', 'ms', f'ms per {ORDERS}'), rows)
+
+
+if __name__ == '__main__':
+    main()
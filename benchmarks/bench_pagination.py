@@ -0,0 +1,109 @@
+"""
+Страница 1 и страница 5000 списков товаров и заказов: PageNumberPagination
+(COUNT(*) + OFFSET) против курсоров KeysetPagination. Курсор страницы 5000 -
+ключ последней строки страницы 4999, ровно то, что клиент получил бы в next.
+
+    python -m benchmarks.bench_pagination
+"""
+from benchmarks.utils import count_queries, measure, print_table, setup_django, summarize
+
+PAGE_SIZE = 10
+DEEP_PAGE = 5000
+ROWS = PAGE_SIZE * DEEP_PAGE + 1000
+BATCH_SIZE = 10_000
+REPEAT = 30
+
+
+def build_data():
+    from django.utils import timezone
+
+    from orders.models import Order
+    from products.models import Category, Product
+    from users.models import User
+
+    category = Category.objects.create(name='Bench', slug='bench')
+    for start in range(0, ROWS, BATCH_SIZE):
+        Product.objects.bulk_create([
+            Product(name=f'p{i}', slug=f'p{i}', category=category, description='',
+                    price='1.00', stock=1)
+            for i in range(start, min(start + BATCH_SIZE, ROWS))
+        ])
+
+    user = User.objects.create_user(username='bench', password='bench')
+    other = User.objects.create_user(username='other', password='other')
+    for start in range(0, ROWS * 2, BATCH_SIZE):
+        Order.objects.bulk_create([
+            Order(user=user if i % 2 else other, total_price='1.00')
+            for i in range(start, min(start + BATCH_SIZE, ROWS * 2))
+        ])
+    # created_at в пачке совпадает до микросекунд - как раз проверка тай-брейка по id
+    Order.objects.filter(user=other).update(created_at=timezone.now())
+    return user
+
+
+def make_request(params):
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    return Request(APIRequestFactory().get('/api/', params))
+
+
+def fetch(paginator_class, queryset, params):
+    paginator = paginator_class()
+    return list(paginator.paginate_queryset(queryset, make_request(params)))
+
+
+def main():
+    setup_django()
+
+    from django.db import connection
+    from rest_framework.pagination import PageNumberPagination
+
+    from config.pagination import HybridPagination
+    from orders.models import Order
+    from orders.views import OrderPagination
+    from products.models import Product
+
+    user = build_data()
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE products_product')
+        cursor.execute('ANALYZE orders_order')
+
+    class Pages(PageNumberPagination):
+        page_size = PAGE_SIZE
+
+    cases = (
+        ('products', Product.objects.filter(is_active=True), HybridPagination),
+        ('orders', Order.objects.filter(user=user), OrderPagination),
+    )
+    rows = []
+    for name, queryset, hybrid in cases:
+        paginator = hybrid()
+        keyset = paginator.keyset
+        ordered = queryset.order_by(*paginator.ordering)
+        boundary = ordered[(DEEP_PAGE - 1) * PAGE_SIZE - 1]
+        deep_cursor = keyset.encode_cursor(boundary, False)
+
+        for page, page_params, cursor_params in (
+            (1, {'page': 1}, {'cursor': '', 'page_size': PAGE_SIZE}),
+            (DEEP_PAGE, {'page': DEEP_PAGE}, {'cursor': deep_cursor, 'page_size': PAGE_SIZE}),
+        ):
+            offset_rows = fetch(Pages, ordered, page_params)
+            cursor_rows = fetch(hybrid, queryset, cursor_params)
+            assert [r.id for r in offset_rows] == [r.id for r in cursor_rows], (name, page)
+
+            for mode, run in (
+                ('page number', lambda: fetch(Pages, ordered, page_params)),
+                ('cursor', lambda: fetch(hybrid, queryset, cursor_params)),
+            ):
+                with count_queries() as counter:
+                    run()
+                stats = summarize(measure(run, REPEAT))
+                rows.append((name, page, mode, counter.total, stats['p50'], stats['p99']))
+
+    print(f'{ROWS} products, {ROWS} orders of the user, page size {PAGE_SIZE}')
+    print_table(('list', 'page', 'mode', 'queries', 'p50 ms', 'p99 ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Фасеты списка товаров на синтетическом каталоге (по умолчанию 200k товаров
+в дереве из ~100 категорий): отдельный COUNT на каждую категорию, диапазон
+цен и наличие против одного запроса products.facets и ответа из кэша.
+
+    python -m benchmarks.bench_product_facets
+    BENCH_CATALOG_SIZE=20000 python -m benchmarks.bench_product_facets
+"""
+import os
+import random
+from decimal import Decimal
+
+from benchmarks.utils import count_queries, measure, print_table, setup_django, summarize
+
+CATALOG_SIZE = int(os.getenv('BENCH_CATALOG_SIZE', 200_000))
+ROOTS = 4
+CHILDREN = 5
+GRANDCHILDREN = 4
+BATCH_SIZE = 5000
+REPEAT = 10
+WORDS = ('citra', 'mosaic', 'cascade', 'pale', 'amber', 'wheat', 'yeast', 'crisp', 'hazy')
+
+
+def build_catalog(size):
+    from products.models import Category, Product
+
+    leaves = []
+    for r in range(ROOTS):
+        root = Category.objects.create(name=f'Root {r}', slug=f'root-{r}')
+        for c in range(CHILDREN):
+            child = Category.objects.create(name=f'{root.slug}-{c}', slug=f'{root.slug}-{c}',
+                                            parent=root)
+            leaves.append(child)
+            for g in range(GRANDCHILDREN):
+                slug = f'{child.slug}-{g}'
+                leaves.append(Category.objects.create(name=slug, slug=slug, parent=child))
+
+    rng = random.Random(42)
+    for start in range(0, size, BATCH_SIZE):
+        Product.objects.bulk_create([
+            Product(name=f'Product {i}', slug=f'product-{i}', category=rng.choice(leaves),
+                    description=' '.join(rng.choices(WORDS, k=8)),
+                    price=Decimal(rng.randint(100, 20000)) / 100, stock=rng.randint(0, 5))
+            for i in range(start, min(start + BATCH_SIZE, size))
+        ])
+
+
+def naive_facets(filters):
+    """Отдельный COUNT на каждое значение каждого измерения."""
+    from django.db.models import Q
+
+    from products import facets
+    from products.category_tree import get_category_tree
+    from products.models import Product
+    from products.search import search_products
+
+    base = Product.objects.filter(is_active=True)
+    if filters.search is not None:
+        base = search_products(base, filters.search).order_by()
+    prices = facets.price_filter(filters.price_min, filters.price_max)
+    categories = (facets.category_filter(filters.category_paths)
+                  if filters.category_paths is not None else Q())
+    counts = {
+        category.id: base.filter(prices, category__path__startswith=category.path).count()
+        for category in get_category_tree().categories
+    }
+    buckets = [
+        base.filter(categories, facets.price_filter(bucket.price_min, bucket.price_max)).count()
+        for bucket in facets.price_buckets()
+    ]
+    in_stock = base.filter(categories, prices, facets.in_stock_filter()).count()
+    return counts, buckets, in_stock
+
+
+def main():
+    setup_django()
+
+    from django.core.cache import cache
+
+    from products import facets
+    from products.category_tree import get_category_tree
+
+    build_catalog(CATALOG_SIZE)
+    tree = get_category_tree()
+    scenarios = [
+        ('no filters', facets.CatalogFilters()),
+        ('search "citra"', facets.CatalogFilters(search='citra')),
+        ('category + price', facets.CatalogFilters(
+            category_paths=(tree.find('root-1').path,), price_min=Decimal('25'),
+            price_max=Decimal('99.99'),
+        )),
+    ]
+
+    rows = []
+    for label, filters in scenarios:
+        for mode, fn in (
+            ('count per value', lambda: naive_facets(filters)),
+            ('single query', lambda: facets.compute_facets(filters)),
+            ('cached', lambda: facets.get_facets(filters)),
+        ):
+            fn()
+            with count_queries() as counter:
+                fn()
+            stats = summarize(measure(fn, REPEAT))
+            rows.append((label, mode, counter.total, stats['p50'], stats['p99']))
+        cache.clear()
+    print_table(('filters', 'mode', 'queries', 'p50 ms', 'p99 ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
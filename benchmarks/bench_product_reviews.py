@@ -0,0 +1,101 @@
+"""
+Список товаров в API: прежний ProductSerializer с вложенными отзывами
+(запрос отзывов на товар и запрос автора на отзыв) против агрегатов на
+строке товара. Плюс первая страница /api/products/{id}/reviews/.
+
+    python -m benchmarks.bench_product_reviews
+"""
+from benchmarks.utils import count_queries, measure, print_table, setup_django, summarize
+
+PRODUCTS = 10
+REVIEWS_PER_PRODUCT = (5, 50)
+REPEAT = 50
+
+
+def legacy_serializer_class():
+    from rest_framework import serializers
+
+    from products.models import Product
+    from products.serializers import CategorySerializer, ReviewSerializer
+
+    class LegacyProductSerializer(serializers.ModelSerializer):
+        category = CategorySerializer(read_only=True)
+        reviews = ReviewSerializer(many=True, read_only=True)
+
+        class Meta:
+            model = Product
+            fields = ['id', 'name', 'slug', 'category', 'description', 'price', 'stock', 'reviews']
+
+    return LegacyProductSerializer
+
+
+def build_catalog(reviews_per_product):
+    from products.models import Category, Product
+    from reviews.aggregates import recalculate_rating_aggregates
+    from reviews.models import Review
+    from users.models import User
+
+    Review.objects.all().delete()
+    Product.objects.all().delete()
+    category, _ = Category.objects.get_or_create(name='Bench', slug='bench')
+    products = Product.objects.bulk_create([
+        Product(name=f'p{i}', slug=f'p{i}', category=category, description='', price='1.00')
+        for i in range(PRODUCTS)
+    ])
+    users = list(User.objects.all()) or [
+        User.objects.create_user(username=f'u{i}', password='x') for i in range(50)
+    ]
+    Review.objects.bulk_create([
+        Review(product=product, user=users[i % len(users)], rating=i % 5 + 1, text='Nice hop')
+        for product in products
+        for i in range(reviews_per_product)
+    ])
+    recalculate_rating_aggregates()
+    return products
+
+
+def main():
+    setup_django()
+
+    from products.models import Product
+    from products.serializers import ProductSerializer
+    from products.views import ReviewPagination
+    from reviews.models import Review
+
+    legacy = legacy_serializer_class()
+    queryset = Product.objects.filter(is_active=True).select_related('category').order_by('id')
+
+    def serialize(serializer_class):
+        return serializer_class(list(queryset.all()), many=True).data
+
+    rows = []
+    for reviews in REVIEWS_PER_PRODUCT:
+        products = build_catalog(reviews)
+        modes = (('nested reviews', legacy), ('aggregates', ProductSerializer))
+        for label, serializer_class in modes:
+            with count_queries() as counter:
+                serialize(serializer_class)
+            stats = summarize(measure(lambda: serialize(serializer_class), REPEAT))
+            rows.append((reviews, label, counter.total, stats['p50'], stats['p99']))
+
+        def reviews_page():
+            from rest_framework.request import Request
+            from rest_framework.test import APIRequestFactory
+
+            request = Request(APIRequestFactory().get('/', {'cursor': ''}))
+            page = ReviewPagination().paginate_queryset(
+                Review.objects.filter(product=products[0]).select_related('user'), request
+            )
+            return [(review.rating, review.user.username) for review in page]
+
+        with count_queries() as counter:
+            reviews_page()
+        stats = summarize(measure(reviews_page, REPEAT))
+        rows.append((reviews, 'reviews endpoint page', counter.total, stats['p50'], stats['p99']))
+
+    print(f'{PRODUCTS} products per list page')
+    print_table(('reviews/product', 'mode', 'queries', 'p50 ms', 'p99 ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
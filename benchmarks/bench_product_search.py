@@ -0,0 +1,88 @@
+"""
+Поиск по синтетическому каталогу (по умолчанию 500k товаров): прежний
+name__icontains | description__icontains против products.search.
+Замеряется то, что делает страница списка: COUNT и первая страница из 12.
+
+    python -m benchmarks.bench_product_search
+    BENCH_CATALOG_SIZE=50000 python -m benchmarks.bench_product_search
+"""
+import os
+import random
+
+from benchmarks.utils import measure, print_table, setup_django, summarize
+
+CATALOG_SIZE = int(os.getenv('BENCH_CATALOG_SIZE', 500_000))
+BATCH_SIZE = 5000
+PAGE_SIZE = 12
+REPEAT = 20
+QUERIES = ('citra', 'tropical', 'mosaic pale', 'smoked rauch', 'zythos')
+
+WORDS = (
+    'hop', 'malt', 'pale', 'amber', 'stout', 'porter', 'lager', 'pilsner', 'wheat', 'rye',
+    'citrus', 'pine', 'resin', 'tropical', 'mango', 'grapefruit', 'caramel', 'toffee',
+    'roasted', 'coffee', 'chocolate', 'biscuit', 'bready', 'floral', 'herbal', 'spicy',
+    'crisp', 'clean', 'hazy', 'juicy', 'bitter', 'smooth', 'dry', 'sweet', 'yeast', 'ale',
+)
+HOPS = ('Citra', 'Mosaic', 'Cascade', 'Simcoe', 'Amarillo', 'Centennial', 'Saaz', 'Galaxy')
+RARE = ('smoked', 'rauch', 'zythos', 'sorachi')
+
+
+def build_catalog(size):
+    from products.models import Category, Product
+
+    rng = random.Random(42)
+    category = Category.objects.create(name='Bench', slug='bench')
+    for start in range(0, size, BATCH_SIZE):
+        batch = []
+        for i in range(start, min(start + BATCH_SIZE, size)):
+            words = rng.choices(WORDS, k=40)
+            if rng.random() < 0.001:
+                words.append(rng.choice(RARE))
+            batch.append(Product(
+                name=f'{rng.choice(HOPS)} {rng.choice(WORDS).title()} {i}',
+                slug=f'bench-{i}',
+                category=category,
+                description=' '.join(words),
+                price='4.99',
+                stock=10,
+            ))
+        Product.objects.bulk_create(batch)
+
+
+def legacy_search(queryset, query):
+    from django.db.models import Q
+
+    return queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
+
+
+def list_page(queryset):
+    return queryset.count(), list(queryset[:PAGE_SIZE])
+
+
+def main():
+    setup_django()
+
+    from django.db import connection
+
+    from products.models import Product
+    from products.search import search_products
+
+    build_catalog(CATALOG_SIZE)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE products_product')
+
+    queryset = Product.objects.filter(is_active=True).select_related('category')
+    rows = []
+    for query in QUERIES:
+        for label, search in (('icontains', legacy_search), ('full-text', search_products)):
+            found = search(queryset, query)
+            matches = found.count()
+            stats = summarize(measure(lambda: list_page(search(queryset, query)), REPEAT))
+            rows.append((query, label, matches, stats['p50'], stats['p99']))
+
+    print(f'catalog: {CATALOG_SIZE} products, vendor: {connection.vendor}')
+    print_table(('query', 'engine', 'matches', 'p50 ms', 'p99 ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Пересчёт «С этим товаром покупают» на синтетических заказах (по умолчанию
+1M строк заказов): только вычисление top-N в памяти (NumPy/SciPy против
+чистого Python), полный пересчёт с чтением из БД и записью RelatedProduct,
+инкрементальный пересчёт после новых заказов и блок на странице товара.
+
+    python -m benchmarks.bench_related_products
+    BENCH_ORDER_LINES=100000 python -m benchmarks.bench_related_products
+"""
+import os
+import random
+import time
+from datetime import timedelta
+
+from benchmarks.utils import count_queries, measure, print_table, setup_django, summarize
+
+ORDER_LINES = int(os.getenv('BENCH_ORDER_LINES', 1_000_000))
+PRODUCTS = 5000
+LINES_PER_ORDER = 4
+NEW_ORDERS = 1000
+BATCH_SIZE = 10000
+REPEAT = 200
+
+
+def synthetic_lines(orders, product_ids, first_order_id, rng):
+    """Строки заказов; популярность товаров убывает по закону Ципфа."""
+    weights = [1 / rank for rank in range(1, len(product_ids) + 1)]
+    for order_id in range(first_order_id, first_order_id + orders):
+        for product_id in set(rng.choices(product_ids, weights, k=LINES_PER_ORDER)):
+            yield order_id, product_id
+
+
+def build_orders(count, product_ids, rng, age):
+    from django.utils import timezone
+
+    from orders.models import Order, OrderItem
+    from users.models import User
+
+    user = User.objects.get_or_create(username='bench')[0]
+    for start in range(0, count, BATCH_SIZE):
+        orders = Order.objects.bulk_create([
+            Order(user=user, total_price=1) for _ in range(min(BATCH_SIZE, count - start))
+        ])
+        Order.objects.filter(id__gte=orders[0].id).update(created_at=timezone.now() - age)
+        OrderItem.objects.bulk_create([
+            OrderItem(order_id=order_id, product_id=product_id, price=1)
+            for order_id, product_id in synthetic_lines(len(orders), product_ids,
+                                                        orders[0].id, rng)
+        ], batch_size=BATCH_SIZE)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    setup_django()
+
+    from django.test import Client
+
+    from orders.models import OrderItem
+    from products import related
+    from products.models import Category, Product
+
+    rng = random.Random(42)
+    category = Category.objects.create(name='Bench', slug='bench')
+    Product.objects.bulk_create([
+        Product(name=f'Product {i}', slug=f'product-{i}', category=category,
+                description='', price='1.00', stock=100)
+        for i in range(PRODUCTS)
+    ], batch_size=BATCH_SIZE)
+    product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+    build_orders(ORDER_LINES // LINES_PER_ORDER, product_ids, rng, timedelta(days=1))
+    lines = list(OrderItem.objects.values_list('order_id', 'product_id'))
+    print(f'{len(lines)} order lines, {PRODUCTS} products')
+
+    rows = []
+    if related.np is not None:
+        _, seconds = timed(lambda: related._top_neighbours_numpy(iter(lines), None, related.TOP_N))
+        rows.append(('top-N in memory', 'numpy/scipy', '-', round(seconds, 2)))
+    _, seconds = timed(lambda: related._top_neighbours_python(iter(lines), None, related.TOP_N))
+    rows.append(('top-N in memory', 'python', '-', round(seconds, 2)))
+
+    with count_queries() as counter:
+        run, seconds = timed(lambda: related.refresh_related_products(full=True))
+    rows.append(('full refresh', f'{run.products_updated} products', counter.total,
+                 round(seconds, 2)))
+
+    build_orders(NEW_ORDERS, product_ids, rng, timedelta(hours=1))
+    with count_queries() as counter:
+        run, seconds = timed(related.refresh_related_products)
+    rows.append((f'incremental (+{NEW_ORDERS} orders)', f'{run.products_updated} products',
+                 counter.total, round(seconds, 2)))
+    print_table(('step', 'scope', 'queries', 'seconds'), rows)
+
+    product = Product.objects.get(id=product_ids[0])
+    client = Client()
+    response = client.get(f'/product/{product.slug}/')
+    view = response.context['view']
+    with count_queries() as counter:
+        view.get_related_products()
+    stats = summarize(measure(view.get_related_products, REPEAT))
+    print()
+    print_table(('detail page block', 'queries', 'p50 ms', 'p99 ms'), [
+        ('get_related_products()', counter.total, stats['p50'], stats['p99']),
+    ])
+
+
+if __name__ == '__main__':
+    main()
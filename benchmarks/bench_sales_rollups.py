@@ -0,0 +1,202 @@
+"""
+Список заказов в админке при 5M заказов (по умолчанию): прежний
+changelist_view - SUM по всей таблице заказов для заголовка выручки и два
+точных COUNT(*) для пагинации - против суммы по дневным сводкам orders.sales
+и оценки числа строк планировщиком; отдельно - только агрегат заголовка.
+Ниже - дашборд продаж за 30 дней и полный пересчёт сводок
+(rebuild_sales_rollups).
+
+Заказы за последний год генерируются одним INSERT ... SELECT
+generate_series на PostgreSQL; на других СУБД - bulk_create и меньший объём.
+
+    python -m benchmarks.bench_sales_rollups
+    BENCH_SALES_ORDERS=1000000 python -m benchmarks.bench_sales_rollups
+"""
+import os
+import time
+
+from benchmarks.utils import count_queries, measure, print_table, setup_django, summarize
+
+ORDERS = int(os.getenv('BENCH_SALES_ORDERS', 5_000_000))
+FALLBACK_ORDERS = 50_000
+PRODUCTS = 200
+USERS = 1000
+DAYS = 365
+REPEAT = 10
+
+STATUSES = ('pending', 'paid', 'shipped', 'delivered', 'cancelled')
+PAYMENT_METHODS = ('debit', 'credit', 'cash', 'paypal', 'wallet')
+
+
+def build_data(orders):
+    from django.db import connection
+
+    from products.models import Category, Product
+    from users.models import User
+
+    category = Category.objects.create(name='Bench', slug='bench')
+    Product.objects.bulk_create([
+        Product(name=f'p{i}', slug=f'p{i}', category=category, description='', price='2.50',
+                stock=100)
+        for i in range(PRODUCTS)
+    ])
+    User.objects.bulk_create([User(username=f'u{i}') for i in range(USERS)])
+    if connection.vendor == 'postgresql':
+        generate_postgresql(orders)
+    else:
+        generate_orm(orders)
+
+
+def generate_postgresql(orders):
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO orders_order (user_id, status, total_price, full_name, phone, city,
+                                      address, payment_method, created_at, updated_at, is_paid)
+            SELECT (SELECT min(id) FROM users_user) + i %% %(users)s,
+                   (%(statuses)s::text[])[1 + i %% 5], 2.50 * (1 + i %% 4), '', '', '', '',
+                   (%(methods)s::text[])[1 + (i / 5) %% 5],
+                   now() - (i %% %(days)s) * interval '1 day', now(), false
+            FROM generate_series(1, %(orders)s) AS i
+            """,
+            {'users': USERS, 'statuses': list(STATUSES), 'methods': list(PAYMENT_METHODS),
+             'days': DAYS, 'orders': orders},
+        )
+        cursor.execute(
+            """
+            INSERT INTO orders_orderitem (order_id, product_id, quantity, price)
+            SELECT o.id, (SELECT min(id) FROM products_product) + o.id %% %(products)s,
+                   1 + o.id %% 4, 2.50
+            FROM orders_order o
+            """,
+            {'products': PRODUCTS},
+        )
+        cursor.execute('ANALYZE orders_order')
+        cursor.execute('ANALYZE orders_orderitem')
+
+
+def generate_orm(orders):
+    from datetime import timedelta
+    from decimal import Decimal
+
+    from django.utils import timezone
+
+    from orders.models import Order, OrderItem
+    from products.models import Product
+    from users.models import User
+
+    users = list(User.objects.values_list('id', flat=True))
+    products = list(Product.objects.values_list('id', flat=True))
+    created = Order.objects.bulk_create([
+        Order(user_id=users[i % USERS], status=STATUSES[i % 5],
+              total_price=Decimal('2.50') * (1 + i % 4),
+              payment_method=PAYMENT_METHODS[i // 5 % 5])
+        for i in range(orders)
+    ], batch_size=5000)
+    now = timezone.now()
+    for i, order in enumerate(created):
+        order.created_at = now - timedelta(days=i % DAYS)
+    Order.objects.bulk_update(created, ['created_at'], batch_size=5000)
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product_id=products[order.id % PRODUCTS],
+                  quantity=1 + order.id % 4, price=Decimal('2.50'))
+        for order in created
+    ], batch_size=5000)
+
+
+def previous_changelist_view(self, request, extra_context=None):
+    """OrderAdmin.changelist_view до сводок: SUM и два COUNT(*) по всей таблице заказов."""
+    from django.contrib import admin
+    from django.core.paginator import Paginator
+    from django.db.models import Sum
+
+    from orders.models import Order
+
+    extra_context = extra_context or {}
+    extra_context['total_revenue'] = Order.objects.aggregate(total=Sum('total_price'))['total']
+    self.paginator, self.show_full_result_count = Paginator, True
+    try:
+        return admin.ModelAdmin.changelist_view(self, request, extra_context=extra_context)
+    finally:
+        del self.paginator, self.show_full_result_count
+
+
+def main():
+    setup_django()
+
+    from django.contrib import admin
+    from django.contrib.sessions.backends.signed_cookies import SessionStore
+    from django.core.management import call_command
+    from django.db import connection
+    from django.db.models import Sum
+    from django.test import Client, RequestFactory
+
+    from orders.admin import OrderAdmin
+    from orders.models import DailySales, Order
+    from users.models import User
+
+    orders = ORDERS if connection.vendor == 'postgresql' else min(ORDERS, FALLBACK_ORDERS)
+    start = time.perf_counter()
+    build_data(orders)
+    print(f'generated {orders} orders in {time.perf_counter() - start:.1f} s')
+
+    with count_queries() as rebuild_queries:
+        start = time.perf_counter()
+        call_command('rebuild_sales_rollups', stdout=open(os.devnull, 'w'))
+        rebuild_seconds = time.perf_counter() - start
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE orders_dailysales')
+        cursor.execute('ANALYZE orders_dailyproductsales')
+
+    admin_user = User.objects.create_superuser(username='admin', password='admin')
+    order_admin = admin.site._registry[Order]
+
+    def changelist(view):
+        # View вызывается напрямую: URL админки связываются с методом при первой загрузке
+        def render():
+            request = RequestFactory().get('/admin/orders/order/')
+            request.user = admin_user
+            request.session = SessionStore()
+            view(order_admin, request).render()
+        return render
+
+    client = Client()
+    client.force_login(admin_user)
+
+    def get(url):
+        def fetch():
+            response = client.get(url)
+            assert response.status_code == 200
+        return fetch
+
+    cases = [
+        ('revenue header', 'SUM over orders',
+         lambda: Order.objects.aggregate(total=Sum('total_price'))),
+        ('revenue header', 'SUM over DailySales',
+         lambda: DailySales.objects.aggregate(total=Sum('revenue'))),
+    ]
+    rows = []
+    pages = [
+        ('OrderAdmin.changelist_view', 'SUM over orders', changelist(previous_changelist_view)),
+        ('OrderAdmin.changelist_view', 'DailySales', changelist(OrderAdmin.changelist_view)),
+        ('GET /admin/orders/order/sales/?days=30', 'DailySales',
+         get('/admin/orders/order/sales/?days=30')),
+    ]
+    for step, mode, fetch in pages:
+        fetch()
+        with count_queries() as counter:
+            fetch()
+        stats = summarize(measure(fetch, REPEAT))
+        rows.append((step, mode, counter.total, stats['p50'], stats['p99']))
+    for step, mode, fn in cases:
+        stats = summarize(measure(fn, REPEAT))
+        rows.append((step, mode, 1, stats['p50'], stats['p99']))
+    rows.append(('rebuild_sales_rollups', f'{orders} orders', rebuild_queries.total,
+                 round(rebuild_seconds * 1000), '-'))
+    print_table(('step', 'revenue from', 'queries', 'p50 ms', 'p99 ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
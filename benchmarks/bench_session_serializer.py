@@ -0,0 +1,54 @@
+"""
+Время сериализации/десериализации и размер закодированной сессии с
+реалистичной корзиной: стандартный JSONSerializer (цены строками, как
+того требовала ручная конвертация) против DecimalJSONSerializer (цены Decimal).
+
+    python -m benchmarks.bench_session_serializer
+"""
+from decimal import Decimal
+
+from benchmarks.utils import measure, print_table, summarize
+
+CART_SIZES = (1, 20, 100)
+REPEAT = 2000
+
+
+def session_payload(lines, price_type):
+    return {
+        '_auth_user_id': '42',
+        '_auth_user_backend': 'django.contrib.auth.backends.ModelBackend',
+        '_auth_user_hash': 'f' * 64,
+        '_csrftoken': 'x' * 32,
+        'cart_key': 'c' * 32,
+        'cart': {
+            str(1000 + i): {'quantity': i % 5 + 1, 'price': price_type(f'{i % 40 + 1}.99')}
+            for i in range(lines)
+        },
+    }
+
+
+def bench(label, serializer, payload):
+    encoded = serializer.dumps(payload)
+    dumps = summarize(measure(lambda: serializer.dumps(payload), REPEAT))
+    loads = summarize(measure(lambda: serializer.loads(encoded), REPEAT))
+    return label, dumps['p50'] * 1000, loads['p50'] * 1000, len(encoded)
+
+
+def main():
+    from django.core.signing import JSONSerializer
+
+    from config.session_serializer import DecimalJSONSerializer
+
+    rows = []
+    for lines in CART_SIZES:
+        rows.append((lines, *bench('JSONSerializer (str)', JSONSerializer(),
+                                   session_payload(lines, str))))
+        rows.append((lines, *bench('DecimalJSONSerializer (Decimal)', DecimalJSONSerializer(),
+                                   session_payload(lines, Decimal))))
+        rows.append((lines, *bench('DecimalJSONSerializer (str)', DecimalJSONSerializer(),
+                                   session_payload(lines, str))))
+    print_table(('lines', 'serializer', 'dumps p50 us', 'loads p50 us', 'bytes'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Записи в django_session на 1000 анонимных просмотров каталога:
+стандартный db-движок против config.sessions.
+
+У каждого посетителя есть сессия (её создаёт CSRF-токен формы «в корзину»),
+дальше он просматривает главную, список и карточки товаров.
+
+    python -m benchmarks.bench_session_writes
+"""
+import time
+
+from benchmarks.utils import count_queries, print_table, setup_django
+
+ENGINES = [
+    'django.contrib.sessions.backends.db',
+    'config.sessions',
+]
+VISITORS = 50
+PAGE_VIEWS = 1000
+
+
+def create_catalog():
+    from products.models import Category, Product
+
+    category = Category.objects.create(name='Bench', slug='bench')
+    return Product.objects.bulk_create([
+        Product(name=f'Bench {i}', slug=f'bench-{i}', category=category,
+                description='', price='9.99', stock=100)
+        for i in range(20)
+    ])
+
+
+def browse(engine, products):
+    from django.core.cache import cache
+    from django.test import Client, override_settings
+
+    cache.clear()
+    with override_settings(SESSION_ENGINE=engine):
+        clients = [Client() for _ in range(VISITORS)]
+        for client in clients:
+            client.get(f'/product/{products[0].slug}/')
+
+        urls = ['/', '/products/'] + [f'/product/{p.slug}/' for p in products]
+        start = time.perf_counter()
+        with count_queries() as counter:
+            for i in range(PAGE_VIEWS):
+                clients[i % VISITORS].get(urls[i % len(urls)])
+        elapsed = time.perf_counter() - start
+
+    session_writes = sum(
+        1 for sql in counter.queries
+        if 'django_session' in sql and sql.lstrip().startswith(('INSERT', 'UPDATE'))
+    )
+    return engine, counter.writes, session_writes, elapsed * 1000 / PAGE_VIEWS
+
+
+def main():
+    setup_django()
+    products = create_catalog()
+    rows = [browse(engine, products) for engine in ENGINES]
+    print_table(('engine', 'db writes / 1000 views', 'session writes', 'ms / view'), rows)
+
+
+if __name__ == '__main__':
+    main()
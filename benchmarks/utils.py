@@ -0,0 +1,92 @@
+"""Общие помощники для бенчмарков: настройка Django, замеры времени и запросов."""
+import os
+import statistics
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def setup_django() -> None:
+    """Инициализировать Django и создать (или переиспользовать) базу для бенчмарков."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.settings_dict['TEST']['NAME'] = f"bench_{connection.settings_dict['NAME']}"
+    # serialize=False: снимок содержимого (прошлого прогона) бенчмаркам не нужен
+    connection.creation.create_test_db(verbosity=0, keepdb=True, serialize=False)
+    call_command('flush', interactive=False, verbosity=0)
+
+
+def measure(fn: Callable[[], object], repeat: int) -> List[float]:
+    """Вызвать fn repeat раз и вернуть длительности в миллисекундах."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """p50/p99/mean по выборке в миллисекундах."""
+    ordered = sorted(samples)
+    p99_index = min(len(ordered) - 1, int(len(ordered) * 0.99))
+    return {
+        'p50': statistics.median(ordered),
+        'p99': ordered[p99_index],
+        'mean': statistics.fmean(ordered),
+    }
+
+
+class QueryCounter:
+    """Счётчик SQL-запросов, выполненных внутри блока count_queries()."""
+
+    def __init__(self):
+        self.queries: List[str] = []
+
+    @property
+    def total(self) -> int:
+        return len(self.queries)
+
+    @property
+    def writes(self) -> int:
+        return sum(1 for sql in self.queries if sql.lstrip().upper().startswith(WRITE_PREFIXES))
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def count_queries():
+    """Считать все запросы к базе по умолчанию, не включая DEBUG-логирование."""
+    from django.db import connection
+
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        yield counter
+
+
+def print_table(headers: Sequence[str], rows: Iterable[Sequence[object]]) -> None:
+    """Вывести результаты простой выровненной таблицей."""
+    rows = [[_format(cell) for cell in row] for row in rows]
+    widths = [max(len(str(h)), *(len(row[i]) for row in rows)) for i, h in enumerate(headers)]
+    print('  '.join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print('  '.join('-' * w for w in widths))
+    for row in rows:
+        print('  '.join(cell.ljust(w) for cell, w in zip(row, widths)))
+
+
+def _format(value: object) -> str:
+    if isinstance(value, float):
+        return f'{value:.3f}'
+    return str(value)
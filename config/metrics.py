@@ -0,0 +1,173 @@
+"""
+Лёгкие метрики процесса в формате Prometheus.
+
+Значения копятся в памяти каждого процесса (без внешних зависимостей и
+сетевых вызовов на горячем пути) и отдаются эндпоинтом /metrics.
+При нескольких воркерах каждый процесс отдаёт свои значения.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class Metric:
+    """Базовый класс метрики с метками; значения защищены одной блокировкой."""
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def samples(self) -> Iterator[Sample]:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def _labels(self, labelvalues: tuple, **extra: str) -> Dict[str, str]:
+        labels = dict(zip(self.labelnames, labelvalues))
+        labels.update(extra)
+        return labels
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            values = list(self._values.items())
+        for labelvalues, value in values:
+            yield f'{self.name}_total', self._labels(labelvalues), value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for labelvalues, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f'{self.name}_bucket', self._labels(labelvalues, le=str(bound)), cumulative
+            cumulative += counts[-1]
+            yield f'{self.name}_bucket', self._labels(labelvalues, le='+Inf'), cumulative
+            yield f'{self.name}_sum', self._labels(labelvalues), total
+            yield f'{self.name}_count', self._labels(labelvalues), cumulative
+
+
+REGISTRY: List[Metric] = []
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Время обработки запроса', ['view', 'method'],
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'Число SQL-запросов за HTTP-запрос', ['view'],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    'http_request_db_seconds', 'Суммарное время SQL-запросов за HTTP-запрос', ['view'],
+)
+SESSION_BYTES = Counter(
+    'session_bytes', 'Байты сессий, прочитанные из БД и записанные в неё', ['direction'],
+)
+CART_OPERATIONS = Counter(
+    'cart_operations', 'Операции с корзиной', ['operation', 'status'],
+)
+
+
+def render() -> str:
+    """Собрать все метрики в текстовом формате Prometheus."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for name, labels, value in metric.samples():
+            if labels:
+                label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f'{name}{{{label_text}}} {value}')
+            else:
+                lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+class _QueryStats:
+    """execute_wrapper, считающий запросы и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    """Замеряет время запроса и работу с БД по каждому view. Ставить первым."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = _QueryStats()
+        start = time.perf_counter()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        REQUEST_LATENCY.observe(duration, view, request.method)
+        REQUEST_DB_QUERIES.observe(stats.count, view)
+        REQUEST_DB_SECONDS.observe(stats.seconds, view)
+        return response
+
+
+def metrics_view(request):
+    """Эндпоинт /metrics; доступен только с адресов из INTERNAL_IPS."""
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+        raise Http404
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
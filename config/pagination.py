@@ -0,0 +1,264 @@
+"""
+Пагинация API.
+
+KeysetPagination - пагинация по ключу (keyset/cursor): следующая страница
+выбирается условием WHERE по значениям последней строки в стабильной
+индексированной сортировке, поэтому глубокие страницы стоят столько же,
+сколько первая, и COUNT(*) не выполняется. Курсор непрозрачен для клиента.
+
+HybridPagination оставляет прежнюю постраничную пагинацию (?page=N с точным
+count) по умолчанию, а режим курсоров включается параметром ?cursor=
+(пустое значение - первая страница). Приблизительное количество строк по
+статистике планировщика отдаётся по запросу ?count=approximate.
+
+ApproximateCountPaginator - то же приблизительное количество для
+django.core.paginator (списки админки по большим таблицам).
+"""
+import base64
+import binascii
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+# Ниже этого порога оценка планировщика неточна, а точный COUNT дёшев
+APPROXIMATE_COUNT_THRESHOLD = 1000
+
+
+def approximate_count(queryset: QuerySet) -> int:
+    """
+    Количество строк по оценке планировщика PostgreSQL (EXPLAIN), без
+    сканирования таблицы. На других СУБД и для маленьких выборок - точный COUNT.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count()
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate < APPROXIMATE_COUNT_THRESHOLD:
+        return queryset.count()
+    return estimate
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator, у которого число строк - оценка планировщика (approximate_count):
+    на больших таблицах точный COUNT(*) дороже самой страницы. Последние
+    номера страниц приблизительны.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        return approximate_count(self.object_list)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Пагинация по ключу сортировки ordering. Последнее поле ordering должно быть
+    уникальным (обычно id), а для всей сортировки должен существовать индекс.
+    """
+    ordering: Sequence[str] = ('id',)
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None) -> List[Any]:
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'approximate':
+            self.count = approximate_count(queryset)
+
+        position, reverse = self.decode_cursor(request)
+        ordering = [_invert(field) for field in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            position = self.parse_position(queryset.model, position)
+            queryset = queryset.filter(self._after(position, ordering))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # Со страницы, открытой курсором «назад», всегда есть путь вперёд, и наоборот
+        has_next = has_more if not reverse else position is not None
+        has_previous = has_more if reverse else position is not None
+        self.next_cursor = self.encode_cursor(rows[-1], False) if rows and has_next else None
+        self.previous_cursor = self.encode_cursor(rows[0], True) if rows and has_previous else None
+        return rows
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_paginated_response(self, data) -> Response:
+        payload = {'next': self.get_next_link(), 'previous': self.get_previous_link()}
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['results'] = data
+        return Response(payload)
+
+    def get_next_link(self) -> Optional[str]:
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.next_cursor)
+
+    def get_previous_link(self) -> Optional[str]:
+        if self.previous_cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.previous_cursor)
+
+    def encode_cursor(self, row, reverse: bool) -> str:
+        values = [_json_value(_field_value(row, field.lstrip('-'))) for field in self.ordering]
+        payload = json.dumps({'v': values, 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request) -> Tuple[Optional[list], bool]:
+        """Вернуть (значения полей последней строки, направление назад)."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            values, reverse = payload['v'], bool(payload['r'])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def parse_position(self, model, values: list) -> list:
+        """
+        Привести значения из курсора к типам полей ordering. Курсор собирает
+        клиент, поэтому корректный JSON с чужими значениями - тоже 404, а не 500.
+        """
+        parsed = []
+        for field, value in zip(self.ordering, values):
+            try:
+                value = model._meta.get_field(field.lstrip('-')).to_python(value)
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            parsed.append(value)
+        return parsed
+
+    @staticmethod
+    def _after(values: list, ordering: Sequence[str]) -> Q:
+        """
+        Условие «строка идёт после values» для сортировки ordering:
+        a >= x AND (a > x OR (a = x AND b > y) ...). Ведущий диапазон по
+        первому полю позволяет планировщику начать с позиции в индексе.
+        """
+        names = [field.lstrip('-') for field in ordering]
+        lookups = ['lt' if field.startswith('-') else 'gt' for field in ordering]
+
+        condition = Q()
+        for index, (name, lookup) in enumerate(zip(names, lookups)):
+            equal_prefix = {names[i]: values[i] for i in range(index)}
+            condition |= Q(**equal_prefix, **{f'{name}__{lookup}': values[index]})
+        if len(ordering) == 1:
+            return condition
+        leading = Q(**{f'{names[0]}__{lookups[0]}e': values[0]})
+        return leading & condition
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque cursor from next/previous; '
+                               'an empty value opens the first page.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results per page.',
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Pass "approximate" to include an estimated total count.',
+                'schema': {'type': 'string', 'enum': ['approximate']},
+            },
+        ]
+
+
+class HybridPagination(BasePagination):
+    """
+    Постраничная пагинация по умолчанию (обратная совместимость) и пагинация
+    по ключу, если в запросе есть параметр cursor.
+    """
+    ordering: Sequence[str] = ('id',)
+    keyset_class = KeysetPagination
+    page_class = PageNumberPagination
+
+    def __init__(self):
+        self.keyset = self.keyset_class()
+        self.keyset.ordering = self.ordering
+        self.pages = self.page_class()
+        self.active = self.pages
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.keyset.cursor_query_param in request.query_params:
+            self.active = self.keyset
+        else:
+            self.active = self.pages
+            if not queryset.ordered:
+                # Стабильный порядок страниц и тот же индекс, что у курсоров
+                queryset = queryset.order_by(*self.ordering)
+        return self.active.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.active.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.pages.get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return (self.pages.get_schema_operation_parameters(view)
+                + self.keyset.get_schema_operation_parameters(view))
+
+    def get_results(self, data):
+        return data['results']
+
+
+def _invert(field: str) -> str:
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _field_value(row, name: str):
+    """Значение поля строки: объекта модели или словаря из QuerySet.values()."""
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def _json_value(value):
+    """Значение поля для курсора; дата и Decimal сериализуются строкой ISO/десятичной."""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (int, str)) or value is None:
+        return value
+    return str(value)
@@ -0,0 +1,115 @@
+"""
+Быстрый путь чтения для ModelSerializer.
+
+CompiledSerializer один раз создаёт поля сериализатора и запоминает для
+каждого колонку QuerySet.values() и метод to_representation. Дальше строки
+превращаются в dict без экземпляра сериализатора на объект, без
+get_attribute/source_attrs и без ReturnDict - только вызовы
+to_representation тех же полей DRF, поэтому JSON побайтно совпадает с
+ответом исходного сериализатора. Вложенные many=True сериализаторы по
+обратному внешнему ключу компилируются так же и загружаются одним запросом
+на связь для всей страницы.
+
+Поддерживаются обычные поля модели, ReadOnlyField с source через связи
+(user.username) и PrimaryKeyRelatedField; на остальном - TypeError при
+компиляции, а не тихо другой ответ.
+"""
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from django.db.models import ForeignObjectRel, QuerySet
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField, RelatedField
+
+
+class CompiledSerializer:
+    def __init__(self, serializer_class: type):
+        serializer = serializer_class()
+        self.model = serializer.Meta.model
+        self.columns: List[str] = []
+        # (имя поля, колонка values() или None для вложенного, to_representation)
+        self.fields: List[Tuple[str, Optional[str], Optional[Callable]]] = []
+        self.nested: Dict[str, Tuple['CompiledSerializer', str, str]] = {}
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                self.nested[name] = self._compile_nested(field)
+                self.fields.append((name, None, None))
+                continue
+            column = self._column(field)
+            if column not in self.columns:
+                self.columns.append(column)
+            self.fields.append((name, column, self._representation(field)))
+
+    def values(self, queryset: QuerySet, *extra: str) -> QuerySet:
+        """Строки queryset только с нужными колонками (prefetch_related сбрасывается)."""
+        columns = [column for column in extra if column not in self.columns]
+        return queryset.prefetch_related(None).values(*self.columns, *columns)
+
+    def to_representation(self, row: dict, nested: Optional[Dict[str, list]] = None) -> dict:
+        data = {}
+        for name, column, represent in self.fields:
+            if column is None:
+                data[name] = nested[name]
+                continue
+            value = row[column]
+            # Как Serializer.to_representation: None отдаётся без вызова поля
+            data[name] = None if value is None else represent(value)
+        return data
+
+    def serialize(self, rows: Sequence[dict], using: Optional[str] = None) -> List[dict]:
+        """Представления строк values() вместе с вложенными списками."""
+        if not self.nested:
+            return [self.to_representation(row) for row in rows]
+        pk = self.model._meta.pk.attname
+        keys = [row[pk] for row in rows]
+        children = {name: self._load_nested(name, keys, using) for name in self.nested}
+        return [
+            self.to_representation(row, {name: children[name].get(row[pk], [])
+                                         for name in self.nested})
+            for row in rows
+        ]
+
+    def _load_nested(self, name: str, keys: list, using: Optional[str]) -> Dict[object, list]:
+        child, lookup, fk_column = self.nested[name]
+        grouped = defaultdict(list)
+        if not keys:
+            return grouped
+        manager = child.model._default_manager
+        if using is not None:
+            manager = manager.db_manager(using)
+        queryset = manager.filter(**{f'{lookup}__in': keys}).order_by('pk')
+        for row in child.values(queryset, fk_column):
+            grouped[row[fk_column]].append(child.to_representation(row))
+        return grouped
+
+    def _compile_nested(self, field: serializers.ListSerializer) -> Tuple:
+        relation = self.model._meta.get_field(field.source)
+        if not isinstance(relation, ForeignObjectRel) or not relation.one_to_many:
+            raise TypeError(f'{field.source}: only reverse foreign keys can be nested')
+        child = CompiledSerializer(type(field.child))
+        return child, relation.field.name, relation.field.attname
+
+    def _column(self, field: serializers.Field) -> str:
+        if field.source == '*':
+            raise TypeError(f"{field.field_name}: source='*' is not supported")
+        attrs = field.source_attrs
+        if len(attrs) == 1:
+            model_field = self.model._meta.get_field(attrs[0])
+            # Внешний ключ: колонка с id, без JOIN
+            return model_field.attname if model_field.is_relation else attrs[0]
+        return '__'.join(attrs)
+
+    @staticmethod
+    def _representation(field: serializers.Field) -> Callable:
+        if isinstance(field, PrimaryKeyRelatedField):
+            return field.pk_field.to_representation if field.pk_field else _identity
+        if isinstance(field, (RelatedField, serializers.BaseSerializer,
+                              serializers.SerializerMethodField)):
+            raise TypeError(f'{field.field_name}: {type(field).__name__} is not supported')
+        return field.to_representation
+
+
+def _identity(value):
+    return value
@@ -0,0 +1,37 @@
+"""
+Сериализатор сессий с поддержкой Decimal.
+
+Компактный JSON, в котором Decimal кодируется тегом {"$d": "12.50"} и при
+чтении восстанавливается обратно в Decimal. Сессии, записанные стандартным
+JSONSerializer, читаются без изменений.
+"""
+import json
+from decimal import Decimal
+
+DECIMAL_TAG = '$d'
+
+
+class _Encoder(json.JSONEncoder):
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return {DECIMAL_TAG: str(o)}
+        return super().default(o)
+
+
+def _decode_object(obj: dict):
+    if DECIMAL_TAG in obj and len(obj) == 1:
+        return Decimal(obj[DECIMAL_TAG])
+    return obj
+
+
+class DecimalJSONSerializer:
+    """SESSION_SERIALIZER, сохраняющий Decimal без ручной конвертации в строки."""
+
+    _encoder = _Encoder(separators=(',', ':'), ensure_ascii=False)
+    _decoder = json.JSONDecoder(object_hook=_decode_object)
+
+    def dumps(self, obj) -> bytes:
+        return self._encoder.encode(obj).encode('utf-8')
+
+    def loads(self, data: bytes):
+        return self._decoder.decode(data.decode('utf-8'))
@@ -0,0 +1,73 @@
+"""
+Движок сессий с объединением записей.
+
+cached_db (кэш со сквозной записью перед БД) плюс:
+- грязная проверка: сессия, данные которой не изменились за запрос,
+  не перезаписывается, даже если кто-то выставил modified = True;
+- дешёвое продление срока жизни: вместо перезаписи всей строки
+  обновляется только expire_date и не чаще раза в SESSION_TOUCH_INTERVAL.
+
+Так SESSION_SAVE_EVERY_REQUEST остаётся скользящим сроком жизни сессии,
+но перестаёт означать UPDATE django_session на каждый просмотр страницы.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+from .metrics import SESSION_BYTES
+
+KEY_PREFIX = 'config.sessions'
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._loaded_digest = None
+
+    def load(self):
+        data = super().load()
+        self._loaded_digest = self._digest(data)
+        return data
+
+    def save(self, must_create=False):
+        data = self._get_session(no_load=must_create)
+        digest = self._digest(data)
+
+        if must_create or self.session_key is None or digest != self._loaded_digest:
+            super().save(must_create=must_create)
+            self._loaded_digest = digest
+            self._cache.set(self._touch_key, True, settings.SESSION_TOUCH_INTERVAL)
+        elif self._cache.add(self._touch_key, True, settings.SESSION_TOUCH_INTERVAL):
+            self._touch()
+
+    def encode(self, session_dict):
+        encoded = super().encode(session_dict)
+        SESSION_BYTES.inc('written', amount=len(encoded))
+        return encoded
+
+    def decode(self, session_data):
+        SESSION_BYTES.inc('read', amount=len(session_data))
+        return super().decode(session_data)
+
+    def delete(self, session_key=None):
+        super().delete(session_key)
+        self._loaded_digest = None
+
+    @property
+    def _touch_key(self) -> str:
+        return f'{self.cache_key_prefix}touch:{self.session_key}'
+
+    def _touch(self) -> None:
+        """Продлить срок жизни сессии, не перезаписывая session_data."""
+        self.model.objects.filter(session_key=self.session_key).update(
+            expire_date=self.get_expiry_date()
+        )
+        self._cache.touch(self.cache_key, self.get_expiry_age())
+
+    def _digest(self, data) -> bytes:
+        # Подписанный encode() содержит метку времени, поэтому сравниваем
+        # отпечаток сериализованных данных без подписи.
+        return hashlib.blake2b(self.serializer().dumps(data), digest_size=16).digest()
@@ -30,6 +30,9 @@ DEBUG = True
 
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
 
+# Адреса, которым доступен /metrics (Prometheus)
+INTERNAL_IPS = os.getenv('INTERNAL_IPS', '127.0.0.1').split(',')
+
 
 # Application definition
 
@@ -50,18 +53,19 @@ INSTALLED_APPS = [
     'orders',
     'reviews',
     'users',
+    'jobs',
 ]
 
 MIDDLEWARE = [
+    'config.metrics.MetricsMiddleware',  # Первым, чтобы замер покрывал весь запрос
     'django.middleware.security.SecurityMiddleware',
+    'orders.middleware.CartCountCookieMiddleware',  # ДО SessionMiddleware, см. docstring
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'orders.middleware.CartTransferMiddleware',
-    'orders.middleware.ForceDecimalToStringMiddleware',
 ]
 
 
@@ -131,6 +135,23 @@ DATABASES = {
     }
 }
 
+# DB_ENGINE=sqlite - локальная разработка без PostgreSQL (поиск идёт через FTS5)
+if os.getenv('DB_ENGINE') == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+    }
+
+# Cache
+# Сессии и корзина (CacheCartBackend) держат данные в кэше. Локальный кэш годится
+# только для одного процесса: при нескольких воркерах нужен общий кэш (Redis).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -185,11 +206,39 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Cart settings
 CART_SESSION_ID = 'cart'
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'  # Храним сессии в БД
+CART_KEY_SESSION_ID = 'cart_key'  # Идентификатор корзины для cache/db бэкендов
+# Где хранить корзину: SessionCartBackend, CacheCartBackend или DatabaseCartBackend
+CART_BACKEND = os.getenv('CART_BACKEND', 'orders.cart_backends.SessionCartBackend')
+CART_CACHE_ALIAS = 'default'
+STOCK_RESERVATION_TTL = 15 * 60  # Сколько секунд держится резерв товара в корзине
+CART_COUNT_COOKIE_NAME = 'cart_count'  # Подписанная cookie с количеством для бейджа
+CART_CHECK_CONSISTENCY = False  # Сверять счётчики корзины с полным пересчётом (включено в тестах)
+# Сессии в БД с кэшем перед ней: неизменённые сессии не перезаписываются,
+# а срок жизни продлевается отдельным UPDATE expire_date не чаще SESSION_TOUCH_INTERVAL
+SESSION_ENGINE = 'config.sessions'
 SESSION_COOKIE_AGE = 1209600  # 2 недели
-SESSION_SAVE_EVERY_REQUEST = True  # Сохранять сессию при каждом запросе
+SESSION_SAVE_EVERY_REQUEST = True  # Скользящий срок жизни; движок сам решает, нужна ли запись
+SESSION_TOUCH_INTERVAL = int(os.getenv('SESSION_TOUCH_INTERVAL', 60 * 60))  # Секунды
+SESSION_SERIALIZER = 'config.session_serializer.DecimalJSONSerializer'  # Decimal без конвертации
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False  # Не удалять при закрытии браузера
 
+# Кэш ответов каталога (products.cache): ключ содержит версию каталога, которую меняют сигналы.
+# Таймаут ограничивает устаревание после изменений без сигналов (резервы в корзинах, .update())
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', 60))  # Секунды; 0 - не кэшировать
+
+# Архив заказов (manage.py archive_orders): завершённые заказы старше срока уходят из горячих таблиц
+ORDERS_ARCHIVE_AFTER_MONTHS = int(os.getenv('ORDERS_ARCHIVE_AFTER_MONTHS', 12))
+
+# Очередь задач (jobs): работа после оформления заказа выполняется воркерами manage.py run_workers
+JOBS_LEASE = 5 * 60  # Секунды: задачу не завершившего её воркера затем заберёт другой
+JOBS_MAX_ATTEMPTS = 5  # Попыток до статуса failed
+JOBS_RETRY_DELAY = 10  # Секунды до второй попытки, далее удваивается
+JOBS_RETRY_MAX_DELAY = 60 * 60  # Потолок задержки между попытками, секунды
+JOBS_POLL_INTERVAL = 1  # Как часто простаивающий воркер опрашивает очередь, секунды
+JOBS_WORKER_PROCESSES = int(os.getenv('JOBS_WORKER_PROCESSES', 1))
+JOBS_WORKER_THREADS = int(os.getenv('JOBS_WORKER_THREADS', 4))
+
 # Messages framework
 MESSAGE_TAGS = {
     messages.DEBUG: 'debug',
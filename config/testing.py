@@ -0,0 +1,81 @@
+"""
+Бюджеты SQL-запросов для тестов.
+
+query_budget(budget, tables) - контекстный менеджер: записывает SQL,
+выполненный внутри блока, и падает с перечнем всех запросов, если их
+больше бюджета. Для таблиц из tables каждый SELECT дополнительно
+проверяется через EXPLAIN: в плане не должно быть Seq Scan по этим
+таблицам. На маленьких тестовых таблицах планировщик и так выбирает
+последовательное чтение, поэтому EXPLAIN выполняется с enable_seqscan = off -
+тогда Seq Scan остаётся в плане, только если подходящего индекса нет.
+EXPLAIN проверяется только на PostgreSQL.
+"""
+from contextlib import contextmanager
+from typing import Iterator, List, Sequence, Tuple
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+# Таблицы, которые растут с объёмом бизнеса и не должны читаться целиком
+BIG_TABLES = (
+    'products_product',
+    'orders_order',
+    'orders_orderitem',
+    'reviews_review',
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Запросов больше бюджета или запрос читает большую таблицу целиком."""
+
+
+def seq_scans(queries: Sequence[str], tables: Sequence[str],
+              using: str = 'default') -> List[Tuple[str, str]]:
+    """Пары (таблица, SQL) для SELECT-ов, которым нужен Seq Scan по tables."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql' or not tables:
+        return []
+    found = []
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            for sql in queries:
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                plan = cursor.fetchone()[0]
+                for node in _plan_nodes(plan[0]['Plan']):
+                    if node['Node Type'] == 'Seq Scan' and node['Relation Name'] in tables:
+                        found.append((node['Relation Name'], sql))
+        finally:
+            cursor.execute('RESET enable_seqscan')
+    return found
+
+
+@contextmanager
+def query_budget(budget: int, tables: Sequence[str] = BIG_TABLES,
+                 using: str = 'default') -> Iterator[CaptureQueriesContext]:
+    """Не больше budget запросов внутри блока и ни одного Seq Scan по tables."""
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    queries = [query['sql'] for query in context.captured_queries]
+    if len(queries) > budget:
+        raise QueryBudgetExceeded(
+            f'{len(queries)} queries, budget {budget}:\n' + _numbered(queries)
+        )
+    scans = seq_scans(queries, tables, using)
+    if scans:
+        raise QueryBudgetExceeded(
+            'Sequential scans on big tables:\n'
+            + _numbered([f'{table}: {sql}' for table, sql in scans])
+        )
+
+
+def _plan_nodes(node: dict) -> Iterator[dict]:
+    yield node
+    for child in node.get('Plans', ()):
+        yield from _plan_nodes(child)
+
+
+def _numbered(lines: Sequence[str]) -> str:
+    return '\n'.join(f'{number}. {line}' for number, line in enumerate(lines, 1))
@@ -0,0 +1,223 @@
+from decimal import Decimal
+
+import pytest
+from django.core import signing
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from . import metrics
+from .session_serializer import DecimalJSONSerializer
+from .sessions import SessionStore
+from .testing import QueryBudgetExceeded, query_budget
+
+
+def session_writes(captured):
+    return [
+        q['sql'] for q in captured
+        if 'django_session' in q['sql'] and q['sql'].startswith(('INSERT', 'UPDATE'))
+    ]
+
+
+@pytest.fixture
+def stored_session(db):
+    session = SessionStore()
+    session['cart'] = {'1': {'quantity': 2, 'price': '2.50'}}
+    session.save()
+    return session.session_key
+
+
+@pytest.mark.django_db
+class TestCoalescingSessionStore:
+    def test_unchanged_session_is_not_rewritten(self, stored_session):
+        session = SessionStore(stored_session)
+        session['cart'] = {'1': {'quantity': 2, 'price': '2.50'}}  # То же значение
+
+        with CaptureQueriesContext(connection) as ctx:
+            session.save()
+
+        assert session_writes(ctx.captured_queries) == []
+
+    def test_changed_session_is_saved(self, stored_session):
+        session = SessionStore(stored_session)
+        session['cart'] = {}
+
+        with CaptureQueriesContext(connection) as ctx:
+            session.save()
+
+        assert len(session_writes(ctx.captured_queries)) == 1
+        cache.clear()
+        assert SessionStore(stored_session)['cart'] == {}
+
+    def test_expiry_touched_at_most_once_per_interval(self, stored_session):
+        session = SessionStore(stored_session)
+        session.load()
+        cache.delete(session._touch_key)
+
+        with CaptureQueriesContext(connection) as ctx:
+            session.save()
+            session.save()
+
+        writes = session_writes(ctx.captured_queries)
+        assert len(writes) == 1
+        assert 'session_data' not in writes[0]
+
+
+class TestDecimalJSONSerializer:
+    def test_round_trips_decimals(self):
+        data = {'cart': {'7': {'quantity': 2, 'price': Decimal('12.50')}}, 'ids': [Decimal('1')]}
+
+        restored = DecimalJSONSerializer().loads(DecimalJSONSerializer().dumps(data))
+
+        assert restored == data
+        assert isinstance(restored['cart']['7']['price'], Decimal)
+        assert str(restored['cart']['7']['price']) == '12.50'
+
+    def test_reads_default_json_sessions(self):
+        data = {'cart': {'7': {'quantity': 2, 'price': '12.50'}}, '_auth_user_id': '1'}
+
+        assert DecimalJSONSerializer().loads(signing.JSONSerializer().dumps(data)) == data
+
+    @pytest.mark.django_db
+    def test_session_keeps_decimal(self):
+        session = SessionStore()
+        session['total'] = Decimal('3.10')
+        session.save()
+        cache.clear()
+
+        assert SessionStore(session.session_key)['total'] == Decimal('3.10')
+
+
+class TestMetrics:
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = metrics.Histogram('test_latency', 'Test', ['view'], buckets=(0.1, 1.0))
+        try:
+            histogram.observe(0.05, 'home')
+            histogram.observe(0.5, 'home')
+            histogram.observe(3, 'home')
+
+            text = metrics.render()
+        finally:
+            metrics.REGISTRY.remove(histogram)
+
+        assert 'test_latency_bucket{view="home",le="0.1"} 1' in text
+        assert 'test_latency_bucket{view="home",le="1.0"} 2' in text
+        assert 'test_latency_bucket{view="home",le="+Inf"} 3' in text
+        assert 'test_latency_count{view="home"} 3' in text
+
+    @pytest.mark.django_db
+    def test_endpoint_exposes_request_and_cart_metrics(self):
+        client = Client()
+        client.get('/')
+        client.post('/orders/cart/add/999999/')
+
+        response = client.get('/metrics')
+
+        assert response.status_code == 200
+        text = response.content.decode()
+        assert 'http_request_duration_seconds_bucket{view="home",method="GET"' in text
+        assert 'http_request_db_queries_count{view="orders:cart_add"}' in text
+        assert '# TYPE cart_operations counter' in text
+
+    def test_endpoint_hidden_from_external_addresses(self):
+        response = Client(REMOTE_ADDR='203.0.113.5').get('/metrics')
+
+        assert response.status_code == 404
+
+
+@pytest.fixture
+def shop(db):
+    """Небольшой магазин: дерево категорий, товары с отзывами, покупатель с заказами."""
+    from orders.models import Order, OrderItem
+    from products.models import Category, Product
+    from reviews.models import Review
+    from users.models import User
+
+    hops = Category.objects.create(name="Hops", slug="hops")
+    aroma = Category.objects.create(name="Aroma", slug="aroma", parent=hops)
+    products = Product.objects.bulk_create([
+        Product(name=f"Hop {i}", slug=f"hop-{i}", price=i + 1, stock=10, description="citrus hop",
+                category=aroma if i % 2 else hops)
+        for i in range(15)
+    ])
+    customer = User.objects.create_user(username="buyer")
+    reviewers = [User.objects.create_user(username=f"r{i}") for i in range(3)]
+    for product in products[:5]:
+        for i, reviewer in enumerate(reviewers):
+            Review.objects.create(product=product, user=reviewer, rating=i + 3, text="ok")
+    for number in range(12):
+        order = Order.objects.create(user=customer, total_price=3)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, price=1)
+            for product in products[number % 5:number % 5 + 3]
+        ])
+    return {'customer': customer, 'product': products[0], 'aroma': aroma, 'order': order}
+
+
+# Адрес, нужен ли вход, бюджет запросов
+ENDPOINT_BUDGETS = [
+    pytest.param('/', False, 0, id='home'),
+    pytest.param('/products/', False, 3, id='product list'),
+    pytest.param('/products/?category=aroma', False, 3, id='product list by category'),
+    pytest.param('/products/?price_min=2&price_max=9&in_stock=true', False, 3,
+                 id='product list filtered'),
+    pytest.param('/products/?search=citrus', False, 3, id='product list search'),
+    pytest.param('/product/hop-0/', False, 2, id='product detail'),
+    pytest.param('/api/products/', False, 2, id='api products'),
+    pytest.param('/api/products/?cursor=', False, 1, id='api products cursor'),
+    pytest.param('/api/products/?price_min=2&in_stock=true', False, 2, id='api products filtered'),
+    pytest.param('/api/products/{product.id}/', False, 1, id='api product'),
+    pytest.param('/api/products/{product.id}/reviews/', False, 2, id='api product reviews'),
+    pytest.param('/api/orders/', True, 3, id='api orders'),
+    pytest.param('/api/orders/?cursor=', True, 2, id='api orders cursor'),
+    pytest.param('/api/orders/{order.id}/', True, 2, id='api order'),
+    pytest.param('/orders/cart/', True, 3, id='cart'),
+    pytest.param('/users/account/', True, 4, id='account'),
+]
+
+
+@pytest.mark.django_db
+class TestQueryBudgets:
+    """
+    Число запросов каждой страницы и эндпоинта API и отсутствие Seq Scan по
+    большим таблицам. Кэш ответов каталога выключен: проверяется сам view.
+    """
+
+    @pytest.mark.parametrize('url, login, budget', ENDPOINT_BUDGETS)
+    def test_endpoint_within_budget(self, shop, settings, url, login, budget):
+        from rest_framework.test import APIClient
+
+        settings.CATALOG_CACHE_TIMEOUT = 0
+        client = APIClient()
+        if login:
+            client.force_login(shop['customer'])  # страницы
+            client.force_authenticate(shop['customer'])  # API
+        url = url.format(**shop)
+        # Повторный запрос: сессия, дерево категорий и т.п. уже в кэше
+        client.get(url)
+
+        with query_budget(budget):
+            response = client.get(url)
+
+        assert response.status_code == 200
+
+    def test_budget_reports_every_query(self, shop):
+        from products.models import Product
+
+        with pytest.raises(QueryBudgetExceeded) as error:
+            with query_budget(1):
+                list(Product.objects.all())
+                list(Product.objects.all())
+
+        assert '2 queries, budget 1' in str(error.value)
+        assert '1. SELECT' in str(error.value) and '2. SELECT' in str(error.value)
+
+    def test_explain_flags_unindexed_filters(self, shop):
+        from products.models import Product
+
+        if connection.vendor != 'postgresql':
+            pytest.skip('EXPLAIN is checked on PostgreSQL only')
+        with pytest.raises(QueryBudgetExceeded, match='Sequential scans'):
+            with query_budget(1):
+                list(Product.objects.filter(description__icontains='citrus'))
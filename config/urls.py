@@ -7,6 +7,7 @@ from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (TokenObtainPairView,
                                             TokenRefreshView)
 
+from config.metrics import metrics_view
 from orders.views import OrderViewSet
 from products.views import (ProductViewSet, HomeView, ProductListView,
                             ProductDetailView, GuidesRecipesView)
@@ -33,6 +34,9 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
+
+    # 👇 Метрики для Prometheus
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,16 @@
+import pytest
+from django.core.cache import cache
+
+
+@pytest.fixture(autouse=True)
+def cart_consistency_checks(settings):
+    """Во всех тестах сверяем инкрементальные счётчики корзины с полным пересчётом."""
+    settings.CART_CHECK_CONSISTENCY = True
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Кэш переживает откат транзакции теста, поэтому чистим его между тестами."""
+    cache.clear()
+    yield
+    cache.clear()
@@ -0,0 +1,20 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import QUEUED, Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "status", "attempts", "max_attempts", "run_at", "created_at")
+    list_filter = ("status", "name")
+    readonly_fields = ("locked_by", "last_error", "created_at")
+    actions = ["retry_now"]
+
+    @admin.action(description="Retry selected jobs now")
+    def retry_now(self, request, queryset):
+        # Взятые воркером задачи не трогаем: их аренда ещё действует
+        retried = queryset.exclude(locked_by__gt='').update(
+            status=QUEUED, attempts=0, run_at=timezone.now()
+        )
+        self.message_user(request, f"{retried} jobs queued for retry.")
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs.worker import run_pool
+
+
+class Command(BaseCommand):
+    help = "Запустить воркеры очереди задач (jobs) до SIGTERM/SIGINT"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.JOBS_WORKER_PROCESSES)
+        parser.add_argument('--threads', type=int, default=settings.JOBS_WORKER_THREADS)
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--poll-interval', type=float, default=settings.JOBS_POLL_INTERVAL)
+        parser.add_argument('--burst', action='store_true',
+                            help="Выйти, когда готовых задач не останется")
+
+    def handle(self, *args, **options):
+        processed = run_pool(
+            processes=options['processes'],
+            threads=options['threads'],
+            batch_size=options['batch_size'],
+            poll_interval=options['poll_interval'],
+            burst=options['burst'],
+        )
+        self.stdout.write(f"Processed {processed} jobs")
@@ -0,0 +1,42 @@
+from django.db import models
+from django.utils import timezone
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FAILED = 'failed'
+
+STATUS_CHOICES = [
+    (QUEUED, 'Queued'),
+    (RUNNING, 'Running'),
+    (FAILED, 'Failed'),
+]
+
+
+class Job(models.Model):
+    """
+    Задача очереди (см. jobs.queue). Выполненные задачи удаляются.
+
+    run_at - когда задачу можно взять: время постановки или следующей попытки,
+    а у взятой задачи - конец аренды, после которого её заберёт другой воркер.
+    """
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=32, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+
+    class Meta:
+        verbose_name = "Задача"
+        verbose_name_plural = "Задачи"
+        indexes = [
+            # Выборка готовых задач воркерами: только живые строки, по run_at
+            models.Index(fields=['run_at'], name='jobs_job_due_idx',
+                         condition=models.Q(status__in=[QUEUED, RUNNING])),
+        ]
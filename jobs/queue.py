@@ -0,0 +1,146 @@
+"""
+Очередь задач в базе данных.
+
+enqueue() - INSERT строки Job в текущей транзакции: задача становится видна
+воркерам только вместе с коммитом заказа (или другой записи) и исчезает
+вместе с ним при откате. Воркер (jobs.worker) забирает пачку готовых задач
+SELECT ... FOR UPDATE SKIP LOCKED - параллельные воркеры не ждут друг друга
+и не берут одну задачу дважды - и сдвигает им run_at на время аренды.
+
+Обработчик выполняется в одной транзакции с удалением строки задачи, поэтому
+его изменения в базе и завершение задачи фиксируются вместе. При ошибке всё
+откатывается, а задача повторяется с экспоненциальной задержкой; после
+max_attempts попыток она остаётся в статусе failed. Задачу умершего воркера
+по истечении аренды заберёт другой: побочные эффекты вне базы (письма)
+выполняются «хотя бы раз». Попытка, убившая воркера, тоже считается: если
+она была последней, claim() помечает задачу failed вместо новой выдачи.
+"""
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional, Sequence
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import FAILED, QUEUED, RUNNING, Job
+
+logger = logging.getLogger(__name__)
+
+# Имя задачи -> обработчик, вызывается как handler(**payload)
+HANDLERS: Dict[str, Callable] = {}
+
+LEASE_EXPIRED_ERROR = 'Lease expired on the last attempt: the worker died or hung'
+
+
+class LeaseLost(RuntimeError):
+    """Аренда задачи истекла, и её забрал другой воркер."""
+
+
+def task(name: str) -> Callable[[Callable], Callable]:
+    """Декоратор: зарегистрировать обработчик задачи name."""
+    def register(handler: Callable) -> Callable:
+        HANDLERS[name] = handler
+        return handler
+    return register
+
+
+def new_job(name: str, payload: Optional[dict] = None, delay: float = 0,
+            max_attempts: Optional[int] = None) -> Job:
+    """Несохранённая задача (для enqueue_many). Неизвестное имя - LookupError."""
+    if name not in HANDLERS:
+        raise LookupError(f'No handler registered for job {name!r}')
+    return Job(
+        name=name,
+        payload=payload or {},
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    )
+
+
+def enqueue(name: str, payload: Optional[dict] = None, **options) -> Job:
+    """Поставить задачу в очередь в текущей транзакции."""
+    job = new_job(name, payload, **options)
+    job.save()
+    return job
+
+
+def enqueue_many(jobs: Sequence[Job]) -> List[Job]:
+    """Поставить несколько задач одним INSERT."""
+    return Job.objects.bulk_create(jobs)
+
+
+def claim(limit: int = 1, lease: Optional[float] = None,
+          using: Optional[str] = None) -> List[Job]:
+    """Забрать до limit готовых задач (в том числе с истёкшей арендой)."""
+    using = using or router.db_for_write(Job)
+    lease = settings.JOBS_LEASE if lease is None else lease
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    due = Q(status__in=[QUEUED, RUNNING], run_at__lte=now)
+    jobs = Job.objects.using(using)
+    with transaction.atomic(using=using):
+        while True:
+            ids = list(
+                jobs.select_for_update(skip_locked=True).filter(due)
+                .order_by('run_at').values_list('id', flat=True)[:limit]
+            )
+            if not ids:
+                return []
+            # Аренда последней попытки истекла: воркер умер на этой задаче, не повторять её
+            failed = jobs.filter(
+                due, id__in=ids, status=RUNNING, attempts__gte=F('max_attempts')
+            ).update(status=FAILED, locked_by='', last_error=LEASE_EXPIRED_ERROR)
+            if failed:
+                logger.error('%s jobs failed: lease expired on the last attempt', failed)
+            if failed < len(ids):
+                break
+        # Условие due повторяется: без SKIP LOCKED (SQLite) строку мог забрать другой воркер
+        jobs.filter(due, id__in=ids).update(
+            status=RUNNING, locked_by=token, attempts=F('attempts') + 1,
+            run_at=now + timedelta(seconds=lease),
+        )
+        return list(jobs.filter(locked_by=token).order_by('run_at', 'id'))
+
+
+def run(job: Job, using: Optional[str] = None) -> bool:
+    """Выполнить взятую задачу; False - ошибка (задача отложена или failed)."""
+    using = using or router.db_for_write(Job)
+    try:
+        handler = HANDLERS.get(job.name)
+        if handler is None:
+            raise LookupError(f'No handler registered for job {job.name!r}')
+        with transaction.atomic(using=using):
+            handler(**job.payload)
+            deleted, _ = Job.objects.using(using).filter(
+                pk=job.pk, locked_by=job.locked_by
+            ).delete()
+            if not deleted:
+                # Откат изменений обработчика: задачу выполнит новый владелец
+                raise LeaseLost(f'Lease on job {job.pk} expired')
+    except Exception:
+        logger.exception('Job %s failed (attempt %s of %s)', job, job.attempts, job.max_attempts)
+        fail(job, traceback.format_exc(), using)
+        return False
+    return True
+
+
+def fail(job: Job, error: str, using: Optional[str] = None) -> None:
+    """Отложить задачу до следующей попытки или, если попытки кончились, пометить failed."""
+    retry = job.attempts < job.max_attempts
+    Job.objects.using(using or router.db_for_write(Job)).filter(
+        pk=job.pk, locked_by=job.locked_by
+    ).update(
+        status=QUEUED if retry else FAILED,
+        run_at=timezone.now() + timedelta(seconds=backoff(job.attempts)),
+        locked_by='',
+        last_error=error,
+    )
+
+
+def backoff(attempts: int) -> float:
+    """Задержка перед попыткой attempts + 1: JOBS_RETRY_DELAY * 2^(attempts - 1), с потолком."""
+    return min(settings.JOBS_RETRY_MAX_DELAY, settings.JOBS_RETRY_DELAY * 2 ** (attempts - 1))
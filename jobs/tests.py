@@ -0,0 +1,199 @@
+import io
+import threading
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
+
+from products.models import Category
+
+from . import queue
+from .models import FAILED, QUEUED, RUNNING, Job
+from .worker import Worker
+
+HANDLER = 'tests.create_category'
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Обработчик задачи: создаёт категорию (эффект в базе) и при fail=True падает после этого."""
+    calls = []
+
+    def create_category(value, fail=False):
+        Category.objects.create(name=f'Category {value}', slug=f'category-{value}')
+        calls.append(value)
+        if fail:
+            raise RuntimeError('handler failed')
+
+    monkeypatch.setitem(queue.HANDLERS, HANDLER, create_category)
+    return calls
+
+
+def run_jobs(**options):
+    return Worker(burst=True, **options).run()
+
+
+@pytest.mark.django_db
+class TestQueue:
+    def test_enqueue_rolls_back_with_transaction(self, calls):
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                queue.enqueue(HANDLER, {'value': 1})
+                raise RuntimeError('checkout failed')
+        with transaction.atomic():
+            queue.enqueue(HANDLER, {'value': 2})
+
+        assert run_jobs() == 1
+        assert calls == [2]
+        assert not Job.objects.exists()
+
+    def test_unknown_job_rejected(self):
+        with pytest.raises(LookupError):
+            queue.enqueue('tests.missing')
+
+    def test_failure_rolls_back_handler_and_retries_with_backoff(self, calls, settings):
+        settings.JOBS_RETRY_DELAY = 10
+        queue.enqueue(HANDLER, {'value': 1, 'fail': True})
+
+        before = timezone.now()
+        assert run_jobs() == 1  # Следующая попытка ещё не наступила
+
+        job = Job.objects.get()
+        assert (job.status, job.attempts, job.locked_by) == (QUEUED, 1, '')
+        assert 'handler failed' in job.last_error
+        assert job.run_at >= before + timedelta(seconds=10)
+        assert calls == [1]
+        assert not Category.objects.exists()
+
+        Job.objects.update(run_at=timezone.now())
+        run_jobs()
+        job.refresh_from_db()
+        assert job.attempts == 2
+        assert job.run_at >= before + timedelta(seconds=20)
+
+    def test_failed_after_max_attempts(self, calls, settings):
+        settings.JOBS_RETRY_DELAY = 0
+        queue.enqueue(HANDLER, {'value': 1, 'fail': True}, max_attempts=3)
+
+        assert run_jobs() == 3
+
+        job = Job.objects.get()
+        assert (job.status, job.attempts) == (FAILED, 3)
+        assert queue.claim(10) == []
+
+    def test_backoff_is_capped(self, settings):
+        settings.JOBS_RETRY_DELAY = 10
+        settings.JOBS_RETRY_MAX_DELAY = 60
+
+        assert [queue.backoff(attempts) for attempts in (1, 2, 3, 4, 10)] == [10, 20, 40, 60, 60]
+
+    def test_expired_lease_is_reclaimed(self, calls):
+        queue.enqueue(HANDLER, {'value': 1})
+        # Воркер взял задачу и умер, не выполнив её
+        [stale] = queue.claim(10, lease=60)
+        assert stale.status == RUNNING
+        assert queue.claim(10) == []
+
+        Job.objects.update(run_at=timezone.now() - timedelta(seconds=1))
+        [job] = queue.claim(10)
+        assert job.attempts == 2
+
+        # Прежний владелец опоздал: его результат откатывается, задача остаётся у нового
+        assert queue.run(stale) is False
+        assert Job.objects.get().locked_by == job.locked_by
+        assert not Category.objects.exists()
+        assert queue.run(job) is True
+        assert calls == [1, 1]
+        assert Category.objects.count() == 1
+        assert not Job.objects.exists()
+
+    def test_expired_lease_on_last_attempt_fails(self, calls):
+        doomed = queue.enqueue(HANDLER, {'value': 1}, max_attempts=1)
+        queue.claim(10, lease=60)  # Воркер умер на единственной попытке
+        Job.objects.update(run_at=timezone.now() - timedelta(seconds=1))
+        waiting = queue.enqueue(HANDLER, {'value': 2})
+
+        assert [job.id for job in queue.claim(1)] == [waiting.id]
+
+        doomed.refresh_from_db()
+        assert (doomed.status, doomed.attempts, doomed.locked_by) == (FAILED, 1, '')
+        assert doomed.last_error == queue.LEASE_EXPIRED_ERROR
+        assert queue.claim(10) == []
+        assert calls == []
+
+    def test_worker_survives_database_errors_in_fail(self, calls, monkeypatch):
+        from django.db import OperationalError
+
+        from . import worker
+
+        stop = threading.Event()
+        reconnects = []
+
+        def fail(job, error, using=None):
+            stop.set()
+            raise OperationalError('server closed the connection unexpectedly')
+
+        monkeypatch.setattr(queue, 'fail', fail)
+        # Настоящий close_old_connections закрыл бы соединение тестовой транзакции
+        monkeypatch.setattr(worker, 'close_old_connections', lambda: reconnects.append(1))
+        queue.enqueue(HANDLER, {'value': 1, 'fail': True})
+
+        assert Worker(stop=stop, poll_interval=0).run() == 1
+        assert reconnects == [1]
+
+        Job.objects.update(run_at=timezone.now() - timedelta(seconds=1))
+        with pytest.raises(OperationalError):
+            run_jobs()
+
+    def test_claim_takes_due_jobs_in_order(self, calls):
+        later = queue.enqueue(HANDLER, {'value': 1}, delay=60)
+        first, second = [queue.enqueue(HANDLER, {'value': value}) for value in (2, 3)]
+
+        assert [job.id for job in queue.claim(1)] == [first.id]
+        assert [job.id for job in queue.claim(10)] == [second.id]
+        later.refresh_from_db()
+        assert later.status == QUEUED
+
+
+@pytest.mark.django_db(transaction=True)
+class TestWorkerPool:
+    @pytest.fixture(autouse=True)
+    def postgresql_only(self):
+        if connection.vendor != 'postgresql':
+            pytest.skip('Параллельным воркерам нужен SELECT ... FOR UPDATE SKIP LOCKED')
+
+    def test_concurrent_workers_run_each_job_once(self, calls):
+        queue.enqueue_many([queue.new_job(HANDLER, {'value': value}) for value in range(200)])
+        barrier = threading.Barrier(8)
+        processed = []
+
+        def work():
+            try:
+                barrier.wait()
+                processed.append(run_jobs(batch_size=5))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(calls) == list(range(200))
+        assert sum(processed) == 200
+        assert not Job.objects.exists()
+
+    @pytest.mark.parametrize('processes', [1, 2])
+    def test_run_workers_command(self, calls, processes):
+        queue.enqueue_many([queue.new_job(HANDLER, {'value': value}) for value in range(20)])
+
+        out = io.StringIO()
+        call_command('run_workers', '--burst', '--processes', processes, '--threads', 2,
+                     stdout=out)
+
+        assert out.getvalue().strip() == 'Processed 20 jobs'
+        assert Category.objects.count() == 20
+        assert not Job.objects.exists()
@@ -0,0 +1,137 @@
+"""
+Воркеры очереди задач (manage.py run_workers).
+
+Worker - цикл «взять пачку задач (queue.claim) - выполнить по одной
+(queue.run)» в одном потоке со своим соединением с базой. run_pool()
+запускает processes процессов (fork) по threads потоков в каждом: потоки
+подходят для задач, ждущих сеть (SMTP), процессы - для задач, занятых
+Python-кодом. SIGTERM/SIGINT выставляют общий флаг остановки: воркеры
+доделывают текущую задачу и выходят.
+"""
+import logging
+import multiprocessing
+import signal
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from . import queue
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """
+    Один поток обработки задач.
+
+    burst=True - выйти, когда готовых задач не осталось (тесты, бенчмарки,
+    cron), иначе ждать новые задачи, опрашивая базу раз в poll_interval секунд.
+    """
+
+    def __init__(self, batch_size: int = 10, poll_interval: Optional[float] = None,
+                 stop: Optional[threading.Event] = None, burst: bool = False):
+        self.batch_size = batch_size
+        self.poll_interval = (settings.JOBS_POLL_INTERVAL if poll_interval is None
+                              else poll_interval)
+        self.stop = stop or threading.Event()
+        self.burst = burst
+
+    def run(self) -> int:
+        """Обрабатывать задачи до остановки; вернуть число выполненных попыток."""
+        processed = 0
+        while not self.stop.is_set():
+            try:
+                jobs = queue.claim(self.batch_size)
+            except Exception:
+                self._recover('Failed to claim jobs')
+                jobs = []
+            if not jobs:
+                if self.burst:
+                    break
+                self.stop.wait(self.poll_interval)
+                continue
+            for job in jobs:
+                try:
+                    queue.run(job)
+                except Exception:
+                    # Не удалось даже записать ошибку (fail): задачу вернёт истечение аренды
+                    self._recover('Failed to run job %s', job)
+                processed += 1
+        return processed
+
+    def _recover(self, message: str, *args) -> None:
+        """
+        Ошибка базы вне обработчика задачи (вызывается из except). В burst-режиме
+        пробросить её, иначе записать в лог и сбросить сломанное соединение -
+        поток воркера продолжает работу.
+        """
+        if self.burst:
+            raise
+        logger.exception(message, *args)
+        close_old_connections()
+
+
+def run_pool(processes: int = 1, threads: int = 1, **options) -> int:
+    """Запустить processes x threads воркеров и дождаться их; вернуть сумму обработанных."""
+    if processes <= 1:
+        stop = threading.Event()
+        with _stop_on_signals(stop):
+            return _run_threads(threads, stop, options)
+
+    context = multiprocessing.get_context('fork')
+    stop = context.Event()
+    results = context.Queue()
+    # Дочерние процессы не должны наследовать открытые соединения родителя
+    connections.close_all()
+    with _stop_on_signals(stop):
+        children = [
+            context.Process(target=_run_process, args=(threads, stop, results, options))
+            for _ in range(processes)
+        ]
+        for child in children:
+            child.start()
+        for child in children:
+            child.join()
+    return sum(results.get(timeout=1) for child in children if child.exitcode == 0)
+
+
+def _run_process(threads: int, stop, results, options: dict) -> None:
+    results.put(_run_threads(threads, stop, options))
+
+
+def _run_threads(threads: int, stop, options: dict) -> int:
+    processed = [0] * threads
+
+    def target(index: int) -> None:
+        try:
+            processed[index] = Worker(stop=stop, **options).run()
+        finally:
+            # Соединения с базой принадлежат потоку и сами не закрываются
+            connections.close_all()
+
+    workers = [threading.Thread(target=target, args=(index,)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        # join с таймаутом, чтобы главный поток успевал обработать сигналы
+        while worker.is_alive():
+            worker.join(0.5)
+    return sum(processed)
+
+
+@contextmanager
+def _stop_on_signals(stop):
+    """SIGTERM/SIGINT выставляют stop (дочерние процессы наследуют обработчики)."""
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    previous = {signum: signal.signal(signum, lambda *args: stop.set())
+                for signum in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        yield
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
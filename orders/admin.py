@@ -1,7 +1,64 @@
-from django.contrib import admin
+from datetime import timedelta
+
+from django import forms
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import transaction
 from django.db.models import Sum
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+
+from config.pagination import ApproximateCountPaginator
+
+from . import sales, stats, transitions
+from .models import (
+    STATUS_CHOICES, ArchivedOrder, ArchivedOrderItem, DailyProductSales, DailySales, Order,
+    OrderItem, OrderStatusEvent,
+)
+
+DASHBOARD_DAYS = 30
+DASHBOARD_MAX_DAYS = 366
+DASHBOARD_PAGE_SIZE = 100
+# Сколько ошибок массовой смены статуса показать в сообщении
+TRANSITION_ERRORS_SHOWN = 5
+
+
+def transition_action(status):
+    """Действие списка заказов: перевести выбранные заказы в status (orders.transitions)."""
+    def action(modeladmin, request, queryset):
+        try:
+            changed = transitions.transition(
+                queryset.values_list('id', flat=True), status, request.user
+            )
+        except transitions.TransitionError as error:
+            details = '; '.join(
+                f"#{order_id}: {reason}"
+                for order_id, reason in list(error.errors.items())[:TRANSITION_ERRORS_SHOWN]
+            )
+            modeladmin.message_user(request, f"{error}. No orders were changed. {details}",
+                                    messages.ERROR)
+            return
+        modeladmin.message_user(request, f"{changed} orders marked as {status}.")
+
+    action.__name__ = f'mark_{status}'
+    return admin.action(description=f"Mark selected orders as {status}")(action)
+
 
-from .models import Order, OrderItem
+class OrderAdminForm(forms.ModelForm):
+    """Статус существующего заказа меняется только по TRANSITIONS (orders.transitions)."""
+
+    class Meta:
+        model = Order
+        fields = '__all__'
+
+    def clean_status(self):
+        status = self.cleaned_data['status']
+        if self.instance.pk:
+            error = transitions.transition_error(self.initial['status'], status)
+            if error:
+                raise forms.ValidationError(error)
+        return status
 
 
 class OrderItemInline(admin.TabularInline):
@@ -10,14 +67,146 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ['price']
 
 
+class OrderStatusEventInline(admin.TabularInline):
+    """История статусов заказа только для чтения (журнал лишь дополняется)."""
+    model = OrderStatusEvent
+    extra = 0
+    can_delete = False
+    fields = readonly_fields = ['from_status', 'to_status', 'changed_by', 'created_at']
+    ordering = ['created_at', 'id']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ("id", "user", "total_price", "created_at", "is_paid")
-    list_filter = ("is_paid", "created_at")
-    inlines = [OrderItemInline]
+    form = OrderAdminForm
+    list_display = ("id", "user", "status", "total_price", "created_at", "is_paid")
+    list_filter = ("status", "is_paid", "created_at")
+    inlines = [OrderItemInline, OrderStatusEventInline]
+    actions = [transition_action(status) for status, _ in STATUS_CHOICES if status != 'pending']
+    # Без точных COUNT(*) по всей таблице заказов на каждую загрузку списка
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+    def get_urls(self):
+        dashboard = path('sales/', self.admin_site.admin_view(self.sales_dashboard_view),
+                         name='orders_order_sales')
+        return [dashboard, *super().get_urls()]
 
     def changelist_view(self, request, extra_context=None):
-        aggregate_data = Order.objects.aggregate(total=Sum('total_price'))
+        # Сумма по дневным сводкам (orders.sales), а не по всей таблице заказов
+        aggregate_data = DailySales.objects.aggregate(total=Sum('revenue'))
         extra_context = extra_context or {}
         extra_context['total_revenue'] = aggregate_data['total']
         return super().changelist_view(request, extra_context=extra_context)
+
+    def sales_dashboard_view(self, request):
+        """Выручка по дням и продажи товаров по дням за ?days= дней - только из сводок."""
+        try:
+            days = int(request.GET.get('days', DASHBOARD_DAYS))
+        except ValueError:
+            days = DASHBOARD_DAYS
+        days = max(1, min(days, DASHBOARD_MAX_DAYS))
+        end = timezone.localdate()
+        start = end - timedelta(days=days - 1)
+
+        daily = list(
+            DailySales.objects.filter(date__range=(start, end))
+            .exclude(status=stats.EXCLUDED_FROM_SPEND)
+            .values('date')
+            .annotate(orders=Sum('order_count'), revenue=Sum('revenue'))
+            .order_by('-date')
+        )
+        products = (
+            DailyProductSales.objects.filter(date__range=(start, end))
+            .exclude(status=stats.EXCLUDED_FROM_SPEND)
+            .values('date', 'product_id', 'product__name')
+            .annotate(units=Sum('units'), revenue=Sum('revenue'))
+            .order_by('-date', '-revenue', 'product_id')
+        )
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Sales dashboard',
+            'opts': self.model._meta,
+            'days': days,
+            'start': start,
+            'end': end,
+            'daily': daily,
+            'total_orders': sum(row['orders'] for row in daily),
+            'total_revenue': sum(row['revenue'] for row in daily),
+            'products': Paginator(products, DASHBOARD_PAGE_SIZE).get_page(request.GET.get('page')),
+        }
+        return TemplateResponse(request, 'admin/orders/sales_dashboard.html', context)
+
+    # Сводка заказов покупателя (orders.stats) и дневные сводки продаж
+    # (orders.sales) меняются в той же транзакции. Вклад заказа в продажи
+    # вычитается до сохранения и добавляется после сохранения позиций.
+    # Новый статус существующего заказа применяется последним, через
+    # transitions.transition(): те же is_paid/paid_at, сводки и журнал
+    # OrderStatusEvent, что у массовой смены статуса.
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            sales.subtract(Order.objects.filter(pk=obj.pk))
+            obj.status = form.initial['status']
+        super().save_model(request, obj, form, change)
+        if not change:
+            stats.record_order(obj)
+        elif 'user' in form.changed_data:
+            stats.rebuild([form.initial['user'], obj.user_id])
+        elif 'total_price' in form.changed_data:
+            stats.record_change(obj, obj.status, form.initial['total_price'])
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        order = form.instance
+        sales.add(Order.objects.filter(pk=order.pk))
+        if change and 'status' in form.changed_data:
+            transitions.transition([order.pk], form.cleaned_data['status'], request.user)
+            order.refresh_from_db(fields=['status', 'is_paid', 'paid_at', 'updated_at'])
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            sales.subtract(Order.objects.filter(pk=obj.pk))
+            super().delete_model(request, obj)
+            stats.rebuild([obj.user_id])
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            user_ids = set(queryset.values_list('user_id', flat=True))
+            sales.subtract(queryset)
+            super().delete_queryset(request, queryset)
+            stats.rebuild(user_ids)
+
+
+class ReadOnlyAdminMixin:
+    """Архив только читается: правка или удаление разошлись бы со сводками заказов."""
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class ArchivedOrderItemInline(ReadOnlyAdminMixin, admin.TabularInline):
+    model = ArchivedOrderItem
+    fields = readonly_fields = ['product', 'quantity', 'price']
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(ReadOnlyAdminMixin, admin.ModelAdmin):
+    list_display = ("id", "user", "status", "total_price", "created_at", "archived_at")
+    list_filter = ("status", "created_at")
+    list_select_related = ("user",)
+    inlines = [ArchivedOrderItemInline]
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,92 @@
+"""
+Архивация заказов (manage.py archive_orders).
+
+Завершённые (delivered, cancelled) заказы старше заданного срока переносятся
+из orders_order и orders_orderitem в ArchivedOrder и ArchivedOrderItem с теми
+же id. Горячие таблицы и их индексы, которые читают кабинет, API и админка,
+остаются размером с «живые» заказы.
+
+Каждая пачка - отдельная транзакция: SELECT ... FOR UPDATE SKIP LOCKED id
+заказов (заказы, которые сейчас меняют, ждут следующего запуска), затем
+INSERT ... SELECT в архив и DELETE из горячих таблиц. Сводки не меняются:
+архивные заказы по-прежнему входят в UserOrderStats и дневные сводки продаж,
+а их rebuild() учитывает архив. Журнал OrderStatusEvent не связан с таблицей
+заказов внешним ключом и остаётся на месте.
+"""
+import calendar
+from datetime import datetime
+from typing import List, Optional
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+# Только заказы, которые больше не меняются
+ARCHIVED_STATUSES = ('delivered', 'cancelled')
+
+# Таблица, её архив и колонка с id заказа - в порядке внешних ключей
+MOVES = (
+    (Order, ArchivedOrder, 'id'),
+    (OrderItem, ArchivedOrderItem, 'order_id'),
+)
+
+
+def months_ago(months: int, now: Optional[datetime] = None) -> datetime:
+    """Тот же день и время months месяцев назад (31 марта - 1 месяц = 28/29 февраля)."""
+    now = now or timezone.now()
+    month_index = now.year * 12 + now.month - 1 - months
+    year, month = divmod(month_index, 12)
+    day = min(now.day, calendar.monthrange(year, month + 1)[1])
+    return now.replace(year=year, month=month + 1, day=day)
+
+
+def archive(before: datetime, batch_size: int = 1000) -> int:
+    """Перенести в архив завершённые заказы, созданные раньше before; вернуть их число."""
+    archived = 0
+    while True:
+        moved = archive_batch(before, batch_size)
+        archived += moved
+        if moved < batch_size:
+            return archived
+
+
+def archive_batch(before: datetime, batch_size: int) -> int:
+    """Одна пачка archive() в своей транзакции."""
+    using = router.db_for_write(Order)
+    with transaction.atomic(using=using):
+        order_ids = list(
+            Order.objects.using(using).select_for_update(skip_locked=True)
+            .filter(status__in=ARCHIVED_STATUSES, created_at__lt=before)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if order_ids:
+            _move(using, order_ids, timezone.now())
+        return len(order_ids)
+
+
+def _move(using: str, order_ids: List[int], archived_at: datetime) -> None:
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    archived_at = ArchivedOrder._meta.get_field('archived_at').get_db_prep_value(
+        archived_at, connection
+    )
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    with connection.cursor() as cursor:
+        for source, target, key in MOVES:
+            columns = [quote(field.column) for field in source._meta.concrete_fields]
+            values, params = list(columns), []
+            if target is ArchivedOrder:
+                columns.append(quote('archived_at'))
+                values.append('%s')
+                params.append(archived_at)
+            cursor.execute(
+                f'INSERT INTO {quote(target._meta.db_table)} ({", ".join(columns)}) '
+                f'SELECT {", ".join(values)} FROM {quote(source._meta.db_table)} '
+                f'WHERE {quote(key)} IN ({placeholders})',
+                params + order_ids,
+            )
+        # Сначала позиции, потом заказы - внешний ключ orders_orderitem.order_id
+        for source, _, key in reversed(MOVES):
+            cursor.execute(f'DELETE FROM {quote(source._meta.db_table)} '
+                           f'WHERE {quote(key)} IN ({placeholders})', order_ids)
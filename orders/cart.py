@@ -1,74 +1,138 @@
 """
-Модуль корзины для управления товарами в сессии пользователя.
+Модуль корзины для управления товарами пользователя.
+Где хранятся строки корзины, определяет бэкенд из настройки CART_BACKEND.
 """
 from decimal import Decimal
-from typing import Dict, Iterator, Any
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from django.conf import settings
 
+from config.metrics import CART_OPERATIONS
 from products.models import Product
 
+from . import reservations
+from .cart_backends import get_cart_backend, get_cart_key
+
+# Поля товара, нужные страницам корзины и оформления заказа (без description)
+LINE_PRODUCT_FIELDS = (
+    'id', 'name', 'slug', 'price', 'stock', 'reserved', 'is_active',
+    'category__id', 'category__name', 'category__slug',
+)
+
 
 class Cart:
     """
-    Класс для управления корзиной покупок в сессии Django.
-    В сессии ВСЕГДА хранятся только JSON-сериализуемые типы.
+    Класс для управления корзиной покупок.
+    В строках корзины ВСЕГДА хранятся только JSON-сериализуемые типы.
     """
 
     def __init__(self, request):
+        self.request = request
         self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-
-        if not cart:
-            cart = self.session[settings.CART_SESSION_ID] = {}
-
-        self.cart = cart
+        self.backend = get_cart_backend(request)
+        self.cart = self.backend.load()
+        # Счётчик единиц товара и сумма в центах поддерживаются инкрементально
+        self._count, self._total_cents = self._recalculate()
+        # Снимок строк с товарами; сбрасывается при любом изменении корзины
+        self._lines: Optional[List[Dict[str, Any]]] = None
 
     def add(self, product: Product, quantity: int = 1, override_quantity: bool = False) -> Dict[str, str]:
-        import sys
-
+        operation = 'update' if override_quantity else 'add'
         product_id = str(product.id)
-        print(f"  Cart.add: {product.name}, qty={quantity}", file=sys.stderr)
 
         if quantity > product.stock:
+            CART_OPERATIONS.inc(operation, 'error')
             return {
                 'status': 'error',
                 'message': f'Available stock: {product.stock}. Cannot add {quantity} items.'
             }
 
-        if product_id not in self.cart:
-            print(f"    Новый товар, price={product.price} ({type(product.price)})", file=sys.stderr)
-            self.cart[product_id] = {
-                'quantity': 0,
-                'price': str(product.price)  # КОНВЕРТИРУЕМ В СТРОКУ!
-            }
-            print(f"    Сохранено как: {self.cart[product_id]['price']} ({type(self.cart[product_id]['price'])})",
-                  file=sys.stderr)
+        item = self.cart.get(product_id)
+        old_quantity = item['quantity'] if item else 0
 
         if override_quantity:
             new_quantity = quantity
         else:
-            new_quantity = self.cart[product_id]['quantity'] + quantity
+            new_quantity = old_quantity + quantity
 
         if new_quantity > product.stock:
+            CART_OPERATIONS.inc(operation, 'error')
             return {
                 'status': 'error',
                 'message': f'Cannot add more. Maximum available: {product.stock}'
             }
 
-        self.cart[product_id]['quantity'] = new_quantity
-        self.save()
+        # Резервируем остаток на время жизни корзины, чтобы он не кончился к оформлению
+        if not reservations.reserve(get_cart_key(self.session, create=True), product, new_quantity):
+            CART_OPERATIONS.inc(operation, 'error')
+            return {
+                'status': 'error',
+                'message': f'Cannot add more. Maximum available: '
+                           f'{product.available_stock + old_quantity}'
+            }
+
+        if item is None:
+            item = self.cart[product_id] = {
+                'quantity': 0,
+                'price': str(product.price)  # КОНВЕРТИРУЕМ В СТРОКУ!
+            }
+
+        item['quantity'] = new_quantity
+        self._apply_delta(item, new_quantity - old_quantity)
+        self.save(product_id)
+        CART_OPERATIONS.inc(operation, 'success')
 
         return {
             'status': 'success',
             'message': f'{product.name} added to cart'
         }
 
+    def merge(self, lines: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Слить сохранённую корзину (например, сделанную до входа) с текущей.
+
+        Все товары загружаются одним запросом, строки сливаются за один проход
+        и сохраняются одной записью. Количество - максимум из двух корзин, но не
+        больше остатка: сохранённая копия обычно совпадает с текущей корзиной,
+        и сложение удвоило бы количество.
+        """
+        product_ids = [int(product_id) for product_id in lines if str(product_id).isdigit()]
+        products = Product.objects.filter(is_active=True).in_bulk(product_ids)
+        cart_key = get_cart_key(self.session, create=True)
+
+        changed = []
+        for product_id, product in products.items():
+            product_id = str(product_id)
+            item = self.cart.get(product_id)
+            old_quantity = item['quantity'] if item else 0
+            new_quantity = min(max(lines[product_id]['quantity'], old_quantity), product.stock)
+            if new_quantity <= old_quantity:
+                continue
+            if not reservations.reserve(cart_key, product, new_quantity):
+                continue
+
+            if item is None:
+                item = self.cart[product_id] = {
+                    'quantity': 0,
+                    'price': str(lines[product_id].get('price', product.price)),
+                }
+            item['quantity'] = new_quantity
+            self._apply_delta(item, new_quantity - old_quantity)
+            changed.append(product_id)
+
+        self.backend.save_lines(self.cart, changed)
+        CART_OPERATIONS.inc('merge', 'success')
+
     def remove(self, product: Product) -> None:
         product_id = str(product.id)
         if product_id in self.cart:
-            del self.cart[product_id]
-            self.save()
+            cart_key = get_cart_key(self.session)
+            if cart_key is not None:
+                reservations.release(cart_key, product)
+            item = self.cart.pop(product_id)
+            self._apply_delta(item, -item['quantity'])
+            self.backend.delete_line(self.cart, product_id)
+            CART_OPERATIONS.inc('remove', 'success')
 
     def update(self, product: Product, quantity: int) -> Dict[str, str]:
         if quantity <= 0:
@@ -79,51 +143,65 @@ class Cart:
             }
         return self.add(product, quantity, override_quantity=True)
 
-    def save(self) -> None:
-        """Сохранить корзину в сессии - ПРИНУДИТЕЛЬНАЯ КОНВЕРТАЦИЯ!"""
-        from decimal import Decimal
-
-        # Конвертируем ВСЕ Decimal в строки
-        for product_id, item in self.cart.items():
-            for key, value in list(item.items()):
-                if isinstance(value, Decimal):
-                    self.cart[product_id][key] = str(value)
+    def save(self, product_id: str) -> None:
+        """Сохранить строку корзины через бэкенд."""
+        self.backend.save_line(self.cart, product_id)
 
-        self.session.modified = True
+    def clear(self, release_stock: bool = True) -> None:
+        """
+        Очистить корзину. release_stock=False - резервы уже забраны
+        оформлением заказа и снимать их не нужно.
+        """
+        cart_key = get_cart_key(self.session)
+        if release_stock and cart_key is not None:
+            reservations.release_cart(cart_key)
+        self.backend.clear()
+        self.cart = {}
+        CART_OPERATIONS.inc('clear', 'success')
+        self._count, self._total_cents = 0, 0
+        self._lines = None
+        self.request._cart_items_count = 0
 
-    def clear(self) -> None:
-        if settings.CART_SESSION_ID in self.session:
-            del self.session[settings.CART_SESSION_ID]
-        self.save()
+    def get_lines(self) -> List[Dict[str, Any]]:
+        """
+        Строки корзины вместе с товарами.
+        Товары загружаются одним запросом (только LINE_PRODUCT_FIELDS, категория
+        присоединена), а результат запоминается до следующего изменения корзины.
+        """
+        if self._lines is None:
+            products = (
+                Product.objects.select_related('category')
+                .only(*LINE_PRODUCT_FIELDS)
+                .in_bulk([int(product_id) for product_id in self.cart])
+            )
+            lines = []
+            for product_id, item in self.cart.items():
+                product = products.get(int(product_id))
+                if product is None:
+                    continue
+                price = Decimal(item['price'])
+                lines.append({
+                    'product': product,
+                    'quantity': item['quantity'],
+                    'price': price,
+                    'total_price': price * item['quantity'],
+                })
+            self._lines = lines
+        return self._lines
 
     def __iter__(self) -> Iterator[Dict[str, Any]]:
         """
         Итерация по товарам в корзине.
         ТОЛЬКО ДЛЯ ЧТЕНИЯ - НИЧЕГО НЕ СОХРАНЯЕТ!
         """
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-
-        # СОЗДАЁМ НОВЫЙ СЛОВАРЬ ДЛЯ ИТЕРАЦИИ
-        for product in products:
-            product_id = str(product.id)
-            if product_id in self.cart:
-                yield {
-                    'product': product,
-                    'quantity': self.cart[product_id]['quantity'],
-                    'price': Decimal(self.cart[product_id]['price']),
-                    'total_price': Decimal(self.cart[product_id]['price']) * self.cart[product_id]['quantity']
-                }
+        return iter(self.get_lines())
 
     def __len__(self) -> int:
-        return sum(item['quantity'] for item in self.cart.values())
+        return self._count
 
     def get_total_price(self) -> Decimal:
         """Вернуть Decimal для использования в коде"""
-        return sum(
-            Decimal(item['price']) * item['quantity']
-            for item in self.cart.values()
-        )
+        return Decimal(self._total_cents).scaleb(-2)
 
     def get_items_count(self) -> int:
         return len(self.cart)
@@ -131,4 +209,76 @@ class Cart:
     def copy(self):
         """Создать копию корзины - все данные уже JSON-сериализуемы"""
         import copy
-        return copy.deepcopy(self.cart)
\ No newline at end of file
+        return copy.deepcopy(self.cart)
+
+    def _apply_delta(self, item: Dict[str, Any], quantity_delta: int) -> None:
+        """Обновить счётчики за O(1) при изменении количества в одной строке."""
+        self._count += quantity_delta
+        self._total_cents += _to_cents(item['price']) * quantity_delta
+        # CartCountCookieMiddleware перенесёт новое значение в cookie бейджа
+        self.request._cart_items_count = self._count
+        self._lines = None
+        if settings.CART_CHECK_CONSISTENCY:
+            self.assert_consistent()
+
+    def _recalculate(self) -> Tuple[int, int]:
+        """Посчитать количество и сумму в центах полным проходом по корзине."""
+        count = total_cents = 0
+        for item in self.cart.values():
+            count += item['quantity']
+            total_cents += _to_cents(item['price']) * item['quantity']
+        return count, total_cents
+
+    def assert_consistent(self) -> None:
+        """Проверить, что инкрементальные счётчики совпадают с полным пересчётом."""
+        expected = self._recalculate()
+        if (self._count, self._total_cents) != expected:
+            raise AssertionError(
+                f'Cart totals out of sync: cached={(self._count, self._total_cents)}, '
+                f'recalculated={expected}'
+            )
+
+
+def get_cart(request) -> Cart:
+    """
+    Корзина текущего запроса. Создаётся один раз, поэтому view, шаблоны и
+    контекстный процессор работают с одним и тем же снимком строк.
+    """
+    cart = getattr(request, '_cart', None)
+    if cart is None:
+        cart = request._cart = Cart(request)
+    return cart
+
+
+def get_cart_items_count(request) -> int:
+    """
+    Количество товаров для бейджа корзины в шапке.
+
+    Сначала читается подписанная cookie, и сессия не загружается вовсе.
+    Если cookie нет или она выписана для другой сессии (например, ключ
+    сменился при логине), количество считается по корзине и зеркалируется
+    в cookie заново.
+    """
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session_key is None:
+        return 0
+
+    count = request.get_signed_cookie(
+        settings.CART_COUNT_COOKIE_NAME, default=None, salt=cart_count_cookie_salt(session_key)
+    )
+    if count is not None and count.isdigit():
+        return int(count)
+
+    count = len(get_cart(request))
+    request._cart_items_count = count
+    return count
+
+
+def cart_count_cookie_salt(session_key: str) -> str:
+    """Соль подписи привязывает cookie бейджа к конкретной сессии."""
+    return f'orders.cart_count:{session_key}'
+
+
+def _to_cents(price: str) -> int:
+    """Перевести цену из строки ('12.50') в целое число центов."""
+    return int(Decimal(price).scaleb(2))
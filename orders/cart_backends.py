@@ -0,0 +1,186 @@
+"""
+Бэкенды хранения корзины.
+
+Cart работает со словарём строк вида {product_id: {'quantity': int, 'price': str}},
+а бэкенд отвечает за то, где этот словарь живёт между запросами.
+Нужный бэкенд выбирается настройкой CART_BACKEND.
+"""
+import uuid
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+CartLines = Dict[str, Dict[str, Any]]
+
+
+def get_cart_key(session, create: bool = False) -> Optional[str]:
+    """
+    Вернуть стабильный идентификатор корзины, хранящийся в сессии.
+
+    Ключ сессии меняется при логине (cycle_key), а этот идентификатор
+    переживает его вместе с остальными данными сессии.
+    """
+    cart_key = session.get(settings.CART_KEY_SESSION_ID)
+    if cart_key is None and create:
+        cart_key = session[settings.CART_KEY_SESSION_ID] = uuid.uuid4().hex
+    return cart_key
+
+
+class CartBackend:
+    """Базовый класс бэкенда корзины."""
+
+    def __init__(self, request):
+        self.request = request
+        self.session = request.session
+
+    def load(self) -> CartLines:
+        """Загрузить все строки корзины."""
+        raise NotImplementedError
+
+    def save_line(self, lines: CartLines, product_id: str) -> None:
+        """Сохранить одну изменённую строку (lines уже содержит новое значение)."""
+        raise NotImplementedError
+
+    def save_lines(self, lines: CartLines, product_ids: List[str]) -> None:
+        """Сохранить сразу несколько изменённых строк."""
+        for product_id in product_ids:
+            self.save_line(lines, product_id)
+
+    def delete_line(self, lines: CartLines, product_id: str) -> None:
+        """Удалить строку (из lines она уже удалена)."""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """Удалить корзину целиком."""
+        raise NotImplementedError
+
+
+class SessionCartBackend(CartBackend):
+    """Корзина целиком лежит в сессии (поведение по умолчанию)."""
+
+    def load(self) -> CartLines:
+        # Пустую корзину в сессию не кладём, чтобы не создавать запись в django_session
+        return self.session.get(settings.CART_SESSION_ID) or {}
+
+    def save_line(self, lines: CartLines, product_id: str) -> None:
+        self.session[settings.CART_SESSION_ID] = lines
+
+    def save_lines(self, lines: CartLines, product_ids: List[str]) -> None:
+        if product_ids:
+            self.session[settings.CART_SESSION_ID] = lines
+
+    def delete_line(self, lines: CartLines, product_id: str) -> None:
+        if lines:
+            self.session[settings.CART_SESSION_ID] = lines
+        else:
+            self.clear()
+
+    def clear(self) -> None:
+        if settings.CART_SESSION_ID in self.session:
+            del self.session[settings.CART_SESSION_ID]
+
+
+class CacheCartBackend(CartBackend):
+    """
+    Корзина хранится в кэше (locmem, Redis и т.п.) под ключом корзины.
+    В сессии остаётся только идентификатор, который пишется один раз.
+    """
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.cache = caches[settings.CART_CACHE_ALIAS]
+
+    def _cache_key(self, create: bool = False) -> Optional[str]:
+        cart_key = get_cart_key(self.session, create=create)
+        return f'cart:{cart_key}' if cart_key else None
+
+    def load(self) -> CartLines:
+        key = self._cache_key()
+        if key is None:
+            return {}
+        return self.cache.get(key) or {}
+
+    def _store(self, lines: CartLines) -> None:
+        self.cache.set(self._cache_key(create=True), lines, settings.SESSION_COOKIE_AGE)
+
+    def save_line(self, lines: CartLines, product_id: str) -> None:
+        self._store(lines)
+
+    def save_lines(self, lines: CartLines, product_ids: List[str]) -> None:
+        if product_ids:
+            self._store(lines)
+
+    def delete_line(self, lines: CartLines, product_id: str) -> None:
+        self._store(lines)
+
+    def clear(self) -> None:
+        key = self._cache_key()
+        if key is not None:
+            self.cache.delete(key)
+
+
+class DatabaseCartBackend(CartBackend):
+    """
+    Корзина хранится в таблице CartLine: каждая строка пишется отдельным
+    upsert'ом, а сессия не перезаписывается при изменении корзины.
+    """
+
+    def load(self) -> CartLines:
+        from .models import CartLine
+
+        cart_key = get_cart_key(self.session)
+        if cart_key is None:
+            return {}
+        rows = CartLine.objects.filter(cart_key=cart_key).values_list(
+            'product_id', 'quantity', 'price'
+        )
+        return {
+            str(product_id): {'quantity': quantity, 'price': str(price)}
+            for product_id, quantity, price in rows
+        }
+
+    def save_line(self, lines: CartLines, product_id: str) -> None:
+        self.save_lines(lines, [product_id])
+
+    def save_lines(self, lines: CartLines, product_ids: List[str]) -> None:
+        from .models import CartLine
+
+        if not product_ids:
+            return
+        cart_key = get_cart_key(self.session, create=True)
+        # INSERT ... ON CONFLICT DO UPDATE - один запрос на любое число строк
+        CartLine.objects.bulk_create(
+            [
+                CartLine(
+                    cart_key=cart_key,
+                    product_id=int(product_id),
+                    quantity=lines[product_id]['quantity'],
+                    price=lines[product_id]['price'],
+                )
+                for product_id in product_ids
+            ],
+            update_conflicts=True,
+            unique_fields=['cart_key', 'product'],
+            update_fields=['quantity', 'price', 'updated_at'],
+        )
+
+    def delete_line(self, lines: CartLines, product_id: str) -> None:
+        from .models import CartLine
+
+        cart_key = get_cart_key(self.session)
+        if cart_key is not None:
+            CartLine.objects.filter(cart_key=cart_key, product_id=int(product_id)).delete()
+
+    def clear(self) -> None:
+        from .models import CartLine
+
+        cart_key = get_cart_key(self.session)
+        if cart_key is not None:
+            CartLine.objects.filter(cart_key=cart_key).delete()
+
+
+def get_cart_backend(request) -> CartBackend:
+    """Создать бэкенд корзины, указанный в настройке CART_BACKEND."""
+    return import_string(settings.CART_BACKEND)(request)
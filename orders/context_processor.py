@@ -2,18 +2,18 @@
 Контекстные процессоры для корзины.
 Делают информацию о корзине доступной во всех шаблонах.
 """
-from .cart import Cart
+from django.utils.functional import SimpleLazyObject
+
+from .cart import get_cart, get_cart_items_count
 
 
 def cart(request):
     """
     Добавляет объект корзины в контекст всех шаблонов.
-    Возвращаем ТОЛЬКО количество товаров, без итерации по корзине!
+    Оба значения ленивые: сессия читается, только если шаблон их использует,
+    а количество для бейджа по возможности берётся из подписанной cookie.
     """
-    cart_obj = Cart(request)
-
-    # ✅ НЕ вызываем __iter__! Только безопасные методы
     return {
-        'cart': cart_obj,
-        'cart_items_count': len(cart_obj),  # __len__ безопасен!
-    }
\ No newline at end of file
+        'cart': SimpleLazyObject(lambda: get_cart(request)),
+        'cart_items_count': SimpleLazyObject(lambda: get_cart_items_count(request)),
+    }
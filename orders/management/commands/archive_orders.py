@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.archive import archive, months_ago
+
+
+class Command(BaseCommand):
+    help = "Перенести завершённые заказы старше --months месяцев в архивные таблицы"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.ORDERS_ARCHIVE_AFTER_MONTHS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        before = months_ago(options['months'])
+        archived = archive(before, batch_size=options['batch_size'])
+        self.stdout.write(f"Archived {archived} orders created before {before:%Y-%m-%d}")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from orders.models import DailyProductSales, DailySales
+from orders.sales import rebuild
+
+
+class Command(BaseCommand):
+    help = "Пересчитать дневные сводки продаж (DailySales, DailyProductSales) по всем заказам"
+
+    def handle(self, *args, **options):
+        rebuild()
+        self.stdout.write(
+            f"Rebuilt {DailySales.objects.count()} daily sales rows and "
+            f"{DailyProductSales.objects.count()} daily product sales rows"
+        )
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:53
+
+import django.db.models.deletion
+from django.conf import settings
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_stats(apps, schema_editor):
+    """Сводки по уже оформленным заказам: один GROUP BY по всей истории."""
+    Order = apps.get_model('orders', 'Order')
+    UserOrderStats = apps.get_model('orders', 'UserOrderStats')
+    rows = (
+        Order.objects.order_by()
+        .values('user_id')
+        .annotate(
+            order_count=Count('id'),
+            total_spent=Coalesce(Sum('total_price', filter=~Q(status='cancelled')),
+                                 Decimal('0.00')),
+            last_order_at=Max('created_at'),
+        )
+    )
+    UserOrderStats.objects.bulk_create(
+        (UserOrderStats(**row) for row in rows.iterator()), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_hot_path_indexes'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserOrderStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Статистика заказов пользователя',
+                'verbose_name_plural': 'Статистика заказов пользователей',
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
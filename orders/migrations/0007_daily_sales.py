@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:59
+
+from itertools import islice
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_sales(apps, schema_editor):
+    """Сводки по уже оформленным заказам (как orders.sales.rebuild)."""
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    DailySales = apps.get_model('orders', 'DailySales')
+    DailyProductSales = apps.get_model('orders', 'DailyProductSales')
+    orders = (
+        Order.objects.order_by()
+        .annotate(date=TruncDate('created_at'))
+        .values('date', 'status', 'payment_method')
+        .annotate(order_count=Count('id'), revenue=Sum('total_price'))
+    )
+    products = (
+        OrderItem.objects.order_by()
+        .annotate(date=TruncDate('order__created_at'), status=F('order__status'))
+        .values('date', 'status', 'product_id')
+        .annotate(units=Sum('quantity'),
+                  revenue=Sum(F('price') * F('quantity'), output_field=DecimalField()))
+    )
+    for model, rows in ((DailySales, orders), (DailyProductSales, products)):
+        objects = (model(**row) for row in rows.iterator(chunk_size=5000))
+        while batch := list(islice(objects, 5000)):
+            model.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_user_order_stats'),
+        ('products', '0007_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('payment_method', models.CharField(choices=[('debit', 'Debit Card'), ('credit', 'Credit Card'), ('cash', 'Cash on Delivery'), ('paypal', 'PayPal'), ('wallet', 'Digital Wallet')], max_length=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Продажи за день',
+                'verbose_name_plural': 'Продажи по дням',
+                'constraints': [models.UniqueConstraint(fields=('date', 'status', 'payment_method'), name='unique_daily_sales')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Продажи товара за день',
+                'verbose_name_plural': 'Продажи товаров по дням',
+                'constraints': [models.UniqueConstraint(fields=('date', 'status', 'product'), name='unique_daily_product_sales')],
+            },
+        ),
+        migrations.RunPython(fill_sales, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 from products.models import Product
 
@@ -22,7 +23,8 @@ PAYMENT_METHOD_CHOICES = [
 User = settings.AUTH_USER_MODEL
 
 
-class Order(models.Model):
+class AbstractOrder(models.Model):
+    """Колонки заказа, общие для orders_order и архива (ArchivedOrder)."""
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -55,14 +57,26 @@ class Order(models.Model):
     def __str__(self):
         return f"Order #{self.id} by {self.user}"
 
+    class Meta:
+        abstract = True
+
+
+class Order(AbstractOrder):
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
         ordering = ['-created_at']
+        indexes = [
+            # История заказов пользователя и курсоры OrderPagination
+            models.Index(fields=['user', '-created_at', '-id'], name='orders_user_created_idx'),
+            # Список заказов в админке: сортировка по дате и фильтры is_paid, created_at
+            models.Index(fields=['-created_at'], name='orders_created_idx'),
+            models.Index(fields=['is_paid', '-created_at'], name='orders_paid_created_idx'),
+        ]
 
 
-class OrderItem(models.Model):
-    order = models.ForeignKey(Order, related_name="items", on_delete=models.CASCADE)
+class AbstractOrderItem(models.Model):
+    """Колонки позиции заказа, общие для orders_orderitem и архива."""
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -71,4 +85,171 @@ class OrderItem(models.Model):
         return f"{self.product.name} x {self.quantity}"
 
     def get_cost(self):
-        return self.price * self.quantity
\ No newline at end of file
+        return self.price * self.quantity
+
+    class Meta:
+        abstract = True
+
+
+class OrderItem(AbstractOrderItem):
+    order = models.ForeignKey(Order, related_name="items", on_delete=models.CASCADE)
+
+
+class ArchivedOrder(AbstractOrder):
+    """
+    Старый завершённый заказ, перенесённый из orders_order командой
+    archive_orders (см. orders.archive) с тем же id и временными метками.
+    Архив только читается: API и кабинет показывают его по явному запросу.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Архивный заказ"
+        verbose_name_plural = "Архив заказов"
+        ordering = ['-created_at']
+        indexes = [
+            # Архивная история пользователя по тем же курсорам, что и основная
+            models.Index(fields=['user', '-created_at', '-id'], name='orders_archived_user_idx'),
+        ]
+
+
+class ArchivedOrderItem(AbstractOrderItem):
+    """Позиция архивного заказа (тот же id, что был в orders_orderitem)."""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, related_name="items", on_delete=models.CASCADE)
+
+    class Meta:
+        verbose_name = "Позиция архивного заказа"
+        verbose_name_plural = "Позиции архивных заказов"
+
+
+class CartLine(models.Model):
+    """Строка корзины для DatabaseCartBackend."""
+    cart_key = models.CharField(max_length=32)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.cart_key}: {self.product_id} x {self.quantity}"
+
+    class Meta:
+        verbose_name = "Строка корзины"
+        verbose_name_plural = "Строки корзины"
+        constraints = [
+            models.UniqueConstraint(fields=['cart_key', 'product'], name='unique_cart_line'),
+        ]
+
+
+class StockReservation(models.Model):
+    """Временный резерв товара под корзину (см. orders.reservations)."""
+    cart_key = models.CharField(max_length=32)
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.product_id} x {self.quantity} until {self.expires_at:%H:%M}"
+
+    class Meta:
+        verbose_name = "Резерв товара"
+        verbose_name_plural = "Резервы товаров"
+        constraints = [
+            models.UniqueConstraint(fields=['cart_key', 'product'],
+                                    name='unique_stock_reservation'),
+        ]
+
+
+class UserOrderStats(models.Model):
+    """
+    Сводка по заказам пользователя для шапки личного кабинета (см. orders.stats).
+
+    Обновляется в той же транзакции, что оформление заказа и смена его статуса
+    или суммы, поэтому страница читает одну строку вместо агрегации истории.
+    Отменённые заказы входят в order_count, но не в total_spent.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, primary_key=True, related_name='order_stats',
+        on_delete=models.CASCADE,
+    )
+    order_count = models.PositiveIntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.order_count} orders, {self.total_spent}"
+
+    class Meta:
+        verbose_name = "Статистика заказов пользователя"
+        verbose_name_plural = "Статистика заказов пользователей"
+
+
+class DailySales(models.Model):
+    """
+    Заказы и выручка за день по статусу и способу оплаты (см. orders.sales).
+    День - дата создания заказа в TIME_ZONE; смена статуса переносит заказ
+    между строками того же дня.
+    """
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date} {self.status}/{self.payment_method}: {self.revenue}"
+
+    class Meta:
+        verbose_name = "Продажи за день"
+        verbose_name_plural = "Продажи по дням"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status', 'payment_method'],
+                                    name='unique_daily_sales'),
+        ]
+
+
+class DailyProductSales(models.Model):
+    """Проданные единицы и выручка товара за день по статусу заказа (см. orders.sales)."""
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    product = models.ForeignKey(Product, related_name='daily_sales', on_delete=models.CASCADE)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date} {self.product_id} ({self.status}): {self.units}"
+
+    class Meta:
+        verbose_name = "Продажи товара за день"
+        verbose_name_plural = "Продажи товаров по дням"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status', 'product'],
+                                    name='unique_daily_product_sales'),
+        ]
+
+
+class OrderStatusEvent(models.Model):
+    """
+    Смена статуса заказа (см. orders.transitions). Записи только добавляются:
+    без внешнего ключа в базе журнал переживает архивацию и удаление заказа.
+    """
+    order = models.ForeignKey(Order, related_name='status_events', on_delete=models.DO_NOTHING,
+                              db_constraint=False)
+    from_status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    changed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, related_name='+',
+        on_delete=models.SET_NULL,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Order #{self.order_id}: {self.from_status} -> {self.to_status}"
+
+    class Meta:
+        verbose_name = "Смена статуса заказа"
+        verbose_name_plural = "История статусов заказов"
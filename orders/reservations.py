@@ -0,0 +1,151 @@
+"""
+Временное резервирование остатков под корзину.
+
+Product.reserved - счётчик единиц, удерживаемых активными резервами, поэтому
+доступный остаток (stock - reserved) читается из строки товара без агрегации.
+Резерв берётся одним условным UPDATE без долгих блокировок, а просроченные
+резервы снимает пакетная очистка release_expired().
+"""
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, When
+from django.utils import timezone
+
+from products.models import Product
+
+from .models import StockReservation
+
+
+def reserve(cart_key: str, product: Product, quantity: int) -> bool:
+    """
+    Установить резерв корзины на товар равным quantity единиц и продлить его TTL.
+    Вернуть False, если свободного остатка не хватает (резерв не меняется).
+    """
+    with transaction.atomic():
+        existing = (
+            StockReservation.objects.select_for_update()
+            .filter(cart_key=cart_key, product=product)
+            .first()
+        )
+        held = existing.quantity if existing else 0
+        delta = quantity - held
+
+        if delta > 0 and not _increment_reserved(product.id, delta):
+            # Возможно, место занимают просроченные, но ещё не снятые резервы
+            release_expired(product_ids=[product.id], exclude_cart_key=cart_key)
+            if not _increment_reserved(product.id, delta):
+                return False
+        elif delta < 0:
+            Product.objects.filter(id=product.id).update(reserved=F('reserved') + delta)
+
+        if quantity == 0:
+            if existing:
+                existing.delete()
+            return True
+
+        StockReservation.objects.bulk_create(
+            [StockReservation(
+                cart_key=cart_key,
+                product=product,
+                quantity=quantity,
+                expires_at=timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL),
+            )],
+            update_conflicts=True,
+            unique_fields=['cart_key', 'product'],
+            update_fields=['quantity', 'expires_at'],
+        )
+    return True
+
+
+def release(cart_key: str, product: Product) -> None:
+    """Снять резерв корзины на товар."""
+    reserve(cart_key, product, 0)
+
+
+def release_cart(cart_key: str) -> None:
+    """Снять все резервы корзины."""
+    with transaction.atomic():
+        rows = list(
+            StockReservation.objects.select_for_update()
+            .filter(cart_key=cart_key)
+            .values_list('id', 'product_id', 'quantity')
+        )
+        _delete_and_release(rows)
+
+
+def consume(cart_key: str) -> Dict[int, int]:
+    """
+    Забрать резервы корзины при оформлении заказа: строки резервов удаляются,
+    а удерживаемое количество возвращается как {product_id: quantity}.
+    Счётчик reserved вызывающий уменьшает сам вместе со списанием остатка.
+    Вызывать внутри transaction.atomic().
+    """
+    rows = list(
+        StockReservation.objects.select_for_update()
+        .filter(cart_key=cart_key)
+        .values_list('id', 'product_id', 'quantity')
+    )
+    if rows:
+        StockReservation.objects.filter(id__in=[row[0] for row in rows]).delete()
+    return {product_id: quantity for _, product_id, quantity in rows}
+
+
+def release_expired(
+    batch_size: int = 1000,
+    product_ids: Iterable[int] = None,
+    exclude_cart_key: str = None,
+) -> int:
+    """
+    Снять просроченные резервы пачками по batch_size.
+    Строки, заблокированные другими транзакциями, пропускаются (SKIP LOCKED).
+    Вернуть количество снятых резервов.
+    """
+    released = 0
+    while True:
+        with transaction.atomic():
+            queryset = StockReservation.objects.filter(expires_at__lte=timezone.now())
+            if product_ids is not None:
+                queryset = queryset.filter(product_id__in=product_ids)
+            if exclude_cart_key is not None:
+                queryset = queryset.exclude(cart_key=exclude_cart_key)
+            rows = list(
+                queryset.select_for_update(skip_locked=True)
+                .order_by('expires_at')
+                .values_list('id', 'product_id', 'quantity')[:batch_size]
+            )
+            _delete_and_release(rows)
+        released += len(rows)
+        if len(rows) < batch_size:
+            return released
+
+
+def _increment_reserved(product_id: int, quantity: int) -> bool:
+    """UPDATE ... SET reserved = reserved + q WHERE stock - reserved >= q."""
+    return bool(
+        Product.objects.filter(id=product_id, stock__gte=F('reserved') + quantity)
+        .update(reserved=F('reserved') + quantity)
+    )
+
+
+def _delete_and_release(rows: List[Tuple[int, int, int]]) -> None:
+    """Удалить строки резервов и одним UPDATE уменьшить счётчики товаров."""
+    if not rows:
+        return
+    StockReservation.objects.filter(id__in=[row[0] for row in rows]).delete()
+
+    totals = defaultdict(int)
+    for _, product_id, quantity in rows:
+        totals[product_id] += quantity
+    # Блокируем товары по возрастанию id, как и оформление заказа
+    list(Product.objects.select_for_update().filter(id__in=totals).order_by('id').values_list('id'))
+    Product.objects.filter(id__in=totals).update(
+        reserved=Case(
+            *[When(id=product_id, then=F('reserved') - quantity)
+              for product_id, quantity in totals.items()],
+            output_field=PositiveIntegerField(),
+        )
+    )
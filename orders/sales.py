@@ -0,0 +1,179 @@
+"""
+Дневные сводки продаж (DailySales, DailyProductSales) вместо агрегации
+всей таблицы заказов в админке.
+
+Вклад заказа - один заказ и его сумма в строке (день, статус, способ оплаты)
+и единицы и выручка его позиций в строках (день, статус, товар). Строки
+меняются INSERT ... ON CONFLICT DO UPDATE с приращениями:
+
+- оформление ставит задачу orders.record_sales со снимком вклада нового
+  заказа (order_contribution), воркер применяет его по одному запросу на
+  таблицу (record_contribution);
+- любое другое изменение заказов вычитает их вклад до изменения и добавляет
+  после (subtract/add по QuerySet), поэтому верно для смены статуса, суммы
+  и способа оплаты, в том числе массовой, и для удаления.
+
+rebuild() пересчитывает сводки с нуля: INSERT ... SELECT на таблицу по
+заказам и ещё один - по архиву заказов (orders.archive).
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+from typing import Iterable, List, Sequence
+
+from django.db import connections, router, transaction
+from django.db.models import Count, DecimalField, F, QuerySet, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ArchivedOrder, DailyProductSales, DailySales, Order, OrderItem
+
+# Строк в одном INSERT (ограничение SQLite на число параметров)
+UPSERT_BATCH_SIZE = 500
+
+ORDER_KEYS = ('date', 'status', 'payment_method')
+ORDER_COUNTERS = ('order_count', 'revenue')
+PRODUCT_KEYS = ('date', 'status', 'product_id')
+PRODUCT_COUNTERS = ('units', 'revenue')
+
+
+def order_totals(orders: QuerySet) -> QuerySet:
+    """Вклад заказов в DailySales: строки с колонками ORDER_KEYS + ORDER_COUNTERS."""
+    return (
+        orders.order_by()
+        .annotate(date=TruncDate('created_at'))
+        .values('date', 'status', 'payment_method')
+        .annotate(order_count=Count('id'), revenue=Sum('total_price'))
+    )
+
+
+def product_totals(orders: QuerySet) -> QuerySet:
+    """Вклад позиций заказов (или архивных заказов) в DailyProductSales."""
+    items = orders.model._meta.get_field('items').related_model
+    return (
+        items.objects.filter(order__in=orders.order_by().values('id'))
+        .annotate(date=TruncDate('order__created_at'), status=F('order__status'))
+        .values('date', 'status', 'product_id')
+        .annotate(units=Sum('quantity'),
+                  revenue=Sum(F('price') * F('quantity'), output_field=DecimalField()))
+    )
+
+
+# Сводка, вклад заказов в неё, ключ и счётчики
+ROLLUPS = (
+    (DailySales, order_totals, ORDER_KEYS, ORDER_COUNTERS),
+    (DailyProductSales, product_totals, PRODUCT_KEYS, PRODUCT_COUNTERS),
+)
+
+
+def order_contribution(order: Order, items: Iterable[OrderItem]) -> dict:
+    """
+    Вклад нового заказа в сводки в виде JSON-совместимого словаря.
+
+    Снимок берётся при оформлении: задача orders.record_sales (orders.tasks)
+    учитывает заказ таким, каким он был создан, даже если до её выполнения
+    заказ успели изменить в админке - изменение само вычтет и добавит вклад.
+    """
+    products = defaultdict(lambda: [0, Decimal('0.00')])
+    for item in items:
+        products[item.product_id][0] += item.quantity
+        products[item.product_id][1] += item.price * item.quantity
+    return {
+        'date': timezone.localdate(order.created_at).isoformat(),
+        'status': order.status,
+        'payment_method': order.payment_method,
+        'total_price': str(order.total_price),
+        'products': [[product_id, units, str(revenue)]
+                     for product_id, (units, revenue) in products.items()],
+    }
+
+
+def record_contribution(date: str, status: str, payment_method: str, total_price: str,
+                        products: List[list]) -> None:
+    """Прибавить к сводкам вклад, полученный из order_contribution()."""
+    date = datetime.date.fromisoformat(date)
+    _upsert(DailySales, ORDER_KEYS, ORDER_COUNTERS,
+            [(date, status, payment_method, 1, Decimal(total_price))])
+    _upsert(DailyProductSales, PRODUCT_KEYS, PRODUCT_COUNTERS, [
+        (date, status, product_id, units, Decimal(revenue))
+        for product_id, units, revenue in products
+    ])
+
+
+def add(orders: QuerySet) -> None:
+    """Добавить вклад заказов (после их изменения)."""
+    _apply(orders, 1)
+
+
+def subtract(orders: QuerySet) -> None:
+    """Вычесть вклад заказов (до их изменения или удаления)."""
+    _apply(orders, -1)
+
+
+def rebuild() -> None:
+    """Пересчитать обе сводки с нуля по всем заказам, включая архив (orders.archive)."""
+    with transaction.atomic(using=router.db_for_write(DailySales)):
+        for model, totals, keys, counters in ROLLUPS:
+            model.objects.all().delete()
+            for orders in (Order.objects.all(), ArchivedOrder.objects.all()):
+                _insert_select(model, keys, counters, totals(orders))
+
+
+def _apply(orders: QuerySet, sign: int) -> None:
+    for model, totals, keys, counters in ROLLUPS:
+        rows = totals(orders).values_list(*keys, *counters)
+        _upsert(model, keys, counters, [
+            (*row[:len(keys)], *(sign * value for value in row[len(keys):])) for row in rows
+        ])
+
+
+def _upsert(model, keys: Sequence[str], counters: Sequence[str], rows: List[tuple]) -> None:
+    """INSERT строк rows; при совпадении ключа keys счётчики counters прибавляются."""
+    if not rows:
+        return
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in (*keys, *counters)]
+    columns = ', '.join(quote(field.column) for field in fields)
+    conflict = ', '.join(quote(model._meta.get_field(name).column) for name in keys)
+    updates = ', '.join(
+        f'{quote(name)} = {table}.{quote(name)} + EXCLUDED.{quote(name)}' for name in counters
+    )
+    row_sql = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start:start + UPSERT_BATCH_SIZE]
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES {", ".join([row_sql] * len(batch))} '
+                f'ON CONFLICT ({conflict}) DO UPDATE SET {updates}',
+                [field.get_db_prep_save(value, connection)
+                 for row in batch for field, value in zip(fields, row)],
+            )
+
+
+def _insert_select(model, keys: Sequence[str], counters: Sequence[str],
+                   totals: QuerySet) -> None:
+    """
+    INSERT INTO ... SELECT по агрегирующему QuerySet без выгрузки строк в Python;
+    при совпадении ключа keys счётчики counters прибавляются.
+    """
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    names = (*keys, *counters)
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in names)
+    conflict = ', '.join(quote(model._meta.get_field(name).column) for name in keys)
+    updates = ', '.join(
+        f'{quote(name)} = {table}.{quote(name)} + EXCLUDED.{quote(name)}' for name in counters
+    )
+    # Порядок колонок подзапроса задаёт компилятор, поэтому выбираем их по псевдонимам
+    aliases = ', '.join(quote(name) for name in names)
+    sql, params = totals.query.sql_with_params()
+    with connection.cursor() as cursor:
+        # WHERE true: без него SQLite принимает ON CONFLICT за часть SELECT
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) SELECT {aliases} FROM ({sql}) totals WHERE true '
+            f'ON CONFLICT ({conflict}) DO UPDATE SET {updates}',
+            params,
+        )
@@ -1,6 +1,9 @@
 from rest_framework import serializers
 
-from .models import Order, OrderItem
+from config.serializers import CompiledSerializer
+
+from .models import STATUS_CHOICES, ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from .transitions import MAX_BATCH_SIZE
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -16,3 +19,28 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['id', 'user', 'full_name', 'phone', 'city', 'address', 'total_price', 'items', 'created_at']
+
+
+class ArchivedOrderItemSerializer(OrderItemSerializer):
+    class Meta(OrderItemSerializer.Meta):
+        model = ArchivedOrderItem
+
+
+class ArchivedOrderSerializer(OrderSerializer):
+    """Архивный заказ (orders.archive) в том же виде, что и OrderSerializer."""
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+
+    class Meta(OrderSerializer.Meta):
+        model = ArchivedOrder
+
+
+class OrderTransitionSerializer(serializers.Serializer):
+    """Партия заказов для массовой смены статуса (OrderViewSet.transition)."""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False,
+                                max_length=MAX_BATCH_SIZE)
+    status = serializers.ChoiceField(choices=STATUS_CHOICES)
+
+
+# Быстрый путь чтения заказов в API (OrderViewSet.list/retrieve)
+order_reader = CompiledSerializer(OrderSerializer)
+archived_order_reader = CompiledSerializer(ArchivedOrderSerializer)
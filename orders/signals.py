@@ -0,0 +1,24 @@
+"""Сигналы приложения заказов."""
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .cart import get_cart
+
+# Ключи, под которыми корзина сохраняется перед переходом на страницу входа
+SAVED_CART_SESSION_KEYS = ('cart_before_login', 'saved_cart', 'cart_backup')
+
+
+@receiver(user_logged_in)
+def merge_saved_cart(sender, request, user, **kwargs):
+    """Один раз при входе перенести сохранённую корзину в корзину сессии."""
+    if request is None or not hasattr(request, 'session'):
+        return
+
+    saved_cart = None
+    for key in SAVED_CART_SESSION_KEYS:
+        value = request.session.pop(key, None)
+        if value and saved_cart is None:
+            saved_cart = value
+
+    if saved_cart:
+        get_cart(request).merge(saved_cart)
@@ -0,0 +1,111 @@
+"""
+Сводка заказов пользователя (UserOrderStats).
+
+Строка меняется одним INSERT/UPDATE с приращениями в той же транзакции, что
+создаёт или меняет заказ: параллельные оформления одного покупателя ждут
+блокировки этой строки и не теряют приращений, а откат заказа откатывает
+и сводку. Полный пересчёт по истории (rebuild) нужен только после удаления
+заказов.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from typing import Iterable, Tuple
+
+from django.db import connections, router
+from django.db.models import Case, Count, DecimalField, F, Max, Q, Sum, When
+from django.db.models.functions import Coalesce
+
+from .models import ArchivedOrder, Order, UserOrderStats
+
+# Отменённые заказы входят в число заказов, но не в сумму покупок
+EXCLUDED_FROM_SPEND = 'cancelled'
+
+
+def spend(status: str, total_price: Decimal) -> Decimal:
+    """Вклад заказа в total_spent."""
+    return Decimal('0.00') if status == EXCLUDED_FROM_SPEND else total_price
+
+
+def record_order(order: Order) -> None:
+    """
+    Учесть новый заказ. Вызывать в транзакции, создавшей заказ.
+
+    Один INSERT ... ON CONFLICT DO UPDATE (PostgreSQL и SQLite): строка
+    создаётся первым заказом покупателя без отдельной проверки и гонки.
+    """
+    connection = connections[router.db_for_write(UserOrderStats)]
+    table = connection.ops.quote_name(UserOrderStats._meta.db_table)
+    last_order_at = UserOrderStats._meta.get_field('last_order_at').get_db_prep_value(
+        order.created_at, connection
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, order_count, total_spent, last_order_at) '
+            'VALUES (%s, 1, %s, %s) '
+            'ON CONFLICT (user_id) DO UPDATE SET '
+            f'order_count = {table}.order_count + 1, '
+            f'total_spent = {table}.total_spent + EXCLUDED.total_spent, '
+            'last_order_at = EXCLUDED.last_order_at',
+            [order.user_id, spend(order.status, order.total_price), last_order_at],
+        )
+
+
+def record_change(order: Order, previous_status: str, previous_total: Decimal) -> None:
+    """Учесть смену статуса или суммы заказа. Вызывать в транзакции изменения."""
+    delta = spend(order.status, order.total_price) - spend(previous_status, previous_total)
+    if delta:
+        UserOrderStats.objects.filter(user_id=order.user_id).update(
+            total_spent=F('total_spent') + delta
+        )
+
+
+def record_status_change(orders: Iterable[Tuple[int, str, Decimal]], status: str) -> None:
+    """
+    Учесть смену статуса заказов (user_id, прежний статус, сумма) на status
+    одним UPDATE с CASE по покупателям. Вызывать в транзакции изменения.
+    """
+    deltas = defaultdict(Decimal)
+    for user_id, previous_status, total_price in orders:
+        deltas[user_id] += spend(status, total_price) - spend(previous_status, total_price)
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if deltas:
+        UserOrderStats.objects.filter(user_id__in=deltas).update(total_spent=Case(
+            *[When(user_id=user_id, then=F('total_spent') + delta)
+              for user_id, delta in deltas.items()],
+            default=F('total_spent'),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ))
+
+
+def rebuild(user_ids: Iterable[int]) -> None:
+    """
+    Пересчитать сводки пользователей по их заказам (после удаления заказов).
+    Архивные заказы (orders.archive) входят в сводку наравне с остальными.
+    """
+    user_ids = set(user_ids)
+    stats = {}
+    for orders in (Order.objects, ArchivedOrder.objects):
+        rows = (
+            orders.filter(user_id__in=user_ids)
+            .order_by()
+            .values('user_id')
+            .annotate(
+                order_count=Count('id'),
+                total_spent=Coalesce(Sum('total_price', filter=~Q(status=EXCLUDED_FROM_SPEND)),
+                                     Decimal('0.00')),
+                last_order_at=Max('created_at'),
+            )
+        )
+        for row in rows:
+            current = stats.get(row['user_id'])
+            if current is None:
+                stats[row['user_id']] = UserOrderStats(**row)
+            else:
+                current.order_count += row['order_count']
+                current.total_spent += row['total_spent']
+                current.last_order_at = max(current.last_order_at, row['last_order_at'])
+    UserOrderStats.objects.bulk_create(
+        list(stats.values()), update_conflicts=True, unique_fields=['user'],
+        update_fields=['order_count', 'total_spent', 'last_order_at'],
+    )
+    UserOrderStats.objects.filter(user_id__in=user_ids - stats.keys()).delete()
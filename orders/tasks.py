@@ -0,0 +1,40 @@
+"""Задачи очереди (jobs), которые оформление заказа ставит вместо работы в запросе."""
+from django.conf import settings
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+
+from jobs.queue import task
+
+from . import sales
+from .models import Order
+
+RECORD_SALES = 'orders.record_sales'
+SEND_ORDER_CONFIRMATION = 'orders.send_order_confirmation'
+
+
+@task(RECORD_SALES)
+def record_sales(**contribution):
+    """Прибавить вклад нового заказа (снимок sales.order_contribution) к дневным сводкам."""
+    sales.record_contribution(**contribution)
+
+
+@task(SEND_ORDER_CONFIRMATION)
+def send_order_confirmation(order_id):
+    """Письмо с подтверждением заказа на email из формы или адрес покупателя."""
+    order = (
+        Order.objects.select_related('user')
+        .prefetch_related('items__product')
+        .filter(id=order_id)
+        .first()
+    )
+    if order is None:
+        return  # Заказ удалён до отправки
+    recipient = order.email or order.user.email
+    if not recipient:
+        return
+    send_mail(
+        subject=f"Hop & Barley: order #{order.id} confirmed",
+        message=render_to_string('emails/order_confirmation.txt', {'order': order}),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[recipient],
+    )
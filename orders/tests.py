@@ -1,3 +1,1143 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import threading
+import uuid
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+import pytest
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from jobs.models import Job
+from products.models import Category, Product
+
+from . import reservations, sales
+from .cart import Cart
+from .models import (
+    CartLine, DailyProductSales, DailySales, Order, OrderItem, OrderStatusEvent, StockReservation,
+    UserOrderStats,
+)
+
+# Пользователь, SELECT и DELETE резервов, SELECT FOR UPDATE товаров, INSERT заказа,
+# INSERT позиций, UPDATE остатков, сводки заказов, INSERT задач очереди,
+# сохранение сессии и две пары SAVEPOINT/RELEASE (сессия читается из кэша)
+CHECKOUT_QUERY_BUDGET = 14
+
+CART_BACKENDS = [
+    'orders.cart_backends.SessionCartBackend',
+    'orders.cart_backends.CacheCartBackend',
+    'orders.cart_backends.DatabaseCartBackend',
+]
+
+
+@pytest.fixture
+def products(db):
+    cat = Category.objects.create(name="Hops", slug="hops")
+    return [
+        Product.objects.create(
+            name=f"Hop {i}", slug=f"hop-{i}", price="2.50", category=cat, stock=10
+        )
+        for i in range(3)
+    ]
+
+
+def session_request(rf):
+    request = rf.get('/')
+    request.session = SessionStore()
+    return request
+
+
+@pytest.mark.django_db
+class TestCartBackends:
+    @pytest.mark.parametrize('backend', CART_BACKENDS)
+    def test_add_update_remove(self, settings, products, backend):
+        settings.CART_BACKEND = backend
+        client = Client()
+
+        response = client.post(f'/orders/cart/add/{products[0].id}/', {'quantity': 2})
+        assert response.json()['cart_items_count'] == 2
+        client.post(f'/orders/cart/add/{products[1].id}/', {'quantity': 1})
+
+        response = client.post(f'/orders/cart/update/{products[0].id}/', {'quantity': 5})
+        assert response.json()['cart_items_count'] == 6
+        assert response.json()['cart_total'] == '15.00'
+
+        response = client.post(
+            f'/orders/cart/remove/{products[1].id}/', HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        assert response.json()['cart_items_count'] == 5
+
+        response = client.get('/orders/cart/')
+        assert [item['quantity'] for item in response.context['cart_items']] == [5]
+
+    @pytest.mark.parametrize('backend', CART_BACKENDS)
+    def test_clear(self, settings, products, backend):
+        settings.CART_BACKEND = backend
+        client = Client()
+        client.post(f'/orders/cart/add/{products[0].id}/', {'quantity': 1})
+
+        client.get('/orders/cart/clear/')
+
+        response = client.get('/orders/cart/')
+        assert response.context['cart_items'] == []
+
+    def test_database_backend_upserts_lines(self, settings, products):
+        settings.CART_BACKEND = 'orders.cart_backends.DatabaseCartBackend'
+        client = Client()
+
+        client.post(f'/orders/cart/add/{products[0].id}/', {'quantity': 1})
+        client.post(f'/orders/cart/add/{products[0].id}/', {'quantity': 2})
+
+        line = CartLine.objects.get()
+        assert line.quantity == 3
+        assert 'cart' not in client.session
+
+
+@pytest.mark.django_db
+class TestCartTotals:
+    def test_running_totals_match_recalculation(self, rf, products):
+        request = session_request(rf)
+        cart = Cart(request)
+
+        cart.add(products[0], quantity=3)
+        cart.add(products[1], quantity=2)
+        cart.add(products[0], quantity=1)
+        cart.update(products[1], quantity=7)
+        cart.remove(products[0])
+
+        assert len(cart) == 7
+        assert cart.get_total_price() == Decimal('17.50')
+        cart.assert_consistent()
+
+        cart.clear()
+        assert len(cart) == 0
+        assert cart.get_total_price() == Decimal('0.00')
+
+    def test_totals_survive_reload(self, rf, products):
+        request = session_request(rf)
+        Cart(request).add(products[2], quantity=4)
+
+        cart = Cart(request)
+        assert len(cart) == 4
+        assert cart.get_total_price() == Decimal('10.00')
+
+    def test_rejected_add_leaves_no_line(self, rf, products):
+        request = session_request(rf)
+        cart = Cart(request)
+
+        result = cart.add(products[0], quantity=11)
+
+        assert result['status'] == 'error'
+        assert cart.cart == {}
+        assert len(cart) == 0
+
+
+def session_queries(captured):
+    return [q['sql'] for q in captured if 'django_session' in q['sql']]
+
+
+@pytest.mark.django_db
+class TestLazyCartContext:
+    def test_home_does_not_touch_session(self, django_assert_num_queries):
+        client = Client()
+
+        with django_assert_num_queries(0):
+            response = client.get('/')
+
+        assert response.status_code == 200
+        assert settings.SESSION_COOKIE_NAME not in response.cookies
+
+    def test_product_list_does_not_touch_session(self, products, settings):
+        settings.CATALOG_CACHE_TIMEOUT = 0  # Сама страница, а не ответ из кэша каталога
+        client = Client()
+        client.get('/products/')  # дерево категорий строится при первом обращении
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get('/products/')
+
+        assert response.status_code == 200
+        assert len(ctx.captured_queries) == 3  # COUNT, страница и фасеты
+        assert session_queries(ctx.captured_queries) == []
+
+    def test_product_detail_writes_no_cart(self, products):
+        client = Client()
+
+        response = client.get(f'/product/{products[0].slug}/')
+
+        assert response.status_code == 200
+        # Сессию создаёт только CSRF-токен формы «в корзину», а не корзина
+        assert settings.CART_SESSION_ID not in client.session
+        assert settings.CART_COUNT_COOKIE_NAME not in response.cookies
+
+    def test_badge_count_served_from_signed_cookie(self, products):
+        client = Client()
+        response = client.post(f'/orders/cart/add/{products[0].id}/', {'quantity': 2})
+        assert settings.CART_COUNT_COOKIE_NAME in response.cookies
+
+        response = client.get('/')
+        with CaptureQueriesContext(connection) as ctx:
+            assert response.context['cart_items_count'] == 2
+        assert ctx.captured_queries == []
+
+    def test_badge_cookie_ignored_for_other_session(self, products):
+        client = Client()
+        client.post(f'/orders/cart/add/{products[0].id}/', {'quantity': 2})
+        count_cookie = client.cookies[settings.CART_COUNT_COOKIE_NAME].value
+
+        other = Client()
+        other.get(f'/product/{products[0].slug}/')
+        other.cookies[settings.CART_COUNT_COOKIE_NAME] = count_cookie
+
+        response = other.get('/')
+        assert response.context['cart_items_count'] == 0
+
+
+CHECKOUT_FORM = {
+    'full_name': 'John Doe',
+    'phone': '+1 555 123 4567',
+    'city': 'New York',
+    'address': '123 Main St',
+    'payment_method': 'debit',
+}
+
+
+@pytest.fixture
+def customer(db):
+    from users.models import User
+
+    return User.objects.create_user(username='buyer', password='secret', email='b@example.com')
+
+
+def checkout_client(customer, products, quantity=1, reserve=True):
+    client = Client()
+    client.force_login(customer)
+    session = client.session
+    session[settings.CART_SESSION_ID] = {
+        str(product.id): {'quantity': quantity, 'price': str(product.price)}
+        for product in products
+    }
+    session[settings.CART_KEY_SESSION_ID] = cart_key = uuid.uuid4().hex
+    session.save()
+    if reserve:
+        for product in products:
+            reservations.reserve(cart_key, product, quantity)
+    return client
+
+
+@pytest.mark.django_db
+class TestCheckout:
+    def test_creates_order_and_decrements_stock(self, customer, products):
+        client = checkout_client(customer, products[:2], quantity=3)
+
+        response = client.post('/orders/checkout/', CHECKOUT_FORM)
+
+        assert response.status_code == 200
+        order = Order.objects.get()
+        assert order.total_price == Decimal('15.00')
+        assert sorted(order.items.values_list('quantity', flat=True)) == [3, 3]
+        assert list(Product.objects.order_by('id').values_list('stock', 'reserved')) == [
+            (7, 0), (7, 0), (10, 0)
+        ]
+        assert not StockReservation.objects.exists()
+        assert settings.CART_SESSION_ID not in client.session
+
+    def test_insufficient_stock_rolls_back(self, customer, products):
+        client = checkout_client(customer, products, quantity=11, reserve=False)
+
+        response = client.post('/orders/checkout/', CHECKOUT_FORM)
+
+        assert response.status_code == 302
+        assert not Order.objects.exists()
+        assert not Job.objects.exists()
+        assert set(Product.objects.values_list('stock', flat=True)) == {10}
+
+    def test_product_edit_keeps_reserved_units(self, customer, products):
+        client = checkout_client(customer, products[:1], quantity=3)
+        # Экземпляр загружен до резерва (форма админки, PUT в API): reserved в нём 0
+        stale = products[0]
+        stale.price = Decimal('3.00')
+        stale.save()
+
+        response = client.post('/orders/checkout/', CHECKOUT_FORM)
+
+        assert response.status_code == 200
+        assert Order.objects.get().total_price == Decimal('7.50')
+        assert Product.objects.values_list('price', 'stock', 'reserved').get(id=stale.id) == (
+            Decimal('3.00'), 7, 0
+        )
+
+    def test_enqueues_follow_up_jobs(self, customer, products):
+        from jobs.worker import Worker
+
+        checkout_client(customer, products[:2]).post(
+            '/orders/checkout/', {**CHECKOUT_FORM, 'email': 'orders@example.com'}
+        )
+
+        order = Order.objects.get()
+        assert sorted(Job.objects.values_list('name', flat=True)) == [
+            'orders.record_sales', 'orders.send_order_confirmation'
+        ]
+        assert not mail.outbox
+
+        assert Worker(burst=True).run() == 2
+        assert not Job.objects.exists()
+        [message] = mail.outbox
+        assert message.to == ['orders@example.com']
+        assert f'order #{order.id}' in message.subject
+        assert f'{products[0].name} x 1' in message.body
+
+    def test_jobs_roll_back_with_order(self, customer, products, monkeypatch):
+        def fail(*args, **kwargs):
+            raise RuntimeError('Session store is down')
+
+        # Ошибка уже после place_order, в той же транзакции
+        monkeypatch.setattr(Cart, 'clear', fail)
+        client = checkout_client(customer, products[:1])
+
+        response = client.post('/orders/checkout/', CHECKOUT_FORM)
+
+        assert response.status_code == 302
+        assert not Order.objects.exists()
+        assert not Job.objects.exists()
+        assert Product.objects.get(id=products[0].id).stock == 10
+
+    @pytest.mark.parametrize('lines', [1, 10, 100])
+    def test_query_budget_is_constant(self, customer, lines):
+        category = Category.objects.create(name="Malt", slug="malt")
+        catalog = Product.objects.bulk_create([
+            Product(name=f"Malt {i}", slug=f"malt-{i}", price="1.00", category=category,
+                    description="", stock=5)
+            for i in range(lines)
+        ])
+        client = checkout_client(customer, catalog)
+
+        with CaptureQueriesContext(connection) as ctx:
+            client.post('/orders/checkout/', CHECKOUT_FORM)
+
+        assert OrderItem.objects.count() == lines
+        assert len(ctx.captured_queries) == CHECKOUT_QUERY_BUDGET
+
+
+def product_selects(captured):
+    return [
+        q['sql'] for q in captured
+        if q['sql'].startswith('SELECT') and 'FROM "products_product"' in q['sql']
+    ]
+
+
+@pytest.mark.django_db
+class TestCartSnapshot:
+    @pytest.fixture
+    def catalog(self, db):
+        category = Category.objects.create(name="Yeast", slug="yeast")
+        return Product.objects.bulk_create([
+            Product(name=f"Yeast {i}", slug=f"yeast-{i}", price="3.00", category=category,
+                    description="x" * 1000, stock=5)
+            for i in range(10)
+        ])
+
+    def test_cart_page_loads_products_once(self, customer, catalog):
+        client = checkout_client(customer, catalog)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get('/orders/cart/')
+
+        assert len(response.context['cart_items']) == 10
+        selects = product_selects(ctx.captured_queries)
+        assert len(selects) == 1
+        assert 'JOIN "products_category"' in selects[0]
+        assert '"products_product"."description"' not in selects[0]
+
+    def test_checkout_page_loads_products_once(self, customer, catalog):
+        client = checkout_client(customer, catalog)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get('/orders/checkout/')
+
+        assert response.context['total_price'] == Decimal('30.00')
+        assert response.content.count(b'class="order-item"') == 10
+        assert len(product_selects(ctx.captured_queries)) == 1
+
+    def test_invalid_checkout_post_loads_products_once(self, customer, catalog):
+        client = checkout_client(customer, catalog)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.post('/orders/checkout/', {**CHECKOUT_FORM, 'full_name': ''})
+
+        assert response.status_code == 200
+        assert len(response.context['cart_items']) == 10
+        assert len(product_selects(ctx.captured_queries)) == 1
+
+    def test_checkout_post_loads_products_once(self, customer, catalog):
+        client = checkout_client(customer, catalog)
+
+        with CaptureQueriesContext(connection) as ctx:
+            client.post('/orders/checkout/', CHECKOUT_FORM)
+
+        assert Order.objects.exists()
+        assert len(product_selects(ctx.captured_queries)) == 1
+
+    def test_snapshot_refreshed_after_change(self, rf, products):
+        request = session_request(rf)
+        cart = Cart(request)
+        cart.add(products[0], quantity=1)
+        assert [line['quantity'] for line in cart] == [1]
+
+        cart.add(products[0], quantity=2)
+        cart.add(products[1], quantity=1)
+
+        assert [line['quantity'] for line in cart] == [3, 1]
+
+
+@pytest.mark.django_db
+class TestStockReservations:
+    def test_add_to_cart_reserves_and_remove_releases(self, products):
+        client = Client()
+
+        client.post(f'/orders/cart/add/{products[0].id}/', {'quantity': 4})
+        products[0].refresh_from_db()
+        assert products[0].reserved == 4
+        assert products[0].available_stock == 6
+
+        client.post(f'/orders/cart/remove/{products[0].id}/')
+        products[0].refresh_from_db()
+        assert products[0].reserved == 0
+        assert not StockReservation.objects.exists()
+
+    def test_reserve_fails_when_held_by_others(self, products):
+        assert reservations.reserve('a' * 32, products[0], 8)
+
+        assert not reservations.reserve('b' * 32, products[0], 3)
+        assert reservations.reserve('b' * 32, products[0], 2)
+
+    def test_expired_holds_are_swept(self, products):
+        reservations.reserve('a' * 32, products[0], 8)
+        reservations.reserve('b' * 32, products[1], 2)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        assert reservations.release_expired(batch_size=1) == 2
+
+        assert list(Product.objects.order_by('id').values_list('reserved', flat=True)) == [0, 0, 0]
+
+    def test_expired_holds_do_not_block_new_buyers(self, products):
+        reservations.reserve('a' * 32, products[0], 10)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        assert reservations.reserve('b' * 32, products[0], 10)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_reservation_contention(products):
+    """50 покупателей одновременно борются за 10 единиц товара."""
+    if connection.vendor != 'postgresql':
+        pytest.skip('SQLite сериализует запись целиком и не поддерживает SELECT FOR UPDATE')
+    product = products[0]
+    buyers = 50
+    barrier = threading.Barrier(buyers)
+    results = []
+
+    def buyer(index):
+        try:
+            barrier.wait()
+            results.append(reservations.reserve(f'{index:032d}', product, 1))
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=buyer, args=(i,)) for i in range(buyers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    product.refresh_from_db()
+    assert results.count(True) == 10
+    assert product.reserved == 10
+    assert StockReservation.objects.count() == 10
+
+
+@pytest.mark.django_db
+class TestLoginCartMerge:
+    def test_saved_cart_merged_once_without_doubling(self, customer, products):
+        client = Client()
+        client.post(f'/orders/cart/add/{products[0].id}/', {'quantity': 2})
+        client.post('/orders/cart/save-before-login/')
+
+        client.post('/users/login/', {'username': 'buyer', 'password': 'secret'})
+
+        session = client.session
+        assert 'cart_before_login' not in session
+        assert session[settings.CART_SESSION_ID][str(products[0].id)]['quantity'] == 2
+
+    def test_merge_loads_products_in_one_query(self, customer, products):
+        request = session_request(RequestFactory())
+        Cart(request).add(products[0], quantity=1)
+        saved = {
+            str(product.id): {'quantity': 3, 'price': str(product.price)}
+            for product in products
+        }
+
+        with CaptureQueriesContext(connection) as ctx:
+            Cart(request).merge(saved)
+
+        assert len(product_selects(ctx.captured_queries)) == 1
+        cart = Cart(request)
+        assert len(cart) == 9
+        cart.assert_consistent()
+
+
+@pytest.mark.django_db
+def test_order_api_cursor_orders_newest_first_with_ties(customer):
+    from rest_framework.test import APIClient
+
+    Order.objects.bulk_create([Order(user=customer, total_price=1) for _ in range(5)])
+    # Одинаковое время создания: порядок внутри группы задаёт id
+    Order.objects.update(created_at=timezone.now())
+    expected = list(Order.objects.order_by('-id').values_list('id', flat=True))
+    client = APIClient()
+    client.force_authenticate(customer)
+
+    response = client.get('/api/orders/', {'cursor': '', 'page_size': 2})
+    seen = [order['id'] for order in response.data['results']]
+    while response.data['next']:
+        response = client.get(response.data['next'])
+        seen.extend(order['id'] for order in response.data['results'])
+
+    assert seen == expected
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('values', [['abc', 1], ['2026-01-01T00:00:00+00:00', 'abc'], [1, 2]])
+def test_order_api_cursor_with_invalid_values_is_not_found(customer, values):
+    from rest_framework.test import APIClient
+
+    client = APIClient()
+    client.force_authenticate(customer)
+    cursor = base64.urlsafe_b64encode(json.dumps({'v': values, 'r': False}).encode()).decode()
+
+    response = client.get('/api/orders/', {'cursor': cursor})
+
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+class TestOrderAPIFastPath:
+    @pytest.fixture
+    def orders(self, customer, products):
+        from users.models import User
+
+        other = User.objects.create_user(username='other', password='x')
+        orders = [
+            Order.objects.create(user=customer, total_price=Decimal('7.5'), full_name='Jörg Ø',
+                                 phone='+1 555', city='Köln', address='Line 1\nLine 2'),
+            Order.objects.create(user=customer, total_price=Decimal('1234567.89')),
+            Order.objects.create(user=customer, total_price=0),
+            Order.objects.create(user=other, total_price=1),
+        ]
+        OrderItem.objects.bulk_create([
+            OrderItem(order=orders[0], product=products[2], quantity=3, price=Decimal('2.5')),
+            OrderItem(order=orders[0], product=products[0], quantity=1, price='0.10'),
+            OrderItem(order=orders[1], product=products[1], quantity=2, price='99999999.99'),
+            OrderItem(order=orders[3], product=products[1], quantity=1, price=1),
+        ])
+        # Дата с микросекундами: формат должен совпасть до символа
+        Order.objects.filter(id=orders[1].id).update(
+            created_at=timezone.now().replace(microsecond=123456))
+        return orders
+
+    @staticmethod
+    def client_for(user):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    @staticmethod
+    def stock_json(queryset, many=True):
+        from rest_framework.renderers import JSONRenderer
+
+        from .serializers import OrderSerializer
+
+        return JSONRenderer().render(OrderSerializer(queryset, many=many).data)
+
+    def test_reader_matches_model_serializer(self, customer, orders):
+        from rest_framework.renderers import JSONRenderer
+
+        from .serializers import order_reader
+
+        queryset = Order.objects.filter(user=customer).order_by('id')
+        rows = list(order_reader.values(queryset))
+
+        assert JSONRenderer().render(order_reader.serialize(rows)) == self.stock_json(queryset)
+        assert order_reader.serialize([]) == []
+
+    def test_list_and_retrieve_are_byte_compatible(self, customer, orders):
+        client = self.client_for(customer)
+        queryset = Order.objects.filter(user=customer).order_by('-created_at', '-id')
+
+        response = client.get('/api/orders/', {'cursor': ''})
+        assert response.content == (
+            b'{"next":null,"previous":null,"results":' + self.stock_json(queryset) + b'}'
+        )
+
+        response = client.get(f'/api/orders/{orders[0].id}/')
+        assert response.content == self.stock_json(orders[0], many=False)
+
+    def test_list_runs_one_query_per_relation(self, customer, orders):
+        client = self.client_for(customer)
+        client.get('/api/orders/')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get('/api/orders/')
+
+        # COUNT для номеров страниц, заказы с именем пользователя, позиции всех заказов
+        assert len(ctx.captured_queries) == 3
+        assert response.data['count'] == 3
+
+    def test_retrieve_other_users_order_is_not_found(self, customer, orders):
+        client = self.client_for(customer)
+
+        assert client.get(f'/api/orders/{orders[3].id}/').status_code == 404
+        assert client.get('/api/orders/abc/').status_code == 404
+
+    def test_unsupported_fields_fail_at_compile_time(self):
+        from rest_framework import serializers
+
+        from config.serializers import CompiledSerializer
+
+        class WithMethod(serializers.ModelSerializer):
+            cost = serializers.SerializerMethodField()
+
+            class Meta:
+                model = OrderItem
+                fields = ['id', 'cost']
+
+        with pytest.raises(TypeError, match='cost'):
+            CompiledSerializer(WithMethod)
+
+
+@pytest.mark.django_db
+class TestUserOrderStats:
+    @staticmethod
+    def stats_of(user):
+        row = UserOrderStats.objects.get(user=user)
+        return row.order_count, row.total_spent, row.last_order_at
+
+    @staticmethod
+    def admin_client():
+        from users.models import User
+
+        client = Client()
+        client.force_login(User.objects.create_superuser(username='admin', password='x'))
+        return client
+
+    @staticmethod
+    def admin_form(order, **changes):
+        data = {
+            'user': order.user_id, 'status': order.status, 'total_price': order.total_price,
+            'full_name': order.full_name, 'phone': order.phone, 'city': order.city,
+            'address': order.address, 'payment_method': order.payment_method,
+            'items-TOTAL_FORMS': 0, 'items-INITIAL_FORMS': 0,
+            'status_events-TOTAL_FORMS': 0, 'status_events-INITIAL_FORMS': 0,
+        }
+        data.update(changes)
+        return data
+
+    def test_checkout_updates_stats_in_same_transaction(self, customer, products):
+        checkout_client(customer, products[:2], quantity=2).post('/orders/checkout/',
+                                                                 CHECKOUT_FORM)
+        checkout_client(customer, products[2:], quantity=1).post('/orders/checkout/',
+                                                                 CHECKOUT_FORM)
+        checkout_client(customer, products, quantity=11, reserve=False).post(
+            '/orders/checkout/', CHECKOUT_FORM)  # не хватает остатка - откат
+
+        latest = Order.objects.latest('id')
+        assert Order.objects.count() == 2
+        assert self.stats_of(customer) == (2, Decimal('12.50'), latest.created_at)
+
+    def test_admin_status_change_moves_spend(self, customer):
+        from .stats import record_order
+
+        order = Order.objects.create(user=customer, total_price=Decimal('9.99'), **{
+            key: CHECKOUT_FORM[key] for key in ('full_name', 'phone', 'city', 'address')
+        })
+        record_order(order)
+        client = self.admin_client()
+        url = f'/admin/orders/order/{order.id}/change/'
+
+        client.post(url, self.admin_form(order, status='paid', total_price='12.00'))
+        assert self.stats_of(customer)[:2] == (1, Decimal('12.00'))
+
+        client.post(url, self.admin_form(order, status='cancelled', total_price='12.00'))
+        assert self.stats_of(customer)[:2] == (1, Decimal('0.00'))
+
+    def test_api_create_update_and_delete(self, customer):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(customer)
+        first = client.post('/api/orders/', {'total_price': '5.00'}).data['id']
+        second = client.post('/api/orders/', {'total_price': '7.00'}).data['id']
+        client.patch(f'/api/orders/{first}/', {'total_price': '6.00'})
+        assert self.stats_of(customer) == (
+            2, Decimal('13.00'), Order.objects.get(id=second).created_at
+        )
+
+        client.delete(f'/api/orders/{second}/')
+        assert self.stats_of(customer) == (
+            1, Decimal('6.00'), Order.objects.get(id=first).created_at
+        )
+
+        client.delete(f'/api/orders/{first}/')
+        assert not UserOrderStats.objects.exists()
+
+    def test_rebuild_matches_history(self, customer):
+        from .stats import rebuild
+
+        Order.objects.bulk_create([
+            Order(user=customer, total_price=Decimal('2.25'), status=status)
+            for status in ('pending', 'paid', 'cancelled', 'delivered')
+        ])
+
+        rebuild([customer.id])
+
+        newest = Order.objects.order_by('-created_at').first()
+        assert self.stats_of(customer) == (4, Decimal('6.75'), newest.created_at)
+
+
+def sales_rollups():
+    """Ненулевые строки дневных сводок продаж."""
+    return (
+        set(DailySales.objects.exclude(order_count=0, revenue=0).values_list(
+            'date', 'status', 'payment_method', 'order_count', 'revenue')),
+        set(DailyProductSales.objects.exclude(units=0, revenue=0).values_list(
+            'date', 'status', 'product_id', 'units', 'revenue')),
+    )
+
+
+@pytest.mark.django_db
+class TestSalesRollups:
+    @staticmethod
+    def assert_matches_rebuild():
+        from django.core.management import call_command
+
+        incremental = sales_rollups()
+        call_command('rebuild_sales_rollups', stdout=open(os.devnull, 'w'))
+        assert sales_rollups() == incremental
+
+    @staticmethod
+    def run_jobs():
+        from jobs.worker import Worker
+
+        return Worker(burst=True).run()
+
+    @pytest.fixture
+    def admin_client(self, db):
+        from users.models import User
+
+        client = Client()
+        client.force_login(User.objects.create_superuser(username='admin', password='x'))
+        return client
+
+    def test_checkout_adds_order_and_product_rows(self, customer, products):
+        checkout_client(customer, products[:2], quantity=2).post('/orders/checkout/',
+                                                                 CHECKOUT_FORM)
+        checkout_client(customer, products[1:], quantity=1).post('/orders/checkout/',
+                                                                 CHECKOUT_FORM)
+        # Оформление только ставит задачи, сводки меняет воркер
+        assert sales_rollups() == (set(), set())
+        self.run_jobs()
+
+        today = timezone.localdate()
+        orders, lines = sales_rollups()
+        assert orders == {(today, 'pending', 'debit', 2, Decimal('15.00'))}
+        assert lines == {
+            (today, 'pending', products[0].id, 2, Decimal('5.00')),
+            (today, 'pending', products[1].id, 3, Decimal('7.50')),
+            (today, 'pending', products[2].id, 1, Decimal('2.50')),
+        }
+        self.assert_matches_rebuild()
+
+    def test_admin_edits_move_order_between_rows(self, customer, products, admin_client):
+        checkout_client(customer, products[:2], quantity=2).post('/orders/checkout/',
+                                                                 CHECKOUT_FORM)
+        order = Order.objects.get()
+        item = order.items.order_by('id').first()
+        form = TestUserOrderStats.admin_form(order, status='cancelled', payment_method='cash', **{
+            'items-TOTAL_FORMS': 2, 'items-INITIAL_FORMS': 2,
+            'items-0-id': item.id, 'items-0-order': order.id,
+            'items-0-product': item.product_id, 'items-0-quantity': 5,
+        })
+        other = order.items.exclude(id=item.id).get()
+        form.update({'items-1-id': other.id, 'items-1-order': order.id,
+                     'items-1-product': other.product_id, 'items-1-quantity': other.quantity})
+
+        # Правка до выполнения задачи: задача добавит снимок заказа на момент оформления
+        response = admin_client.post(f'/admin/orders/order/{order.id}/change/', form)
+        self.run_jobs()
+
+        assert response.status_code == 302
+        today = timezone.localdate()
+        orders, lines = sales_rollups()
+        assert orders == {(today, 'cancelled', 'cash', 1, Decimal('10.00'))}
+        assert (today, 'cancelled', item.product_id, 5, Decimal('12.50')) in lines
+        self.assert_matches_rebuild()
+
+        admin_client.post(f'/admin/orders/order/{order.id}/delete/', {'post': 'yes'})
+        assert sales_rollups() == (set(), set())
+
+    def test_api_changes(self, customer):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(customer)
+        first = client.post('/api/orders/', {'total_price': '5.00'}).data['id']
+        client.post('/api/orders/', {'total_price': '7.00'})
+        client.patch(f'/api/orders/{first}/', {'total_price': '6.00'})
+
+        assert sales_rollups()[0] == {(timezone.localdate(), 'pending', 'debit', 2,
+                                       Decimal('13.00'))}
+        self.assert_matches_rebuild()
+
+        client.delete(f'/api/orders/{first}/')
+        assert sales_rollups()[0] == {(timezone.localdate(), 'pending', 'debit', 1,
+                                       Decimal('7.00'))}
+
+    def test_rebuild_groups_by_local_day(self, customer, products, settings):
+        settings.TIME_ZONE = 'America/New_York'
+        order = Order.objects.create(user=customer, total_price=Decimal('2.50'))
+        OrderItem.objects.create(order=order, product=products[0], price=Decimal('2.50'))
+        # 03:00 UTC - ещё вчерашний день в Нью-Йорке
+        created = timezone.now().replace(hour=3, minute=0)
+        Order.objects.filter(id=order.id).update(created_at=created)
+
+        sales.rebuild()
+
+        day = timezone.localdate(created)
+        assert sales_rollups() == (
+            {(day, 'pending', 'debit', 1, Decimal('2.50'))},
+            {(day, 'pending', products[0].id, 1, Decimal('2.50'))},
+        )
+
+    def test_changelist_revenue_reads_rollups(self, customer, products, admin_client):
+        checkout_client(customer, products[:1], quantity=4).post('/orders/checkout/',
+                                                                 CHECKOUT_FORM)
+        self.run_jobs()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = admin_client.get('/admin/orders/order/')
+
+        assert b'Total revenue: $10.00' in response.content
+        assert not [q for q in ctx.captured_queries if 'SUM("orders_order"' in q['sql']]
+        if connection.vendor == 'postgresql':
+            # Число строк для пагинации - оценка планировщика (на маленькой таблице
+            # за ней следует точный COUNT)
+            assert [q for q in ctx.captured_queries if q['sql'].startswith('EXPLAIN')]
+
+    def test_dashboard(self, customer, products, admin_client):
+        checkout_client(customer, products[:2], quantity=2).post('/orders/checkout/',
+                                                                 CHECKOUT_FORM)
+        checkout_client(customer, products[2:], quantity=1).post('/orders/checkout/',
+                                                                 CHECKOUT_FORM)
+        Order.objects.filter(items__product=products[2]).update(status='cancelled')
+        sales.rebuild()
+
+        response = admin_client.get('/admin/orders/order/sales/', {'days': 7})
+
+        assert response.status_code == 200
+        assert [(row['orders'], row['revenue']) for row in response.context['daily']] == [
+            (1, Decimal('10.00'))
+        ]
+        assert [(row['product_id'], row['units']) for row in response.context['products']] == [
+            (products[0].id, 2), (products[1].id, 2)
+        ]
+        assert products[2].name.encode() not in response.content
+
+
+@pytest.mark.django_db
+class TestStatusTransitions:
+    @pytest.fixture
+    def staff(self, db):
+        from users.models import User
+
+        return User.objects.create_superuser(username='warehouse', password='x')
+
+    @pytest.fixture
+    def api(self, staff):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(staff)
+        return client
+
+    @staticmethod
+    def place(customer, products, count, status='pending'):
+        """count заказов со сводками продаж и покупателя, как после оформления."""
+        from .stats import rebuild
+
+        orders = Order.objects.bulk_create([
+            Order(user=customer, status=status, total_price=Decimal('5.00'))
+            for _ in range(count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[0], price=Decimal('2.50'), quantity=2)
+            for order in orders
+        ])
+        sales.rebuild()
+        rebuild([customer.id])
+        return orders
+
+    @staticmethod
+    def assert_rollups_match_rebuild(customer):
+        from .stats import rebuild
+
+        spent = UserOrderStats.objects.get(user=customer).total_spent
+        TestSalesRollups.assert_matches_rebuild()
+        rebuild([customer.id])
+        assert UserOrderStats.objects.get(user=customer).total_spent == spent
+
+    def post(self, api, orders, status):
+        return api.post('/api/orders/transition/',
+                        {'ids': [order.id for order in orders], 'status': status}, format='json')
+
+    def test_batch_transition(self, api, staff, customer, products):
+        orders = self.place(customer, products, 3, status='paid')
+
+        response = self.post(api, orders, 'shipped')
+
+        assert response.status_code == 200
+        assert response.json() == {'status': 'shipped', 'changed': 3}
+        assert set(Order.objects.values_list('status', flat=True)) == {'shipped'}
+        assert sorted(OrderStatusEvent.objects.values_list(
+            'order_id', 'from_status', 'to_status', 'changed_by')) == [
+            (order.id, 'paid', 'shipped', staff.id) for order in orders
+        ]
+        self.assert_rollups_match_rebuild(customer)
+
+    def test_query_count_does_not_depend_on_batch_size(self, api, customer, products):
+        counts = []
+        for size in (2, 40):
+            orders = self.place(customer, products, size)
+            with CaptureQueriesContext(connection) as ctx:
+                assert self.post(api, orders, 'shipped').json()['changed'] == size
+            counts.append(len(ctx.captured_queries))
+
+        assert counts[0] == counts[1]
+
+    def test_delivery_marks_paid_once(self, api, customer, products):
+        paid, cash = self.place(customer, products, 2, status='shipped')
+        paid_at = timezone.now() - timedelta(days=2)
+        Order.objects.filter(id=paid.id).update(is_paid=True, paid_at=paid_at)
+
+        self.post(api, [paid, cash], 'delivered')
+
+        paid.refresh_from_db()
+        cash.refresh_from_db()
+        assert (paid.is_paid, paid.paid_at) == (True, paid_at)
+        assert cash.is_paid and cash.paid_at is not None
+
+    def test_invalid_transition_changes_nothing(self, api, customer, products):
+        pending, delivered = self.place(customer, products, 2)
+        Order.objects.filter(id=delivered.id).update(status='delivered')
+
+        response = self.post(api, [pending, delivered, Order(id=10 ** 9)], 'paid')
+
+        assert response.status_code == 400
+        assert response.json() == {'ids': {
+            str(delivered.id): 'Cannot change status from delivered to paid',
+            str(10 ** 9): 'Order not found',
+        }}
+        pending.refresh_from_db()
+        assert (pending.status, pending.is_paid) == ('pending', False)
+        assert not OrderStatusEvent.objects.exists()
+
+    def test_repeated_batch_is_noop(self, api, customer, products):
+        orders = self.place(customer, products, 2)
+        self.post(api, orders, 'shipped')
+
+        assert self.post(api, orders, 'shipped').json()['changed'] == 0
+        assert OrderStatusEvent.objects.count() == 2
+
+    def test_cancel_moves_spend(self, api, customer, products):
+        orders = self.place(customer, products, 3)
+
+        self.post(api, orders[:2], 'cancelled')
+
+        assert UserOrderStats.objects.get(user=customer).total_spent == Decimal('5.00')
+        self.assert_rollups_match_rebuild(customer)
+
+    def test_staff_only(self, customer, products):
+        from rest_framework.test import APIClient
+
+        orders = self.place(customer, products, 1)
+        client = APIClient()
+        client.force_authenticate(customer)
+
+        assert self.post(client, orders, 'cancelled').status_code == 403
+        assert Order.objects.get().status == 'pending'
+
+    def test_admin_action(self, staff, customer, products):
+        orders = self.place(customer, products, 2, status='paid')
+        client = Client()
+        client.force_login(staff)
+
+        client.post('/admin/orders/order/', {
+            'action': 'mark_shipped', '_selected_action': [order.id for order in orders],
+        })
+
+        assert set(Order.objects.values_list('status', flat=True)) == {'shipped'}
+        assert OrderStatusEvent.objects.filter(changed_by=staff).count() == 2
+
+        response = client.post('/admin/orders/order/', {
+            'action': 'mark_paid', '_selected_action': [orders[0].id],
+        }, follow=True)
+
+        assert 'Cannot change status from shipped to paid' in response.content.decode()
+        assert Order.objects.get(id=orders[0].id).status == 'shipped'
+
+    def test_admin_edit_logs_status_change(self, staff, customer, products):
+        [order] = self.place(customer, products, 1)
+        client = Client()
+        client.force_login(staff)
+
+        client.post(f'/admin/orders/order/{order.id}/change/',
+                    TestUserOrderStats.admin_form(order, status='paid', **CHECKOUT_FORM))
+
+        assert list(OrderStatusEvent.objects.values_list(
+            'from_status', 'to_status', 'changed_by')) == [('pending', 'paid', staff.id)]
+        order.refresh_from_db()
+        assert (order.status, order.is_paid) == ('paid', True)
+        assert order.paid_at is not None
+        self.assert_rollups_match_rebuild(customer)
+
+    def test_admin_edit_follows_transition_rules(self, staff, customer, products):
+        [order] = self.place(customer, products, 1, status='delivered')
+        client = Client()
+        client.force_login(staff)
+
+        response = client.post(
+            f'/admin/orders/order/{order.id}/change/',
+            TestUserOrderStats.admin_form(order, status='pending', **CHECKOUT_FORM),
+        )
+
+        assert response.status_code == 200
+        assert 'Cannot change status from delivered to pending' in response.content.decode()
+        assert Order.objects.get().status == 'delivered'
+        assert not OrderStatusEvent.objects.exists()
+
+    def test_admin_edit_with_status_and_total(self, staff, customer, products):
+        [order] = self.place(customer, products, 1, status='paid')
+        client = Client()
+        client.force_login(staff)
+
+        client.post(f'/admin/orders/order/{order.id}/change/', TestUserOrderStats.admin_form(
+            order, status='cancelled', total_price='4.00', **CHECKOUT_FORM
+        ))
+
+        order.refresh_from_db()
+        assert (order.status, order.total_price) == ('cancelled', Decimal('4.00'))
+        assert OrderStatusEvent.objects.count() == 1
+        assert UserOrderStats.objects.get(user=customer).total_spent == Decimal('0.00')
+        self.assert_rollups_match_rebuild(customer)
+
+
+@pytest.mark.django_db
+class TestOrderArchive:
+    @pytest.fixture
+    def history(self, customer, products):
+        """Заказы покупателя: два старых завершённых, старый и новый текущие."""
+        from .stats import rebuild
+
+        old = timezone.now() - timedelta(days=400)
+        statuses = [('delivered', old), ('cancelled', old), ('shipped', old),
+                    ('delivered', timezone.now())]
+        orders = Order.objects.bulk_create([
+            Order(user=customer, status=status, total_price=Decimal('5.00'))
+            for status, _ in statuses
+        ])
+        for order, (_, created_at) in zip(orders, statuses):
+            order.created_at = created_at
+        Order.objects.bulk_update(orders, ['created_at'])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, price=Decimal('2.50'), quantity=1)
+            for order in orders for product in products[:2]
+        ])
+        OrderStatusEvent.objects.create(order=orders[0], from_status='shipped',
+                                        to_status='delivered')
+        sales.rebuild()
+        rebuild([customer.id])
+        return orders
+
+    @staticmethod
+    def archive_orders():
+        out = io.StringIO()
+        call_command('archive_orders', '--months', 6, '--batch-size', 1, stdout=out)
+        return out.getvalue()
+
+    def test_moves_old_finished_orders(self, history):
+        from .models import ArchivedOrder, ArchivedOrderItem
+
+        assert self.archive_orders().startswith('Archived 2 orders')
+
+        archived = [history[0], history[1]]
+        assert sorted(Order.objects.values_list('id', flat=True)) == [history[2].id, history[3].id]
+        assert not OrderItem.objects.filter(order__in=[order.id for order in archived]).exists()
+        assert sorted(ArchivedOrder.objects.values_list('id', 'status', 'created_at')) == [
+            (order.id, order.status, order.created_at) for order in archived
+        ]
+        assert ArchivedOrderItem.objects.filter(order__in=[o.id for o in archived]).count() == 4
+        # Журнал статусов не связан с таблицей заказов и остаётся
+        assert OrderStatusEvent.objects.get().order_id == history[0].id
+        assert self.archive_orders().startswith('Archived 0 orders')
+
+    def test_rollups_and_stats_survive_archival(self, customer, history):
+        from .stats import rebuild
+
+        rollups = sales_rollups()
+        spent = UserOrderStats.objects.values_list('order_count', 'total_spent').get()
+
+        self.archive_orders()
+        sales.rebuild()
+        rebuild([customer.id])
+
+        assert sales_rollups() == rollups
+        assert UserOrderStats.objects.values_list('order_count', 'total_spent').get() == spent
+
+    def test_api_reads_archive_explicitly(self, customer, history):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(customer)
+        before = client.get(f'/api/orders/{history[0].id}/').json()
+
+        self.archive_orders()
+
+        assert [order['id'] for order in client.get('/api/orders/').json()['results']] == [
+            history[3].id, history[2].id
+        ]
+        archived = client.get('/api/orders/', {'archived': 1}).json()['results']
+        assert [order['id'] for order in archived] == [history[1].id, history[0].id]
+        assert archived[1] == before
+        assert client.get(f'/api/orders/{history[0].id}/').json() == before
+        assert client.get(f'/api/orders/{history[3].id}/', {'archived': 1}).status_code == 404
+        # Архив только читается
+        response = client.patch(f'/api/orders/{history[0].id}/', {'city': 'Boston'})
+        assert response.status_code == 404
+
+    def test_months_ago_clamps_day(self):
+        from datetime import datetime, timezone as dt_timezone
+
+        from .archive import months_ago
+
+        now = datetime(2024, 3, 31, 12, 0, tzinfo=dt_timezone.utc)
+        assert months_ago(1, now) == datetime(2024, 2, 29, 12, 0, tzinfo=dt_timezone.utc)
+        assert months_ago(15, now) == datetime(2022, 12, 31, 12, 0, tzinfo=dt_timezone.utc)
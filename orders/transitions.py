@@ -0,0 +1,101 @@
+"""
+Массовая смена статуса заказов (партии склада: shipped, delivered).
+
+transition() меняет статус сотен и тысяч заказов запросами, число которых
+не зависит от размера партии:
+
+1. SELECT ... FOR UPDATE id, статуса, покупателя и суммы всех заказов партии
+   и проверка переходов по TRANSITIONS - всё или ничего;
+2. вычитание вклада заказов из дневных сводок продаж (orders.sales);
+3. один UPDATE статуса, is_paid/paid_at и updated_at;
+4. один UPDATE сводок покупателей (orders.stats), если меняется отмена;
+5. добавление вклада в дневные сводки с новым статусом;
+6. bulk_create журнала OrderStatusEvent.
+
+Заказы, уже находящиеся в целевом статусе, пропускаются: повторная отправка
+той же партии ничего не меняет. Смена статуса одного заказа в админке идёт
+тем же путём, поэтому правила переходов и журнал у них общие.
+"""
+from typing import Dict, Iterable, Optional
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import sales, stats
+from .models import STATUS_CHOICES, Order, OrderStatusEvent
+
+# Допустимые переходы: наложенный платёж (cash) отгружается неоплаченным
+TRANSITIONS = {
+    'pending': {'paid', 'shipped', 'cancelled'},
+    'paid': {'shipped', 'cancelled'},
+    'shipped': {'delivered', 'cancelled'},
+    'delivered': set(),
+    'cancelled': set(),
+}
+
+# Переход в эти статусы означает, что деньги получены
+PAID_STATUSES = {'paid', 'delivered'}
+
+# Сколько заказов можно перевести за один вызов API
+MAX_BATCH_SIZE = 10_000
+
+
+class TransitionError(ValueError):
+    """Часть заказов нельзя перевести в статус; errors - {id заказа: причина}."""
+
+    def __init__(self, errors: Dict[int, str]):
+        super().__init__(f"{len(errors)} orders cannot change status")
+        self.errors = errors
+
+
+def transition(order_ids: Iterable[int], status: str, user=None) -> int:
+    """Перевести заказы order_ids в status; вернуть число изменённых заказов."""
+    if status not in dict(STATUS_CHOICES):
+        raise ValueError(f"Unknown order status: {status}")
+    order_ids = set(order_ids)
+    with transaction.atomic():
+        rows = list(
+            Order.objects.select_for_update().filter(id__in=order_ids)
+            .order_by('id').values_list('id', 'status', 'user_id', 'total_price')
+        )
+        errors: Dict[int, str] = dict.fromkeys(
+            order_ids - {row[0] for row in rows}, "Order not found"
+        )
+        for order_id, current, _, _ in rows:
+            error = transition_error(current, status)
+            if error:
+                errors[order_id] = error
+        if errors:
+            raise TransitionError(dict(sorted(errors.items())))
+
+        changed = [row for row in rows if row[1] != status]
+        if not changed:
+            return 0
+        orders = Order.objects.filter(id__in=[row[0] for row in changed])
+        now = timezone.now()
+        updates = {'status': status, 'updated_at': now}
+        if status in PAID_STATUSES:
+            updates.update(is_paid=True, paid_at=Coalesce(F('paid_at'), now))
+
+        sales.subtract(orders)
+        orders.update(**updates)
+        stats.record_status_change(
+            [(user_id, current, total_price) for _, current, user_id, total_price in changed],
+            status,
+        )
+        sales.add(orders)
+        OrderStatusEvent.objects.bulk_create([
+            OrderStatusEvent(order_id=order_id, from_status=current, to_status=status,
+                             changed_by=user)
+            for order_id, current, _, _ in changed
+        ])
+        return len(changed)
+
+
+def transition_error(current: str, status: str) -> Optional[str]:
+    """Почему заказ нельзя перевести из current в status; None - можно."""
+    if current != status and status not in TRANSITIONS[current]:
+        return f"Cannot change status from {current} to {status}"
+    return None
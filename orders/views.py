@@ -3,21 +3,30 @@
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db import transaction
-from django.http import JsonResponse
+from django.db.models import Prefetch
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.views import View
 from django.views.decorators.http import require_POST
-from drf_spectacular.utils import extend_schema, extend_schema_view
-from rest_framework import permissions, viewsets
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
+from rest_framework import generics, permissions, serializers, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
 from django.conf import settings
+from config.metrics import CART_OPERATIONS
+from config.pagination import HybridPagination
 from products.models import Product
 
-from .cart import Cart
+from . import sales, stats, transitions
+from .cart import Cart, get_cart
 from .forms import OrderCreateForm
-from .models import Order, OrderItem
-from .serializers import OrderSerializer
+from .models import ArchivedOrder, Order, OrderItem
+from .serializers import (
+    OrderSerializer, OrderTransitionSerializer, archived_order_reader, order_reader,
+)
+from .services import place_order
 
 
 class CartView(View):
@@ -25,19 +34,10 @@ class CartView(View):
     template_name = 'cart.html'
 
     def get(self, request):
-        cart = Cart(request)
-
-        cart_items = []
-        for item in cart:
-            cart_items.append({
-                'product': item['product'],
-                'quantity': item['quantity'],
-                'price': item['price'],
-                'total_price': item['total_price'],
-            })
+        cart = get_cart(request)
 
         context = {
-            'cart_items': cart_items,
+            'cart_items': cart.get_lines(),
             'total_price': cart.get_total_price(),
             'items_count': len(cart),
         }
@@ -49,7 +49,7 @@ class OrderCreateView(LoginRequiredMixin, View):
     """Создание заказа (только для авторизованных пользователей)."""
 
     def get(self, request):
-        cart = Cart(request)
+        cart = get_cart(request)
 
         if len(cart) == 0:
             return redirect('orders:cart')
@@ -61,66 +61,49 @@ class OrderCreateView(LoginRequiredMixin, View):
 
             return redirect(f"{settings.LOGIN_URL}?next={reverse('orders:checkout')}")
 
-        form = OrderCreateForm()
-        return render(request, 'checkout.html', {'cart': cart, 'form': form})
+        return self.render_checkout(request, cart, OrderCreateForm())
 
     def post(self, request):
-        cart = Cart(request)
+        cart = get_cart(request)
 
         if len(cart) == 0:
             return redirect('orders:cart')
 
         form = OrderCreateForm(request.POST)
         if form.is_valid():
+            order = form.save(commit=False)
+            order.user = request.user
             try:
                 with transaction.atomic():
-                    order = form.save(commit=False)
-                    order.user = request.user
-                    order.total_price = cart.get_total_price()
-                    order.save()
-
-                    for item in cart:
-                        OrderItem.objects.create(
-                            order=order,
-                            product=item['product'],
-                            price=item['price'],
-                            quantity=item['quantity']
-                        )
-                        # Уменьшаем запас
-                        product = item['product']
-                        if product.stock < item['quantity']:
-                            raise ValueError(f"Not enough stock for {product.name}")
-                        product.stock -= item['quantity']
-                        product.save()
-
-                    cart.clear()
-                    messages.success(request, f'Order #{order.id} created!')
-                    return render(request, 'order_created.html', {'order': order})
-
+                    place_order(order, cart)
+                    cart.clear(release_stock=False)
             except Exception as e:
                 messages.error(request, f"Error: {str(e)}")
                 return redirect('orders:cart')
 
-        return render(request, 'checkout.html', {'cart': cart, 'form': form})
+            messages.success(request, f'Order #{order.id} created!')
+            return render(request, 'order_created.html', {'order': order})
+
+        return self.render_checkout(request, cart, form)
+
+    @staticmethod
+    def render_checkout(request, cart: Cart, form: OrderCreateForm):
+        return render(request, 'checkout.html', {
+            'cart': cart,
+            'cart_items': cart.get_lines(),
+            'total_price': cart.get_total_price(),
+            'form': form,
+        })
 
 
 @require_POST
 def cart_add(request, product_id: int):
-    import sys
-    from decimal import Decimal
-
-    print("\n🔍 CART ADD", file=sys.stderr)
-    cart = Cart(request)
+    cart = get_cart(request)
     product = get_object_or_404(Product, id=product_id, is_active=True)
     quantity = int(request.POST.get('quantity', 1))
 
-    print(f"  Product: {product.name}, price: {product.price} ({type(product.price)})", file=sys.stderr)
-
     result = cart.add(product=product, quantity=quantity)
 
-    print(f"  Result: {result}", file=sys.stderr)
-    print(f"  Cart now has {len(cart)} items", file=sys.stderr)
-
     return JsonResponse({
         'status': result['status'],
         'message': result['message'],
@@ -131,7 +114,7 @@ def cart_add(request, product_id: int):
 
 @require_POST
 def cart_remove(request, product_id: int):
-    cart = Cart(request)
+    cart = get_cart(request)
     product = get_object_or_404(Product, id=product_id)
 
     cart.remove(product)
@@ -148,7 +131,7 @@ def cart_remove(request, product_id: int):
 
 @require_POST
 def cart_update(request, product_id: int):
-    cart = Cart(request)
+    cart = get_cart(request)
     product = get_object_or_404(Product, id=product_id, is_active=True)
     quantity = int(request.POST.get('quantity', 1))
 
@@ -164,7 +147,7 @@ def cart_update(request, product_id: int):
 
 
 def cart_clear(request):
-    cart = Cart(request)
+    cart = get_cart(request)
     cart.clear()
     messages.success(request, 'Cart cleared')
     return redirect('orders:cart')
@@ -175,13 +158,7 @@ def save_cart_before_login(request):
     """
     Сохраняет корзину в сессию перед редиректом на логин.
     """
-    import sys
-
-    print("\n" + "=" * 50, file=sys.stderr)
-    print("🔍 SAVE CART BEFORE LOGIN CALLED", file=sys.stderr)
-
-    cart = Cart(request)
-    print(f"Cart has {len(cart)} items", file=sys.stderr)
+    cart = get_cart(request)
 
     if len(cart) > 0:
         # ✅ ИСПОЛЬЗУЕМ copy() - гарантированно JSON-сериализуемые данные!
@@ -189,16 +166,7 @@ def save_cart_before_login(request):
         request.session['cart_before_login'] = cart_data
         request.session.modified = True
         request.session.save()
-
-        print(f"✅ Cart saved with {len(cart_data)} items", file=sys.stderr)
-        print(f"Session ID: {request.session.session_key}", file=sys.stderr)
-        print(f"Data type: {type(cart_data)}", file=sys.stderr)
-
-        # Проверяем тип price
-        if cart_data:
-            sample_id = list(cart_data.keys())[0]
-            sample_price = cart_data[sample_id]['price']
-            print(f"Sample price type: {type(sample_price)} - {sample_price}", file=sys.stderr)
+        CART_OPERATIONS.inc('save_before_login', 'success')
 
         return JsonResponse({
             'status': 'success',
@@ -206,26 +174,117 @@ def save_cart_before_login(request):
             'cart_items_count': len(cart)
         })
 
-    print("⚠️ Cart is empty", file=sys.stderr)
+    CART_OPERATIONS.inc('save_before_login', 'empty')
     return JsonResponse({
         'status': 'empty',
         'message': 'Cart is empty'
     })
 
 
+class OrderPagination(HybridPagination):
+    """Новые заказы первыми; курсоры идут по индексу (user, -created_at, -id)."""
+    ordering = ('-created_at', '-id')
+
+
+ARCHIVED_PARAMETER = OpenApiParameter(
+    'archived', bool, description="Читать архив заказов (orders.archive) вместо текущих заказов."
+)
+
+
 @extend_schema_view(
-    list=extend_schema(description="Получить список всех заказов текущего пользователя."),
-    retrieve=extend_schema(description="Получить детали конкретного заказа.")
+    list=extend_schema(description="Получить список всех заказов текущего пользователя.",
+                       parameters=[ARCHIVED_PARAMETER]),
+    retrieve=extend_schema(description="Получить детали конкретного заказа; заказ, "
+                                       "которого нет среди текущих, ищется в архиве.",
+                           parameters=[ARCHIVED_PARAMETER]),
 )
 class OrderViewSet(viewsets.ModelViewSet):
     """API для управления заказами текущего пользователя."""
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OrderPagination
 
     def get_queryset(self):
         if getattr(self, "swagger_fake_view", False):
             return Order.objects.none()
-        return Order.objects.filter(user=self.request.user)
+        return (
+            Order.objects.filter(user=self.request.user)
+            .select_related('user')
+            .prefetch_related(Prefetch('items', queryset=OrderItem.objects.order_by('id')))
+        )
+
+    def get_archived_queryset(self):
+        """Архивные заказы пользователя (orders.archive) - только для чтения."""
+        return ArchivedOrder.objects.filter(user=self.request.user)
+
+    def get_sources(self):
+        """(reader, queryset) для чтения: текущие заказы или, по ?archived=1, архив."""
+        archived = (archived_order_reader, self.get_archived_queryset())
+        if self.request.query_params.get('archived') in ('1', 'true'):
+            return [archived]
+        return [(order_reader, self.get_queryset()), archived]
+
+    # Чтение - быстрым путём: строки values() и скомпилированный OrderSerializer
+    # (config.serializers); ответ побайтно тот же, что у OrderSerializer
+
+    def list(self, request, *args, **kwargs):
+        reader, queryset = self.get_sources()[0]
+        rows = reader.values(self.filter_queryset(queryset))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(reader.serialize(page))
+        return Response(reader.serialize(list(rows)))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        lookup = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        # id при архивации сохраняются, поэтому промах по текущим заказам ищется в архиве
+        for reader, queryset in self.get_sources():
+            try:
+                row = generics.get_object_or_404(reader.values(self.filter_queryset(queryset)),
+                                                 **lookup)
+            except Http404:
+                continue
+            return Response(reader.serialize([row])[0])
+        raise Http404
+
+    # Запись - вместе со сводкой заказов покупателя (orders.stats) и дневными
+    # сводками продаж (orders.sales)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
\ No newline at end of file
+        with transaction.atomic():
+            order = serializer.save(user=self.request.user)
+            stats.record_order(order)
+            sales.add(Order.objects.filter(pk=order.pk))
+
+    def perform_update(self, serializer):
+        previous = serializer.instance
+        previous_status, previous_total = previous.status, previous.total_price
+        with transaction.atomic():
+            sales.subtract(Order.objects.filter(pk=previous.pk))
+            order = serializer.save()
+            stats.record_change(order, previous_status, previous_total)
+            sales.add(Order.objects.filter(pk=order.pk))
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            sales.subtract(Order.objects.filter(pk=instance.pk))
+            instance.delete()
+            stats.rebuild([instance.user_id])
+
+    @extend_schema(
+        request=OrderTransitionSerializer,
+        description="Перевести партию заказов любых покупателей в новый статус (только персонал).",
+    )
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAdminUser],
+            serializer_class=OrderTransitionSerializer)
+    def transition(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        status = serializer.validated_data['status']
+        try:
+            changed = transitions.transition(serializer.validated_data['ids'], status,
+                                             request.user)
+        except transitions.TransitionError as error:
+            raise serializers.ValidationError({'ids': error.errors})
+        return Response({'status': status, 'changed': changed})
@@ -0,0 +1,171 @@
+"""
+Кэш ответов каталога.
+
+Готовые ответы страниц и API каталога хранятся в общем кэше под ключом,
+который содержит версию каталога. Версию меняют сигналы post_save и
+post_delete товаров, категорий и отзывов, поэтому после любого изменения
+старые ответы просто перестают находиться и вытесняются по таймауту.
+Массовые .update() сигналов не шлют - после них нужно вызвать
+bump_catalog_version(); до тех пор устаревание ограничено CATALOG_CACHE_TIMEOUT.
+
+Персональные куски страницы (пользователь, бейдж корзины, csrf-токен)
+в кэшируемое тело не попадают: тег {% per_request %} оставляет на их месте
+маркер, а при каждой отдаче маркер заменяется шаблоном, отрендеренным для
+текущего запроса. ETag считается по закэшированному телу, а для страниц с
+фрагментами - ещё и по тому, от чего они зависят (пользователь, бейдж
+корзины, CSRF-секрет): csrf-токен маскируется заново при каждом рендере,
+и хэш итогового тела не совпадал бы никогда. Повторный запрос с
+If-None-Match получает 304 без тела; такие страницы отдаются с Vary: Cookie.
+
+Ответ из кэша отдаётся до dispatch() DRF, то есть без аутентификации,
+проверки прав и троттлинга, - декоратор годится только для публичных
+эндпоинтов только для чтения.
+"""
+import hashlib
+import re
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from orders.cart import get_cart_items_count
+
+VERSION_KEY = 'catalog:version'
+KEY_PREFIX = 'catalog:response'
+CACHED_HEADERS = ('Content-Type', 'Content-Language', 'Vary', 'Allow')
+
+# Флаг запроса, при котором {% per_request %} выводит маркер вместо фрагмента
+FRAGMENTS_ATTR = '_catalog_fragments'
+_MARKER_RE = re.compile(r'<!--per-request:([\w./-]+)-->')
+
+
+def fragment_marker(template_name: str) -> str:
+    return f'<!--per-request:{template_name}-->'
+
+
+def _cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def get_catalog_version() -> str:
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Ключ вытеснен или ещё не создан: новая версия отсекает все старые ответы
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version(**kwargs) -> None:
+    """Сменить версию каталога сейчас и после коммита; годится как обработчик сигналов."""
+    _set_new_version()
+    # Повторно после коммита: до него другие процессы могли закэшировать старые данные
+    transaction.on_commit(_set_new_version)
+
+
+def _set_new_version() -> None:
+    _cache().set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def response_cache_key(request) -> str:
+    """Ключ ответа: версия каталога, адрес запроса и Accept (формат ответа DRF)."""
+    url = request.build_absolute_uri()
+    accept = request.META.get('HTTP_ACCEPT', '')
+    digest = hashlib.blake2b(f'{url}\n{accept}'.encode(), digest_size=16).hexdigest()
+    return f'{KEY_PREFIX}:{get_catalog_version()}:{digest}'
+
+
+def cache_catalog_response(view_func):
+    """Декоратор view: отдавать GET/HEAD из кэша каталога и отвечать 304 по ETag."""
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view_func(request, *args, **kwargs)
+
+        key = response_cache_key(request)
+        entry = _cache().get(key)
+        if entry is not None:
+            response = HttpResponse(entry['content'], status=entry['status'])
+            for name, value in entry['headers'].items():
+                response[name] = value
+        else:
+            response = _render_cacheable(view_func, request, *args, **kwargs)
+            entry = _to_entry(response)
+            if entry is None:
+                return _fill_fragments(response, request)
+            _cache().set(key, entry, settings.CATALOG_CACHE_TIMEOUT)
+
+        response = _fill_fragments(response, request)
+        if _has_fragments(entry['content']):
+            # Ключ считается после рендера: csrf-секрет новому посетителю выдаёт сам фрагмент
+            response['ETag'] = _etag(entry['content'], _viewer_key(request))
+            patch_vary_headers(response, ('Cookie',))
+        else:
+            response['ETag'] = _etag(entry['content'])
+        return get_conditional_response(request, etag=response['ETag'], response=response)
+
+    return wrapper
+
+
+def _render_cacheable(view_func, request, *args, **kwargs):
+    setattr(request, FRAGMENTS_ATTR, True)
+    try:
+        response = view_func(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+    finally:
+        setattr(request, FRAGMENTS_ATTR, False)
+    return response
+
+
+def _to_entry(response):
+    """Снимок ответа для кэша или None, если ответ кэшировать нельзя."""
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return None
+    renderer = getattr(response, 'accepted_renderer', None)
+    if renderer is not None and renderer.format != 'json':
+        # Browsable API зависит от пользователя и содержит формы
+        return None
+    return {
+        'content': response.content,
+        'status': response.status_code,
+        'headers': {name: response[name] for name in CACHED_HEADERS if response.has_header(name)},
+    }
+
+
+def _has_fragments(content: bytes) -> bool:
+    return b'<!--per-request:' in content
+
+
+def _fill_fragments(response, request):
+    """Заменить маркеры фрагментов шаблонами, отрендеренными для этого запроса."""
+    if response.streaming or not _has_fragments(response.content):
+        return response
+    response.content = _MARKER_RE.sub(
+        lambda match: render_to_string(match.group(1), request=request),
+        response.content.decode(),
+    )
+    return response
+
+
+def _viewer_key(request) -> bytes:
+    """То, от чего зависят фрагменты: пользователь, бейдж корзины и CSRF-секрет."""
+    user = request.user
+    # Бейдж корзины выводится только вошедшим (partials/header_user.html)
+    cart_count = get_cart_items_count(request) if user.is_authenticated else 0
+    csrf_secret = request.META.get('CSRF_COOKIE', '')
+    return f'{user.pk}:{cart_count}:{csrf_secret}'.encode()
+
+
+def _etag(content: bytes, viewer_key: bytes = b'') -> str:
+    digest = hashlib.blake2b(content, digest_size=16)
+    if viewer_key:
+        digest.update(b'\0' + viewer_key)
+    return '"%s"' % digest.hexdigest()
@@ -0,0 +1,504 @@
+"""
+Потоковый импорт и экспорт каталога в CSV и JSONL.
+
+Строки читаются и пишутся по одной, в памяти держится только текущая
+пачка из chunk_size строк. Ключ товара - slug: строка с известным slug
+обновляет товар (только колонки, которые есть в строке), с новым slug или
+без slug - создаёт. Для новых товаров без slug он генерируется из
+названия пачкой: занятые в БД и в самом файле slug получают суффикс -2,
+-3, ... Категория ищется по slug или названию в дереве категорий в памяти
+(products.category_tree), без запроса на строку.
+
+Весь импорт - одна транзакция: файл применяется целиком или никак. На
+PostgreSQL пачки загружаются COPY во временную таблицу, а товары затем
+обновляются одним UPDATE ... FROM и создаются одним INSERT ... SELECT; на
+остальных СУБД каждая пачка пишется через bulk_update/bulk_create.
+Неизменившиеся товары не перезаписываются, а в UPDATE попадают только
+колонки из файла: синхронизация цен и остатков не трогает name/description
+и не запускает пересчёт поискового индекса. Обновлённые товары остаются
+заблокированными до конца импорта - оформление заказа с ними подождёт.
+
+Массовые операции сигналов не шлют, поэтому после импорта версия каталога
+сбрасывается явно. Экспорт читает товары через QuerySet.iterator() - на
+PostgreSQL это серверный курсор.
+"""
+import csv
+import io
+import json
+import re
+from dataclasses import dataclass, field
+from decimal import Decimal
+from itertools import islice
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from django.db import connections, transaction
+from django.utils.text import slugify
+
+from .cache import bump_catalog_version
+from .category_tree import CategoryTree, get_category_tree
+from .models import Product
+
+FORMATS = ('csv', 'jsonl')
+CHUNK_SIZE = 10000
+MAX_REPORTED_ERRORS = 100
+# Колонки файла; category - slug или название категории
+FIELDS = ('slug', 'name', 'category', 'description', 'price', 'stock', 'is_active')
+# Без этих колонок товар нельзя создать, только обновить
+REQUIRED_FOR_CREATE = ('name', 'category_id', 'price')
+# Колонки модели, которые заполняет импорт (category -> category_id)
+COLUMNS = ('slug', 'name', 'category_id', 'description', 'price', 'stock', 'is_active')
+STAGING_TABLE = 'products_catalog_import'
+
+SLUG_LENGTH = Product._meta.get_field('slug').max_length
+NAME_LENGTH = Product._meta.get_field('name').max_length
+# То же, что django.core.validators.validate_slug, без накладных расходов на вызов
+SLUG_RE = re.compile(r'^[-a-zA-Z0-9_]+\Z')
+# Неотрицательная цена, которая помещается в DecimalField(max_digits=10, decimal_places=2)
+PRICE_RE = re.compile(r'^\d{1,8}(\.\d{0,2})?\Z')
+# Экранирование для текстового формата COPY
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f'}
+
+
+def detect_format(path: str, default: str = 'csv') -> str:
+    """Формат по расширению файла: .jsonl/.ndjson - JSONL, иначе default."""
+    if path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if path.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(stream: IO[str], fmt: str) -> Iterator[Tuple[int, dict]]:
+    """Строки файла по одной: (номер строки в файле, словарь колонок)."""
+    if fmt == 'csv':
+        # csv.reader и zip вместо csv.DictReader: заметно быстрее на миллионах строк
+        reader = csv.reader(stream)
+        header = next(reader, [])
+        for row in reader:
+            if row:
+                yield reader.line_num, dict(zip(header, row))
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else {'': line}
+
+
+def write_rows(stream: IO[str], fmt: str, fields: Sequence[str],
+               rows: Iterable[Sequence]) -> int:
+    """Записать кортежи значений колонок fields; вернуть число строк."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(fields)
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+        return count
+    for count, row in enumerate(rows, 1):
+        stream.write(json.dumps(dict(zip(fields, row)), default=str, ensure_ascii=False) + '\n')
+    return count
+
+
+@dataclass
+class ImportResult:
+    """Итог импорта; updated - только товары, в которых что-то изменилось."""
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+    # (номер строки, причина) для первых MAX_REPORTED_ERRORS пропущенных строк
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+    def skip(self, line: int, message: str) -> None:
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+class RowError(ValueError):
+    """Строка файла не прошла проверку и пропускается."""
+
+
+class CatalogImporter:
+    """Импорт строк каталога пачками; см. описание модуля."""
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, use_copy: Optional[bool] = None,
+                 using: str = 'default'):
+        self.chunk_size = chunk_size
+        self.using = using
+        vendor = connections[using].vendor
+        self.use_copy = vendor == 'postgresql' if use_copy is None else use_copy
+        if self.use_copy and vendor != 'postgresql':
+            raise ValueError('COPY is only available on PostgreSQL')
+        self.result = ImportResult()
+        self._tree: Optional[CategoryTree] = None
+        self._staging_cursor = None
+        self._staging_indexed = False
+
+    def run(self, rows: Iterable[Tuple[int, dict]]) -> ImportResult:
+        """Импортировать весь поток в одной транзакции."""
+        self._tree = get_category_tree()
+        with transaction.atomic(using=self.using):
+            if self.use_copy:
+                self._run_copy(rows)
+            else:
+                for records in self._chunks(rows):
+                    self.assign_slugs(records)
+                    self.write_bulk(records)
+            if self.result.created or self.result.updated:
+                # bulk-операции и COPY сигналов не шлют
+                bump_catalog_version()
+        return self.result
+
+    def _chunks(self, rows: Iterable[Tuple[int, dict]]) -> Iterator[List[dict]]:
+        rows = iter(rows)
+        while chunk := list(islice(rows, self.chunk_size)):
+            records = self.clean_chunk(chunk)
+            if records:
+                yield records
+
+    # Разбор строк
+
+    def clean_chunk(self, chunk: List[Tuple[int, dict]]) -> List[dict]:
+        """
+        Проверенные записи пачки {колонка модели: значение, 'line': номер}.
+        Несколько строк с одним slug сливаются: поздние колонки побеждают.
+        """
+        records: List[dict] = []
+        by_slug: Dict[str, dict] = {}
+        for line, row in chunk:
+            try:
+                record = self.clean_row(row)
+            except RowError as exc:
+                self.result.skip(line, str(exc))
+                continue
+            record['line'] = line
+            slug = record.get('slug')
+            if slug is None:
+                records.append(record)
+            elif slug in by_slug:
+                by_slug[slug].update(record)
+            else:
+                by_slug[slug] = record
+                records.append(record)
+        return records
+
+    def clean_row(self, row: dict) -> dict:
+        """Колонки модели из строки файла; пустые значения - «не менять»."""
+        values = {key: row[key] for key in FIELDS if row.get(key) not in (None, '')}
+        if not values:
+            raise RowError('Empty or malformed row')
+        if 'slug' not in values and 'name' not in values:
+            raise RowError('Either slug or name is required')
+        record = {}
+        for key, value in values.items():
+            column = 'category_id' if key == 'category' else key
+            record[column] = getattr(self, f'clean_{key}')(value)
+        return record
+
+    @staticmethod
+    def clean_slug(value) -> str:
+        slug = str(value).strip()
+        if not SLUG_RE.match(slug):
+            raise RowError(f'Invalid slug {slug!r}')
+        if len(slug) > SLUG_LENGTH:
+            raise RowError(f'Slug {slug!r} is longer than {SLUG_LENGTH} characters')
+        return slug
+
+    @staticmethod
+    def clean_name(value) -> str:
+        name = str(value).strip()
+        if len(name) > NAME_LENGTH:
+            raise RowError(f'Name is longer than {NAME_LENGTH} characters')
+        return name
+
+    def clean_category(self, value) -> int:
+        category = self._tree.find(str(value))
+        if category is None:
+            raise RowError(f'Unknown category {value!r}')
+        return category.id
+
+    @staticmethod
+    def clean_description(value) -> str:
+        return str(value)
+
+    @staticmethod
+    def clean_price(value) -> Decimal:
+        text = str(value).strip()
+        if not PRICE_RE.match(text):
+            raise RowError(f'Invalid price {value!r}')
+        return Decimal(text)
+
+    @staticmethod
+    def clean_stock(value) -> int:
+        try:
+            stock = int(str(value).strip())
+        except ValueError:
+            stock = -1
+        if stock < 0:
+            raise RowError(f'Invalid stock {value!r}')
+        return stock
+
+    @staticmethod
+    def clean_is_active(value) -> bool:
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False
+        raise RowError(f'Invalid is_active {value!r}')
+
+    # Slug
+
+    def assign_slugs(self, records: List[dict]) -> None:
+        """
+        Сгенерировать slug для записей без него. Кандидаты проверяются одним
+        запросом на раунд; занятые получают следующий суффикс, поэтому
+        раундов столько, сколько суффиксов понадобилось самому частому имени.
+        """
+        pending = [record for record in records if 'slug' not in record]
+        if not pending:
+            return
+        taken = {record['slug'] for record in records if 'slug' in record}
+        bases = [slugify(record['name'])[:SLUG_LENGTH] or 'product' for record in pending]
+        attempts = [1] * len(pending)
+        indexes = list(range(len(pending)))
+        while indexes:
+            candidates = {index: _with_suffix(bases[index], attempts[index]) for index in indexes}
+            existing = self._taken_slugs(set(candidates.values()))
+            retry = []
+            for index in indexes:
+                slug = candidates[index]
+                if slug in existing or slug in taken:
+                    attempts[index] += 1
+                    retry.append(index)
+                else:
+                    taken.add(slug)
+                    pending[index]['slug'] = slug
+            indexes = retry
+
+    def _taken_slugs(self, slugs: set) -> set:
+        """Какие из slugs уже заняты товарами или строками, загруженными в COPY."""
+        taken = set(
+            Product.objects.using(self.using).filter(slug__in=slugs).values_list('slug', flat=True)
+        )
+        cursor = self._staging_cursor
+        if cursor is not None:
+            if not self._staging_indexed:
+                cursor.execute(f'CREATE INDEX ON {STAGING_TABLE} (slug)')
+                self._staging_indexed = True
+            cursor.execute(f'SELECT slug FROM {STAGING_TABLE} WHERE slug = ANY(%s)', [list(slugs)])
+            taken.update(slug for slug, in cursor.fetchall())
+        return taken
+
+    # Запись: bulk_create/bulk_update
+
+    def write_bulk(self, records: List[dict]) -> None:
+        by_slug = {record['slug']: record for record in records}
+        fields = sorted({key for record in records for key in record} & set(COLUMNS) - {'slug'})
+        existing = (
+            Product.objects.using(self.using)
+            .filter(slug__in=by_slug.keys())
+            .only('slug', *fields)
+        )
+        changed = []
+        for product in existing:
+            record = by_slug.pop(product.slug)
+            updates = {key: record[key] for key in fields if key in record}
+            if all(getattr(product, key) == value for key, value in updates.items()):
+                self.result.unchanged += 1
+                continue
+            for key, value in updates.items():
+                setattr(product, key, value)
+            changed.append(product)
+        if changed:
+            Product.objects.using(self.using).bulk_update(changed, fields)
+            self.result.updated += len(changed)
+
+        new = []
+        for record in by_slug.values():
+            missing = [key for key in REQUIRED_FOR_CREATE if key not in record]
+            if missing:
+                self.result.skip(record['line'], _missing_message(record['slug'], missing))
+                continue
+            values = {key: value for key, value in record.items() if key in COLUMNS}
+            new.append(Product(**{'description': '', **values}))
+        if new:
+            Product.objects.using(self.using).bulk_create(new)
+            self.result.created += len(new)
+
+    # Запись: COPY во временную таблицу (PostgreSQL)
+
+    def _run_copy(self, rows: Iterable[Tuple[int, dict]]) -> None:
+        """
+        Все пачки загружаются COPY во временную таблицу, затем товары
+        обновляются и создаются по одному запросу на весь файл: соединение
+        по slug хешем стоит одного прохода по таблице товаров, а не поиска
+        по индексу на каждую строку.
+        """
+        fields = set()
+        self._staging_indexed = False
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {STAGING_TABLE}')
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {STAGING_TABLE} ('
+                'line bigint, slug varchar(50), name varchar(200), category_id bigint, '
+                'description text, price numeric(10, 2), stock integer, is_active boolean'
+                ') ON COMMIT DROP'
+            )
+            self._staging_cursor = cursor
+            try:
+                for records in self._chunks(rows):
+                    self.assign_slugs(records)
+                    fields.update(key for record in records for key in record)
+                    self._copy_chunk(cursor, records)
+            finally:
+                self._staging_cursor = None
+            # Автоочистка временные таблицы не анализирует, а без статистики
+            # планировщик не выберет соединение хешем
+            cursor.execute(f'ANALYZE {STAGING_TABLE}')
+            self._merge_duplicates(cursor)
+            self._apply_staging(cursor, [key for key in COLUMNS[1:] if key in fields])
+
+    @staticmethod
+    def _copy_chunk(cursor, records: List[dict]) -> None:
+        columns = [key for key in COLUMNS if any(key in record for record in records)]
+        buffer = io.StringIO()
+        for record in records:
+            buffer.write('\t'.join([str(record['line']),
+                                    *(_copy_value(record.get(key)) for key in columns)]))
+            buffer.write('\n')
+        buffer.seek(0)
+        cursor.cursor.copy_expert(
+            f'COPY {STAGING_TABLE} (line, {", ".join(columns)}) FROM STDIN', buffer,
+        )
+
+    @staticmethod
+    def _merge_duplicates(cursor) -> None:
+        """Слить строки с одним slug из разных пачек: поздние колонки побеждают."""
+        cursor.execute(f'SELECT 1 FROM {STAGING_TABLE} GROUP BY slug HAVING count(*) > 1 LIMIT 1')
+        if cursor.fetchone() is None:
+            return
+        columns = COLUMNS[1:]
+        latest = ', '.join(
+            f'(array_agg({key} ORDER BY line DESC) FILTER (WHERE {key} IS NOT NULL))[1]'
+            for key in columns
+        )
+        cursor.execute(
+            f'WITH merged AS (SELECT max(line), slug, {latest} FROM {STAGING_TABLE} '
+            f'GROUP BY slug HAVING count(*) > 1), '
+            f'removed AS (DELETE FROM {STAGING_TABLE} s USING merged m WHERE s.slug = m.slug) '
+            f'INSERT INTO {STAGING_TABLE} (line, slug, {", ".join(columns)}) '
+            f'SELECT * FROM merged'
+        )
+
+    def _apply_staging(self, cursor, fields: List[str]) -> None:
+        cursor.execute(f'SELECT count(*) FROM {STAGING_TABLE} s '
+                       f'JOIN products_product p ON p.slug = s.slug')
+        matched = cursor.fetchone()[0]
+        updated = 0
+        if fields:
+            new_values = [f'COALESCE(s.{key}, p.{key})' for key in fields]
+            assignments = [f'{key} = {value}' for key, value in zip(fields, new_values)]
+            # Только колонки из файла: UPDATE OF name, description запустил бы
+            # триггер поискового индекса, и только изменившиеся строки
+            cursor.execute(
+                f'UPDATE products_product p SET {", ".join(assignments)} '
+                f'FROM {STAGING_TABLE} s WHERE p.slug = s.slug '
+                f'AND ({", ".join(f"p.{key}" for key in fields)}) '
+                f'IS DISTINCT FROM ({", ".join(new_values)})'
+            )
+            updated = cursor.rowcount
+        self.result.updated += updated
+        self.result.unchanged += matched - updated
+
+        new = 'NOT EXISTS (SELECT 1 FROM products_product p WHERE p.slug = s.slug)'
+        incomplete = ' OR '.join(f's.{key} IS NULL' for key in REQUIRED_FOR_CREATE)
+        cursor.execute(
+            f'SELECT line, slug, {", ".join(REQUIRED_FOR_CREATE)} FROM {STAGING_TABLE} s '
+            f'WHERE {new} AND ({incomplete}) ORDER BY line'
+        )
+        for line, slug, *values in cursor.fetchall():
+            missing = [key for key, value in zip(REQUIRED_FOR_CREATE, values) if value is None]
+            self.result.skip(line, _missing_message(slug, missing))
+
+        columns, expressions, params = self._insert_columns()
+        cursor.execute(
+            f'INSERT INTO products_product ({", ".join(columns)}) '
+            f'SELECT {", ".join(expressions)} FROM {STAGING_TABLE} s '
+            f'WHERE {new} AND NOT ({incomplete}) ORDER BY line',
+            params,
+        )
+        self.result.created += cursor.rowcount
+
+    @staticmethod
+    def _insert_columns() -> Tuple[List[str], List[str], list]:
+        """Колонки INSERT: из временной таблицы, остальные - значения по умолчанию модели."""
+        columns, expressions, params = [], [], []
+        for model_field in Product._meta.concrete_fields:
+            if model_field.primary_key:
+                continue
+            column = model_field.column
+            if column in COLUMNS:
+                columns.append(column)
+                if model_field.has_default():
+                    expressions.append(f'COALESCE(s.{column}, %s)')
+                    params.append(model_field.get_default())
+                elif column == 'description':
+                    expressions.append("COALESCE(s.description, '')")
+                else:
+                    expressions.append(f's.{column}')
+            elif model_field.has_default():
+                columns.append(column)
+                expressions.append('%s')
+                params.append(model_field.get_default())
+        return columns, expressions, params
+
+
+def import_catalog(stream: IO[str], fmt: str, **kwargs) -> ImportResult:
+    """Импортировать каталог из открытого файла формата fmt."""
+    return CatalogImporter(**kwargs).run(read_rows(stream, fmt))
+
+
+def export_catalog(stream: IO[str], fmt: str, fields: Sequence[str] = FIELDS,
+                   chunk_size: int = CHUNK_SIZE, using: str = 'default') -> int:
+    """Выгрузить товары в порядке id; вернуть число строк."""
+    lookups = ['category__slug' if name == 'category' else name for name in fields]
+    rows = (
+        Product.objects.using(using)
+        .order_by('id')
+        .values_list(*lookups)
+        .iterator(chunk_size=chunk_size)
+    )
+    return write_rows(stream, fmt, fields, rows)
+
+
+def _with_suffix(base: str, attempt: int) -> str:
+    if attempt == 1:
+        return base
+    suffix = f'-{attempt}'
+    return base[:SLUG_LENGTH - len(suffix)] + suffix
+
+
+def _missing_message(slug: str, missing: Sequence[str]) -> str:
+    columns = ', '.join('category' if key == 'category_id' else key for key in missing)
+    return f'New product {slug!r} requires {columns}'
+
+
+def _copy_value(value) -> str:
+    """Значение в текстовом формате COPY: \\N для NULL, спецсимволы экранированы."""
+    if value is None:
+        return '\\N'
+    if value is True or value is False:
+        return 't' if value else 'f'
+    if isinstance(value, str):
+        return value.translate(COPY_ESCAPES)
+    return str(value)
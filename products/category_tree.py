@@ -0,0 +1,80 @@
+"""
+Дерево категорий в памяти процесса.
+
+Дерево строится одним запросом и хранится в модуле вместе с версией.
+Сама версия лежит в общем кэше и меняется сигналами при сохранении или
+удалении категории, поэтому каждый процесс перестраивает дерево при
+следующем обращении после изменения. Массовые Category.objects.update()
+сигналов не шлют - после них нужно вызвать invalidate_category_tree().
+"""
+import threading
+import uuid
+from typing import Dict, List, Optional
+
+from django.core.cache import cache
+
+from .models import Category
+
+VERSION_KEY = 'products:category_tree:version'
+
+_lock = threading.Lock()
+_cached: Optional['CategoryTree'] = None
+
+
+class CategoryTree:
+    """Неизменяемый снимок всех категорий с индексами по slug, имени и родителю."""
+
+    def __init__(self, categories: List[Category], version: str):
+        self.version = version
+        # Порядок по path: родитель всегда раньше своих потомков
+        self.categories = categories
+        self._by_slug = {category.slug: category for category in categories}
+        self._by_name = {category.name.lower(): category for category in categories}
+        self._children: Dict[Optional[int], List[Category]] = {}
+        for category in categories:
+            self._children.setdefault(category.parent_id, []).append(category)
+
+    def find(self, value: str) -> Optional[Category]:
+        """Найти категорию по slug или по названию без учёта регистра."""
+        value = value.strip()
+        return self._by_slug.get(value) or self._by_name.get(value.lower())
+
+    @property
+    def roots(self) -> List[Category]:
+        return self._children.get(None, [])
+
+    def children(self, category: Category) -> List[Category]:
+        return self._children.get(category.id, [])
+
+    def descendant_ids(self, category: Category) -> List[int]:
+        """id категории и всех её потомков."""
+        return [item.id for item in self.categories if item.path.startswith(category.path)]
+
+
+def get_category_tree() -> CategoryTree:
+    """Вернуть дерево текущей версии, при необходимости перестроив его."""
+    global _cached
+
+    version = _current_version()
+    tree = _cached
+    if tree is not None and tree.version == version:
+        return tree
+
+    with _lock:
+        if _cached is None or _cached.version != version:
+            _cached = CategoryTree(list(Category.objects.order_by('path')), version)
+        return _cached
+
+
+def invalidate_category_tree(**kwargs) -> None:
+    """Сменить версию дерева; годится как обработчик сигналов."""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def _current_version() -> str:
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Ключ вытеснен или ещё не создан: любая новая версия сбрасывает старые деревья
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
@@ -0,0 +1,154 @@
+"""
+Фасеты списка товаров: сколько товаров в каждой категории (вместе с
+подкатегориями), в каждом диапазоне цен и в наличии - при текущем поиске
+и фильтрах.
+
+Фасеты дизъюнктивные: счётчики измерения учитывают фильтры остальных
+измерений, но не свой собственный, иначе выбор категории обнулил бы все
+соседние категории. Все счётчики считает один запрос GROUP BY category_id
+с условными COUNT, а суммы по поддеревьям и выбранным категориям
+складываются в Python по закэшированному дереву категорий. Результат
+кэшируется по нормализованному ключу фильтров и версии каталога
+(products.cache); резервы корзин меняют наличие без смены версии, поэтому
+счётчик «в наличии» может отставать на CATALOG_CACHE_TIMEOUT.
+"""
+import hashlib
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, F, Q
+
+from .cache import get_catalog_version
+from .category_tree import get_category_tree
+from .models import Product
+from .search import search_products
+
+KEY_PREFIX = 'catalog:facets'
+# Границы диапазонов цен: до 10, 10-24.99, 25-49.99, 50-99.99, от 100
+PRICE_BUCKETS = (Decimal('10'), Decimal('25'), Decimal('50'), Decimal('100'))
+CENT = Decimal('0.01')
+
+
+def price_filter(price_min: Optional[Decimal], price_max: Optional[Decimal]) -> Q:
+    """Цена в границах [price_min, price_max], обе включительно."""
+    condition = Q()
+    if price_min is not None:
+        condition &= Q(price__gte=price_min)
+    if price_max is not None:
+        condition &= Q(price__lte=price_max)
+    return condition
+
+
+def in_stock_filter() -> Q:
+    """Товар можно положить в корзину: остаток больше резервов."""
+    return Q(stock__gt=F('reserved'))
+
+
+def category_filter(paths: Tuple[str, ...]) -> Q:
+    """Товары категорий с путями paths и всех их подкатегорий (индекс по path)."""
+    condition = Q(pk__in=[])
+    for path in paths:
+        condition |= Q(category__path__startswith=path)
+    return condition
+
+
+@dataclass(frozen=True)
+class PriceBucket:
+    price_min: Optional[Decimal]
+    price_max: Optional[Decimal]
+
+    @property
+    def label(self) -> str:
+        if self.price_min is None:
+            return f'Under ${self.price_max + CENT:.2f}'
+        if self.price_max is None:
+            return f'${self.price_min:.2f} and above'
+        return f'${self.price_min:.2f} - ${self.price_max:.2f}'
+
+
+def price_buckets() -> List[PriceBucket]:
+    bounds = (None, *PRICE_BUCKETS, None)
+    return [
+        PriceBucket(low, None if high is None else high - CENT)
+        for low, high in zip(bounds, bounds[1:])
+    ]
+
+
+@dataclass(frozen=True)
+class CatalogFilters:
+    """
+    Нормализованные фильтры списка товаров. None - измерение не фильтруется;
+    search - слова запроса через пробел, category_paths - отсортированные
+    пути выбранных категорий (пустой кортеж - ни одна не найдена).
+    """
+    search: Optional[str] = None
+    category_paths: Optional[Tuple[str, ...]] = None
+    price_min: Optional[Decimal] = None
+    price_max: Optional[Decimal] = None
+    in_stock: Optional[bool] = None
+
+    def cache_key(self) -> str:
+        digest = hashlib.blake2b(repr(self).encode(), digest_size=16).hexdigest()
+        return f'{KEY_PREFIX}:{get_catalog_version()}:{digest}'
+
+
+@dataclass
+class Facets:
+    categories: Dict[int, int]  # id категории -> товаров в ней и подкатегориях
+    price_buckets: List[int]  # по одному счётчику на price_buckets()
+    in_stock: int
+
+
+def get_facets(filters: CatalogFilters) -> Facets:
+    """Фасеты для фильтров из кэша или одним запросом к БД."""
+    cache = caches[settings.CATALOG_CACHE_ALIAS]
+    key = filters.cache_key()
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(filters)
+        cache.set(key, facets, settings.CATALOG_CACHE_TIMEOUT)
+    return facets
+
+
+def compute_facets(filters: CatalogFilters) -> Facets:
+    queryset = Product.objects.filter(is_active=True)
+    if filters.search is not None:
+        queryset = search_products(queryset, filters.search)
+
+    prices = price_filter(filters.price_min, filters.price_max)
+    stock = Q()
+    if filters.in_stock is not None:
+        stock = in_stock_filter() if filters.in_stock else ~in_stock_filter()
+    buckets = {
+        f'price_{index}': Count('id', filter=price_filter(bucket.price_min, bucket.price_max)
+                                & stock or None)
+        for index, bucket in enumerate(price_buckets())
+    }
+    rows = list(
+        queryset.order_by().values('category_id').annotate(
+            for_categories=Count('id', filter=prices & stock or None),
+            in_stock=Count('id', filter=prices & in_stock_filter()),
+            **buckets,
+        )
+    )
+
+    tree = get_category_tree()
+    paths = {category.id: category.path for category in tree.categories}
+    selected = filters.category_paths
+    facets = Facets(categories={}, price_buckets=[0] * len(buckets), in_stock=0)
+    for row in rows:
+        path = paths.get(row['category_id'], '')
+        # Товар считается в своей категории и во всех её предках
+        for ancestor in path.split('/')[:-1]:
+            ancestor_id = int(ancestor)
+            facets.categories[ancestor_id] = (
+                facets.categories.get(ancestor_id, 0) + row['for_categories']
+            )
+        if selected is None or any(path.startswith(prefix) for prefix in selected):
+            facets.in_stock += row['in_stock']
+            for index in range(len(buckets)):
+                facets.price_buckets[index] += row[f'price_{index}']
+    return facets
@@ -0,0 +1,50 @@
+"""Фильтры товаров для API и страницы списка."""
+from django_filters import rest_framework as filters
+from rest_framework.filters import BaseFilterBackend
+
+from .facets import in_stock_filter
+from .models import Product
+from .search import search_products
+
+
+class ProductRangeFilterSet(filters.FilterSet):
+    """Диапазон цены и наличие; общие для API и страницы списка товаров."""
+    price_min = filters.NumberFilter(field_name='price', lookup_expr='gte')
+    price_max = filters.NumberFilter(field_name='price', lookup_expr='lte')
+    in_stock = filters.BooleanFilter(method='filter_in_stock')
+
+    class Meta:
+        model = Product
+        fields = []
+
+    def filter_in_stock(self, queryset, name, value):
+        condition = in_stock_filter()
+        return queryset.filter(condition) if value else queryset.exclude(condition)
+
+
+class ProductFilterSet(ProductRangeFilterSet):
+    """Фильтры API: прежние точные category и price плюс диапазоны."""
+
+    class Meta:
+        model = Product
+        fields = ['category', 'price']
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """Полнотекстовый поиск ?search=... через products.search вместо SearchFilter."""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return search_products(queryset, query)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search by product name and description.',
+            'schema': {'type': 'string'},
+        }]
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from products.related import TOP_N, refresh_related_products
+
+
+class Command(BaseCommand):
+    help = ("Пересчитать «С этим товаром покупают» по заказам "
+            "(по умолчанию только по новым заказам; запускать по cron)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Пересчитать все товары, а не только из новых заказов")
+        parser.add_argument('--top', type=int, default=TOP_N)
+
+    def handle(self, *args, **options):
+        run = refresh_related_products(full=options['full'], top_n=options['top'])
+        mode = "full" if run.full else "incremental"
+        self.stdout.write(
+            f"Updated related products for {run.products_updated} products "
+            f"({mode}, through order {run.last_order_id})"
+        )
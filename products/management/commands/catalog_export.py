@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog_io import CHUNK_SIZE, FIELDS, FORMATS, detect_format, export_catalog
+
+
+class Command(BaseCommand):
+    help = "Экспорт товаров в CSV или JSONL потоком (серверный курсор на PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Файл или - для stdout")
+        parser.add_argument('--format', choices=FORMATS,
+                            help="По умолчанию по расширению файла, иначе csv")
+        parser.add_argument('--fields', default=','.join(FIELDS),
+                            help="Колонки через запятую, например slug,price,stock")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        fields = [name.strip() for name in options['fields'].split(',') if name.strip()]
+        unknown = sorted(set(fields) - set(FIELDS))
+        if unknown or not fields:
+            raise CommandError(f"Unknown fields: {', '.join(unknown)}; "
+                               f"available: {', '.join(FIELDS)}")
+        if path == '-':
+            count = export_catalog(self.stdout, fmt, fields, options['chunk_size'])
+            self.stderr.write(f"Exported {count} products")
+            return
+        try:
+            stream = open(path, 'w', newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(f"Cannot open {path}: {exc}")
+        with stream:
+            count = export_catalog(stream, fmt, fields, options['chunk_size'])
+        self.stdout.write(f"Exported {count} products to {path}")
@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from products.catalog_io import CHUNK_SIZE, FORMATS, detect_format, import_catalog
+
+
+class Command(BaseCommand):
+    help = ("Импорт товаров из CSV или JSONL потоком, пачками "
+            "(ключ - slug; пустые колонки не меняют товар)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Файл или - для stdin")
+        parser.add_argument('--format', choices=FORMATS,
+                            help="По умолчанию по расширению файла, иначе csv")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--no-copy', action='store_true',
+                            help="bulk_create/bulk_update вместо COPY на PostgreSQL")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        if path == '-':
+            result = import_catalog(sys.stdin, fmt, chunk_size=options['chunk_size'],
+                                    use_copy=use_copy)
+        else:
+            try:
+                stream = open(path, newline='', encoding='utf-8')
+            except OSError as exc:
+                raise CommandError(f"Cannot open {path}: {exc}")
+            with stream:
+                result = import_catalog(stream, fmt, chunk_size=options['chunk_size'],
+                                        use_copy=use_copy)
+
+        for line, message in result.errors:
+            self.stderr.write(f"Line {line}: {message}")
+        if result.skipped > len(result.errors):
+            self.stderr.write(f"... and {result.skipped - len(result.errors)} more")
+        self.stdout.write(
+            f"Created {result.created}, updated {result.updated}, "
+            f"unchanged {result.unchanged}, skipped {result.skipped}"
+        )
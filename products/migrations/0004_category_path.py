@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:25
+
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    """Проставить пути существующим категориям обходом от корней."""
+    Category = apps.get_model('products', 'Category')
+    children = {}
+    for category in Category.objects.only('id', 'parent_id'):
+        children.setdefault(category.parent_id, []).append(category)
+
+    updated = []
+    stack = [(category, '') for category in children.get(None, [])]
+    while stack:
+        category, parent_path = stack.pop()
+        category.path = f'{parent_path}{category.id}/'
+        updated.append(category)
+        stack.extend((child, category.path) for child in children.get(category.id, []))
+    Category.objects.bulk_update(updated, ['path'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(
+                fields=['path'], name='products_category_path_idx', opclasses=['varchar_pattern_ops']
+            ),
+        ),
+    ]
@@ -1,16 +1,69 @@
-from django.db import models
+from typing import Dict
+
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 from django.utils.text import slugify
 
+RATINGS = range(1, 6)
+
 
 class Category(models.Model):
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     parent = models.ForeignKey('self', null=True, blank=True, related_name='children', on_delete=models.CASCADE)
+    # Материализованный путь из id предков и самой категории: '1/5/12/'.
+    # Поддерживается в save(); потомки - строки, чей path начинается с этого.
+    path = models.CharField(max_length=255, editable=False, default='')
+
+    class Meta:
+        indexes = [
+            # varchar_pattern_ops позволяет PostgreSQL вести LIKE 'prefix%' по индексу
+            models.Index(
+                fields=['path'], name='products_category_path_idx',
+                opclasses=['varchar_pattern_ops'],
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            old_path = ''
+            if self.pk is not None:
+                old_path = (
+                    Category.objects.filter(pk=self.pk).values_list('path', flat=True).first() or ''
+                )
+            super().save(*args, **kwargs)
+            self._update_path(old_path)
+
+    def _update_path(self, old_path: str) -> None:
+        """Пересчитать путь категории и, если она переехала, пути всех её потомков."""
+        parent_path = ''
+        if self.parent_id is not None:
+            parent_path = Category.objects.values_list('path', flat=True).get(pk=self.parent_id)
+        new_path = f'{parent_path}{self.pk}/'
+        if new_path == old_path:
+            self.path = new_path
+            return
+        if old_path and parent_path.startswith(old_path):
+            raise ValueError('Category cannot be moved under itself or its descendant')
+
+        Category.objects.filter(pk=self.pk).update(path=new_path)
+        if old_path:
+            Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1),
+                            output_field=models.CharField())
+            )
+        self.path = new_path
+
+    def get_descendants(self, include_self: bool = True) -> models.QuerySet:
+        """Категория и все её потомки одним запросом по индексу path."""
+        queryset = Category.objects.filter(path__startswith=self.path)
+        if not include_self:
+            queryset = queryset.exclude(pk=self.pk)
+        return queryset
 
     def __str__(self):
         return self.name
@@ -23,12 +76,91 @@ class Product(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    # Сколько единиц удерживают активные резервы корзин (orders.reservations)
+    reserved = models.PositiveIntegerField(default=0, editable=False)
     is_active = models.BooleanField(default=True)
+    # Заполняется триггером PostgreSQL из name и description (products.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Агрегаты отзывов, поддерживаются инкрементально (reviews.aggregates)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+
+    # Счётчики, которые меняются только UPDATE ... SET x = x + d: save() их не пишет,
+    # иначе устаревший экземпляр (админка, API) затрёт чужие изменения
+    COUNTER_FIELDS = frozenset({
+        'reserved', 'rating_avg', 'rating_count',
+        'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5',
+    })
+
+    class Meta:
+        indexes = [
+            # Частичные индексы: витрина и API читают только активные товары.
+            # Товары категории (и её поддерева через path) в порядке страниц
+            models.Index(fields=['category', 'id'], condition=models.Q(is_active=True),
+                         name='products_active_category_idx'),
+            # Фильтры price_min/price_max и диапазоны цен в фасетах
+            models.Index(fields=['price'], condition=models.Q(is_active=True),
+                         name='products_active_price_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        if (not self._state.adding and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert') and not args):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
         super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
+
+    @property
+    def rating_histogram(self) -> Dict[int, int]:
+        """Количество отзывов по оценкам: {1: n1, ..., 5: n5}."""
+        return {rating: getattr(self, f'rating_{rating}') for rating in RATINGS}
+
+    @property
+    def available_stock(self) -> int:
+        """Остаток, который ещё можно положить в корзину."""
+        return max(self.stock - self.reserved, 0)
+
+
+class RelatedProduct(models.Model):
+    """
+    Товар, который покупают вместе с product: top-N соседей по числу общих
+    заказов. Строки целиком пересчитывает products.related.
+    """
+    product = models.ForeignKey(Product, related_name='related_links', on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    position = models.PositiveSmallIntegerField()
+    co_purchases = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['product', 'position']
+        constraints = [
+            # Заодно индекс для выборки соседей на странице товара
+            models.UniqueConstraint(fields=['product', 'position'],
+                                    name='related_product_position_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.co_purchases})"
+
+
+class RelatedProductsRun(models.Model):
+    """Запуск пересчёта RelatedProduct: до какого заказа учтены покупки."""
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_order_id = models.PositiveBigIntegerField()
+    full = models.BooleanField()
+    products_updated = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"Run #{self.id} through order {self.last_order_id}"
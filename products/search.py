@@ -0,0 +1,147 @@
+"""
+Полнотекстовый поиск по товарам.
+
+Бэкенд выбирается по СУБД, с которой работает queryset:
+- PostgreSQL: хранимая колонка search_vector (tsvector) под GIN-индексом,
+  которую заполняет триггер, ранжирование ts_rank;
+- SQLite: виртуальная таблица FTS5 над name/description, синхронизируемая
+  триггерами, ранжирование bm25 (для локальной разработки);
+- остальные СУБД: прежний поиск через icontains.
+
+Триггеры, индекс и FTS-таблицу создаёт миграция products.0003_product_search.
+SQLite пересоздаёт таблицу при изменении её схемы и теряет триггеры, поэтому
+после migrate их восстанавливает restore_sqlite_triggers().
+Каждое слово запроса ищется как префикс: 'cit' находит 'Citra', как и icontains.
+"""
+import re
+from typing import List
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'products_product_fts'
+MAX_TERMS = 10
+
+# Только буквы и цифры: операторы tsquery и FTS5 из запроса не попадают
+_TERM_RE = re.compile(r'[^\W_]+')
+
+
+def search_terms(query: str) -> List[str]:
+    """Разбить пользовательский запрос на слова."""
+    return _TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+class SearchBackend:
+    """Базовый класс бэкенда поиска."""
+
+    def search(self, queryset: QuerySet, query: str) -> QuerySet:
+        """Отфильтровать товары по запросу и упорядочить по релевантности."""
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        return self.filter(queryset, terms)
+
+    def filter(self, queryset: QuerySet, terms: List[str]) -> QuerySet:
+        raise NotImplementedError
+
+
+class PostgresSearchBackend(SearchBackend):
+    """to_tsquery по колонке search_vector (GIN-индекс)."""
+
+    def filter(self, queryset: QuerySet, terms: List[str]) -> QuerySet:
+        query = SearchQuery(
+            ' & '.join(f'{term}:*' for term in terms), search_type='raw', config=SEARCH_CONFIG
+        )
+        return (
+            queryset.filter(search_vector=query)
+            .annotate(rank=SearchRank(F('search_vector'), query))
+            .order_by('-rank', 'id')
+        )
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """MATCH по FTS5-таблице products_product_fts."""
+
+    def filter(self, queryset: QuerySet, terms: List[str]) -> QuerySet:
+        match = ' '.join(f'"{term}"*' for term in terms)
+        table = queryset.model._meta.db_table
+        matched = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,))
+        # bm25 тем меньше, чем релевантнее строка; название весит больше описания
+        rank = RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+            (match,),
+        )
+        return queryset.filter(id__in=matched).annotate(rank=rank).order_by('-rank', 'id')
+
+
+class IcontainsSearchBackend(SearchBackend):
+    """Поиск без индекса: каждое слово должно встретиться в названии или описании."""
+
+    def filter(self, queryset: QuerySet, terms: List[str]) -> QuerySet:
+        for term in terms:
+            queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return queryset
+
+
+SEARCH_BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+# Те же триггеры, что в миграции 0003; после пересоздания таблицы SQLite их теряет
+SQLITE_TRIGGERS = {
+    'products_product_fts_insert': f"""
+        CREATE TRIGGER products_product_fts_insert AFTER INSERT ON products_product BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+    """,
+    'products_product_fts_delete': f"""
+        CREATE TRIGGER products_product_fts_delete AFTER DELETE ON products_product BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END
+    """,
+    'products_product_fts_update': f"""
+        CREATE TRIGGER products_product_fts_update AFTER UPDATE OF name, description
+        ON products_product BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO {FTS_TABLE} (rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+    """,
+}
+
+
+def restore_sqlite_triggers(using: str = 'default', **kwargs) -> None:
+    """Обработчик post_migrate: вернуть потерянные триггеры FTS5 и перестроить индекс."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, name FROM sqlite_master WHERE name LIKE 'products_product_fts%'"
+        )
+        existing = {name for _, name in cursor.fetchall()}
+        missing = [name for name in SQLITE_TRIGGERS if name not in existing]
+        if FTS_TABLE not in existing or not missing:
+            return
+        for name in missing:
+            cursor.execute(SQLITE_TRIGGERS[name])
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def get_search_backend(using: str = 'default') -> SearchBackend:
+    """Бэкенд поиска для СУБД указанного соединения."""
+    return SEARCH_BACKENDS.get(connections[using].vendor, IcontainsSearchBackend)()
+
+
+def search_products(queryset: QuerySet, query: str) -> QuerySet:
+    """Найти товары из queryset по пользовательскому запросу."""
+    return get_search_backend(queryset.db).search(queryset, query)
@@ -20,9 +20,13 @@ class ReviewSerializer(serializers.ModelSerializer):
 
 
 class ProductSerializer(serializers.ModelSerializer):
+    """Товар с агрегатами отзывов; сами отзывы - /api/products/{id}/reviews/."""
     category = CategorySerializer(read_only=True)
-    reviews = ReviewSerializer(many=True, read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'slug', 'category', 'description', 'price', 'stock', 'reviews']
+        fields = [
+            'id', 'name', 'slug', 'category', 'description', 'price', 'stock',
+            'rating_avg', 'rating_count', 'rating_histogram',
+        ]
@@ -0,0 +1,23 @@
+"""Сигналы приложения товаров."""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .category_tree import invalidate_category_tree
+from .models import Category, Product
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, **kwargs):
+    """Любое изменение категории делает закэшированное дерево устаревшим."""
+    invalidate_category_tree()
+    # Повторно после коммита: до него другие процессы могли собрать дерево по старым данным
+    transaction.on_commit(invalidate_category_tree)
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def catalog_changed(sender, **kwargs):
+    """Закэшированные ответы каталога устаревают при любом изменении товаров и категорий."""
+    bump_catalog_version()
@@ -0,0 +1,20 @@
+"""Теги шаблонов для кэша ответов каталога (см. products.cache)."""
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..cache import FRAGMENTS_ATTR, fragment_marker
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def per_request(context, template_name):
+    """
+    Персональный фрагмент страницы. Когда страница рендерится для кэша,
+    выводится маркер, который заменяется при каждой отдаче; иначе шаблон
+    рендерится сразу в текущем контексте.
+    """
+    request = context.get('request')
+    if getattr(request, FRAGMENTS_ATTR, False):
+        return mark_safe(fragment_marker(template_name))
+    return context.template.engine.get_template(template_name).render(context)
@@ -1,6 +1,22 @@
+import base64
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+
 import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APIClient
-from .models import Category, Product
+
+from . import catalog_io, facets, related
+from .cache import get_catalog_version
+from .category_tree import get_category_tree
+from .models import Category, Product, RelatedProduct
+from .search import search_products
 
 
 @pytest.mark.django_db
@@ -16,3 +32,709 @@ class TestProductAPI:
         assert response.status_code == 200
         assert len(response.data['results']) == 1
         assert response.data['results'][0]['name'] == "Citra"
+
+
+@pytest.fixture
+def catalog(db):
+    cat = Category.objects.create(name="Hops", slug="hops")
+    return {
+        product.slug: product
+        for product in [
+            Product.objects.create(name="Citra", slug="citra", price=10, category=cat,
+                                   description="Tropical aroma hop"),
+            Product.objects.create(name="Cascade", slug="cascade", price=10, category=cat,
+                                   description="Classic hop with citrus notes, pairs with Citra"),
+            Product.objects.create(name="Pilsner Malt", slug="pilsner-malt", price=5, category=cat,
+                                   description="Light base malt"),
+            Product.objects.create(name="Citra Hidden", slug="citra-hidden", price=10,
+                                   category=cat, description="", is_active=False),
+        ]
+    }
+
+
+@pytest.mark.django_db
+class TestProductSearch:
+    def test_name_matches_rank_above_description_matches(self, catalog):
+        results = search_products(Product.objects.filter(is_active=True), 'citra')
+
+        assert [product.slug for product in results] == ['citra', 'cascade']
+
+    def test_terms_match_as_prefixes_and_all_must_match(self, catalog):
+        queryset = Product.objects.all()
+
+        assert {p.slug for p in search_products(queryset, 'pils')} == {'pilsner-malt'}
+        assert {p.slug for p in search_products(queryset, 'citrus cascade')} == {'cascade'}
+        assert not search_products(queryset, 'citrus malt').exists()
+
+    def test_operator_characters_are_ignored(self, catalog):
+        queryset = Product.objects.all()
+
+        assert {p.slug for p in search_products(queryset, "malt' & | !(")} == {'pilsner-malt'}
+        assert not search_products(queryset, '&&& ***').exists()
+
+    def test_index_follows_updates(self, catalog):
+        product = catalog['pilsner-malt']
+        product.name = 'Vienna Malt'
+        product.save()
+        Product.objects.filter(slug='citra').update(description='Mosaic-like', stock=3)
+
+        queryset = Product.objects.all()
+        assert {p.slug for p in search_products(queryset, 'vienna')} == {'pilsner-malt'}
+        assert not search_products(queryset, 'pilsner').exists()
+        assert {p.slug for p in search_products(queryset, 'mosaic')} == {'citra'}
+
+    def test_postgres_uses_stored_vector(self, catalog):
+        if connection.vendor != 'postgresql':
+            pytest.skip('tsvector is PostgreSQL-only')
+
+        sql = str(search_products(Product.objects.all(), 'citra').query)
+
+        assert '@@' in sql
+        assert 'ILIKE' not in sql.upper()
+        assert Product.objects.filter(search_vector__isnull=True).count() == 0
+
+    def test_product_list_page_uses_search(self, catalog):
+        response = Client().get('/products/', {'search': 'citra'})
+
+        assert [p.slug for p in response.context['products']] == ['citra', 'cascade']
+
+    def test_api_uses_search(self, catalog):
+        response = APIClient().get('/api/products/', {'search': 'malt'})
+
+        assert [p['slug'] for p in response.data['results']] == ['pilsner-malt']
+
+
+@pytest.fixture
+def category_tree(db):
+    hops = Category.objects.create(name="Hops", slug="hops")
+    aroma = Category.objects.create(name="Aroma Hops", slug="aroma-hops", parent=hops)
+    noble = Category.objects.create(name="Noble Hops", slug="noble-hops", parent=aroma)
+    malts = Category.objects.create(name="Malts", slug="malts")
+    for category in (hops, aroma, noble, malts):
+        Product.objects.create(name=f"{category.name} item", slug=f"{category.slug}-item",
+                               price=1, category=category, description="")
+    return {category.slug: category for category in (hops, aroma, noble, malts)}
+
+
+@pytest.mark.django_db
+class TestCategoryTree:
+    def test_paths_follow_ancestors(self, category_tree):
+        hops, noble = category_tree['hops'], category_tree['noble-hops']
+
+        assert noble.path == f"{hops.id}/{category_tree['aroma-hops'].id}/{noble.id}/"
+        assert set(hops.get_descendants().values_list('slug', flat=True)) == {
+            'hops', 'aroma-hops', 'noble-hops'
+        }
+
+    def test_move_rewrites_subtree_paths(self, category_tree):
+        aroma = category_tree['aroma-hops']
+        aroma.parent = category_tree['malts']
+        aroma.save()
+
+        noble = Category.objects.get(slug='noble-hops')
+        assert noble.path == f"{category_tree['malts'].id}/{aroma.id}/{noble.id}/"
+        assert list(category_tree['hops'].get_descendants().values_list('slug', flat=True)) == [
+            'hops'
+        ]
+
+    def test_move_under_descendant_is_rejected(self, category_tree):
+        hops = category_tree['hops']
+        hops.parent = category_tree['noble-hops']
+
+        with pytest.raises(ValueError):
+            hops.save()
+
+        assert Category.objects.get(slug='hops').parent_id is None
+
+    def test_list_includes_subcategories_in_one_query(self, category_tree):
+        client = Client()
+        client.get('/products/')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get('/products/', {'category': 'hops'})
+
+        assert {p.slug for p in response.context['products']} == {
+            'hops-item', 'aroma-hops-item', 'noble-hops-item'
+        }
+        product_queries = [q['sql'] for q in ctx.captured_queries
+                           if 'FROM "products_product"' in q['sql']]
+        # COUNT для пагинатора, сама страница и фасеты, категории берутся из дерева
+        assert len(ctx.captured_queries) == len(product_queries) == 3
+
+    def test_list_accepts_several_category_names(self, category_tree):
+        response = Client().get('/products/', {'category': 'Noble Hops,Malts'})
+
+        assert {p.slug for p in response.context['products']} == {'noble-hops-item', 'malts-item'}
+
+    def test_unknown_category_matches_nothing(self, category_tree):
+        response = Client().get('/products/', {'category': 'missing'})
+
+        assert list(response.context['products']) == []
+
+    def test_tree_is_cached_until_a_category_changes(
+        self, category_tree, django_assert_num_queries
+    ):
+        tree = get_category_tree()
+        with django_assert_num_queries(0):
+            assert get_category_tree() is tree
+
+        Category.objects.create(name="Yeast", slug="yeast")
+
+        rebuilt = get_category_tree()
+        assert rebuilt is not tree
+        assert rebuilt.find('yeast') is not None
+        assert [c.slug for c in rebuilt.children(category_tree['hops'])] == ['aroma-hops']
+
+
+@pytest.mark.django_db
+class TestProductFacets:
+    @pytest.fixture
+    def shelf(self, category_tree):
+        # По одному товару на категорию за 1.00 (category_tree) плюс товары подороже
+        Product.objects.create(name="Citra", slug="citra", price=12, stock=5,
+                               category=category_tree['aroma-hops'], description="citrus hop")
+        Product.objects.create(name="Saaz", slug="saaz", price=30, stock=0,
+                               category=category_tree['noble-hops'], description="noble hop")
+        Product.objects.create(name="Pilsner", slug="pilsner", price=120, stock=3,
+                               category=category_tree['malts'], description="base malt")
+        Product.objects.filter(price=1).update(stock=1)
+        return category_tree
+
+    def test_counts_are_disjunctive_in_one_query(self, shelf, django_assert_num_queries):
+        get_category_tree()
+        filters = facets.CatalogFilters(
+            category_paths=(shelf['aroma-hops'].path,), price_max=Decimal('49.99'), in_stock=True,
+        )
+
+        with django_assert_num_queries(1):
+            result = facets.compute_facets(filters)
+
+        # Категории: без фильтра по категории, с ценой до 49.99 и наличием
+        assert result.categories == {
+            shelf['hops'].id: 4, shelf['aroma-hops'].id: 3, shelf['noble-hops'].id: 1,
+            shelf['malts'].id: 1,
+        }
+        # Цены: в выбранном поддереве и в наличии, без фильтра по цене
+        assert result.price_buckets == [2, 1, 0, 0, 0]
+        # Наличие: в поддереве и по цене, без фильтра по наличию
+        assert result.in_stock == 3
+
+    def test_search_narrows_facets(self, shelf):
+        result = facets.compute_facets(facets.CatalogFilters(search='noble'))
+
+        assert result.categories[shelf['hops'].id] == 2
+        assert shelf['malts'].id not in result.categories
+        assert result.price_buckets == [1, 0, 1, 0, 0]
+
+    def test_facets_are_cached_per_normalized_filters(self, shelf, django_assert_num_queries):
+        client = Client()
+        client.get('/products/', {'category': 'malts,hops', 'page': 1})
+        get_category_tree()
+
+        with django_assert_num_queries(0):
+            facets.get_facets(facets.CatalogFilters(
+                category_paths=tuple(sorted([shelf['hops'].path, shelf['malts'].path])),
+            ))
+
+    def test_list_applies_range_filters_and_renders_facets(self, shelf):
+        response = Client().get('/products/', {'price_min': '10', 'in_stock': 'true',
+                                               'price_max': 'oops'})
+
+        assert {p.slug for p in response.context['products']} == {'citra', 'pilsner'}
+        hops = response.context['category_facets'][0]
+        assert (hops['category'].slug, hops['count'], hops['selected']) == ('hops', 1, False)
+        assert hops['query'] == '?price_min=10&in_stock=true&price_max=oops&category=hops'
+        assert response.context['in_stock_facet']['selected'] is True
+        assert b'$25.00 - $49.99' in response.content
+
+    def test_api_range_filters(self, shelf):
+        client = APIClient()
+
+        response = client.get('/api/products/', {'price_min': 10, 'price_max': 100})
+        assert [item['slug'] for item in response.data['results']] == ['citra', 'saaz']
+
+        response = client.get('/api/products/', {'in_stock': 'false'})
+        assert [item['slug'] for item in response.data['results']] == ['saaz']
+
+        assert client.get('/api/products/', {'price_min': 'cheap'}).status_code == 400
+
+
+@pytest.mark.django_db
+class TestProductPagination:
+    @pytest.fixture
+    def many_products(self, db):
+        cat = Category.objects.create(name="Bulk", slug="bulk")
+        return Product.objects.bulk_create([
+            Product(name=f"Item {i}", slug=f"item-{i}", price=1, category=cat, description="")
+            for i in range(25)
+        ])
+
+    def test_page_numbers_still_work(self, many_products):
+        response = APIClient().get('/api/products/', {'page': 3})
+
+        assert response.data['count'] == 25
+        assert [p['id'] for p in response.data['results']] == [p.id for p in many_products[20:]]
+
+    def test_cursor_walks_forward_and_back(self, many_products):
+        client = APIClient()
+        response = client.get('/api/products/', {'cursor': ''})
+        assert 'count' not in response.data
+        assert response.data['previous'] is None
+
+        seen = [p['id'] for p in response.data['results']]
+        pages = [response]
+        while response.data['next']:
+            response = client.get(response.data['next'])
+            seen.extend(p['id'] for p in response.data['results'])
+            pages.append(response)
+        assert seen == [p.id for p in many_products]
+
+        back = client.get(pages[-1].data['previous'])
+        assert back.data['results'] == pages[-2].data['results']
+
+    def test_cursor_uses_no_count_or_offset(self, many_products):
+        first = APIClient().get('/api/products/', {'cursor': ''})
+
+        with CaptureQueriesContext(connection) as ctx:
+            APIClient().get(first.data['next'])
+
+        sql = ' '.join(q['sql'] for q in ctx.captured_queries)
+        assert 'COUNT(' not in sql
+        assert 'OFFSET' not in sql
+
+    def test_approximate_count_on_request(self, many_products):
+        response = APIClient().get('/api/products/', {'cursor': '', 'count': 'approximate'})
+
+        # Маленькие выборки считаются точно
+        assert response.data['count'] == 25
+
+    def test_invalid_cursor_is_not_found(self, many_products):
+        response = APIClient().get('/api/products/', {'cursor': 'not-a-cursor'})
+
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize('values', [['abc'], [None], [[1]], [{'id': 1}]])
+    def test_cursor_with_invalid_values_is_not_found(self, many_products, values):
+        payload = json.dumps({'v': values, 'r': False}).encode()
+        cursor = base64.urlsafe_b64encode(payload).decode()
+
+        response = APIClient().get('/api/products/', {'cursor': cursor})
+
+        assert response.status_code == 404
+
+
+@pytest.mark.django_db
+class TestProductReviews:
+    @pytest.fixture
+    def reviewed(self, db):
+        from reviews.models import Review
+        from users.models import User
+
+        cat = Category.objects.create(name="Hops", slug="hops")
+        products = Product.objects.bulk_create([
+            Product(name=f"Hop {i}", slug=f"hop-{i}", price=1, category=cat, description="")
+            for i in range(5)
+        ])
+        users = [User.objects.create_user(username=f"u{i}", password="x") for i in range(3)]
+        for product in products:
+            for i, user in enumerate(users):
+                Review.objects.create(product=product, user=user, rating=i + 3, text=f"r{i}")
+        return products
+
+    def test_list_returns_aggregates_in_constant_queries(self, reviewed):
+        with CaptureQueriesContext(connection) as ctx:
+            response = APIClient().get('/api/products/')
+
+        assert len(ctx.captured_queries) == 2  # COUNT и страница
+        item = response.data['results'][0]
+        assert 'reviews' not in item
+        assert item['rating_count'] == 3
+        assert item['rating_avg'] == '4.00'
+        assert item['rating_histogram'] == {'1': 0, '2': 0, '3': 1, '4': 1, '5': 1}
+
+    def test_reviews_endpoint_pages_newest_first(self, reviewed):
+        client = APIClient()
+        url = f'/api/products/{reviewed[0].id}/reviews/'
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url, {'page_size': 2})
+        assert len(ctx.captured_queries) == 2  # товар и страница отзывов с авторами
+        assert [r['user'] for r in response.data['results']] == ['u2', 'u1']
+
+        response = client.get(response.data['next'])
+        assert [r['user'] for r in response.data['results']] == ['u0']
+        assert response.data['next'] is None
+
+    def test_detail_page_shows_latest_three_reviews(self, reviewed):
+        with CaptureQueriesContext(connection) as ctx:
+            response = Client().get(f'/product/{reviewed[0].slug}/')
+
+        assert [r.text for r in response.context['latest_reviews']] == ['r2', 'r1', 'r0']
+        review_queries = [q['sql'] for q in ctx.captured_queries if 'reviews_review' in q['sql']]
+        assert len(review_queries) == 1
+
+
+@pytest.mark.django_db
+class TestCatalogResponseCache:
+    @pytest.fixture(autouse=True)
+    def locmem_cache(self, settings):
+        settings.CACHES = {
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'catalog-cache-tests',
+            }
+        }
+        settings.CATALOG_CACHE_TIMEOUT = 60
+
+    @pytest.fixture
+    def product(self, db):
+        cat = Category.objects.create(name="Hops", slug="hops")
+        return Product.objects.create(name="Citra", slug="citra", price=10, category=cat, stock=5)
+
+    def test_repeated_request_is_served_without_queries(self, product):
+        client = APIClient()
+        first = client.get('/api/products/')
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = client.get('/api/products/')
+
+        assert ctx.captured_queries == []
+        assert second.status_code == 200
+        assert second.content == first.content
+        assert second['Content-Type'] == 'application/json'
+
+    def test_not_modified_for_matching_etag(self, product):
+        client = APIClient()
+        etag = client.get(f'/api/products/{product.id}/')['ETag']
+
+        response = client.get(f'/api/products/{product.id}/', HTTP_IF_NONE_MATCH=etag)
+
+        assert etag.startswith('"')
+        assert response.status_code == 304
+        assert response.content == b''
+        assert client.get('/product/citra/', HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    def test_not_modified_for_page_with_csrf_token(self, product):
+        client = Client()
+        first = client.get('/product/citra/')
+
+        response = client.get('/product/citra/', HTTP_IF_NONE_MATCH=first['ETag'])
+
+        assert 'Cookie' in first['Vary']
+        assert response.status_code == 304
+        # Другой посетитель - другой CSRF-секрет, и чужой ETag ему не подходит
+        other = Client().get('/product/citra/', HTTP_IF_NONE_MATCH=first['ETag'])
+        assert other.status_code == 200
+
+    def test_not_modified_for_signed_in_user_until_cart_changes(self, product):
+        from users.models import User
+
+        client = Client()
+        client.force_login(User.objects.create_user(username="alice", password="x"))
+        etag = client.get('/products/')['ETag']
+
+        assert client.get('/products/', HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        client.post(f'/orders/cart/add/{product.id}/', {'quantity': 2})
+        response = client.get('/products/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert 'cart-badge' in response.content.decode()
+
+        bob = Client()
+        bob.force_login(User.objects.create_user(username="bob", password="x"))
+        assert bob.get('/products/', HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    def test_product_change_bumps_version(self, product):
+        client = APIClient()
+        etag = client.get('/api/products/')['ETag']
+
+        product.name = "Citra Cryo"
+        product.save()
+        response = client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 200
+        assert response.json()['results'][0]['name'] == "Citra Cryo"
+
+    def test_review_bumps_version(self, product):
+        from reviews.models import Review
+        from users.models import User
+
+        client = APIClient()
+        assert client.get(f'/api/products/{product.id}/').json()['rating_count'] == 0
+
+        user = User.objects.create_user(username="taster", password="x")
+        Review.objects.create(product=product, user=user, rating=5, text="Great")
+
+        assert client.get(f'/api/products/{product.id}/').json()['rating_count'] == 1
+
+    def test_user_fragments_stay_out_of_cached_page(self, product):
+        from users.models import User
+
+        alice = Client()
+        alice.force_login(User.objects.create_user(username="alice", password="x"))
+        alice.post(f'/orders/cart/add/{product.id}/', {'quantity': 2})
+        page = alice.get('/products/').content.decode()
+        assert 'alice' in page and 'cart-badge' in page
+
+        anonymous = Client().get('/products/').content.decode()
+        assert 'alice' not in anonymous and 'cart-badge' not in anonymous
+        assert 'Sign in' in anonymous
+
+        bob = Client()
+        bob.force_login(User.objects.create_user(username="bob", password="x"))
+        page = bob.get('/products/').content.decode()
+        assert 'bob' in page and 'alice' not in page and 'cart-badge' not in page
+
+    def test_csrf_token_is_rendered_per_request(self, product):
+        client = Client()
+        client.get('/product/citra/')
+        response = client.get('/product/citra/')
+
+        assert b'<!--per-request:' not in response.content
+        assert b'csrfmiddlewaretoken' in response.content
+
+    def test_browsable_api_is_not_cached(self, product):
+        client = APIClient()
+        client.get('/api/products/', HTTP_ACCEPT='text/html')
+
+        with CaptureQueriesContext(connection) as ctx:
+            client.get('/api/products/', HTTP_ACCEPT='text/html')
+
+        assert ctx.captured_queries != []
+
+
+@pytest.mark.django_db
+class TestRelatedProducts:
+    @pytest.fixture
+    def shop(self, db):
+        from users.models import User
+
+        cat = Category.objects.create(name="Hops", slug="hops")
+        products = Product.objects.bulk_create([
+            Product(name=f"Hop {i}", slug=f"hop-{i}", price=1, category=cat, description="")
+            for i in range(5)
+        ])
+        return User.objects.create_user(username="buyer", password="x"), products
+
+    @staticmethod
+    def order(user, *products, age=timedelta(hours=1)):
+        from orders.models import Order, OrderItem
+
+        order = Order.objects.create(user=user, total_price=1)
+        Order.objects.filter(id=order.id).update(created_at=timezone.now() - age)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, price=1) for product in products
+        ])
+        return order
+
+    @staticmethod
+    def neighbours(product):
+        return list(RelatedProduct.objects.filter(product=product)
+                    .values_list('related__slug', 'co_purchases'))
+
+    def test_numpy_and_python_agree(self):
+        np = pytest.importorskip('numpy')
+        rng = np.random.default_rng(0)
+        lines = list(zip(rng.integers(0, 300, 3000).tolist(), rng.integers(0, 40, 3000).tolist()))
+
+        for targets in (None, [3, 7, 39, 1000]):
+            assert (related._top_neighbours_numpy(iter(lines), targets, 5)
+                    == related._top_neighbours_python(iter(lines), targets, 5))
+
+    def test_full_refresh_ranks_by_co_purchases(self, shop):
+        user, (a, b, c, d, e) = shop
+        self.order(user, a, b, c)
+        self.order(user, a, b)
+        self.order(user, a, c, d)
+
+        run = related.refresh_related_products()
+
+        assert run.full
+        assert self.neighbours(a) == [('hop-1', 2), ('hop-2', 2), ('hop-3', 1)]
+        assert self.neighbours(d) == [('hop-0', 1), ('hop-2', 1)]
+        assert self.neighbours(e) == []
+
+    def test_incremental_refresh_recomputes_products_from_new_orders(self, shop):
+        user, (a, b, c, d, e) = shop
+        self.order(user, a, b)
+        self.order(user, c, d)
+        related.refresh_related_products()
+
+        self.order(user, a, e)
+        self.order(user, a, e)
+        run = related.refresh_related_products()
+
+        assert not run.full
+        assert run.products_updated == 2
+        assert self.neighbours(a) == [('hop-4', 2), ('hop-1', 1)]
+        assert self.neighbours(e) == [('hop-0', 2)]
+        assert self.neighbours(c) == [('hop-3', 1)]
+
+    def test_archived_orders_count_as_purchases(self, shop):
+        from orders.archive import archive
+        from orders.models import ArchivedOrder, Order
+
+        user, (a, b, c, d, e) = shop
+        self.order(user, a, b)
+        self.order(user, a, b)
+        Order.objects.update(status='delivered')
+        assert archive(timezone.now()) == 2
+        self.order(user, a, c)
+
+        related.refresh_related_products(full=True)
+        assert self.neighbours(a) == [('hop-1', 2), ('hop-2', 1)]
+
+        self.order(user, a, d)
+        related.refresh_related_products()
+        assert ArchivedOrder.objects.count() == 2
+        assert self.neighbours(a) == [('hop-1', 2), ('hop-2', 1), ('hop-3', 1)]
+        assert self.neighbours(b) == [('hop-0', 2)]
+
+    def test_detail_page_prefers_co_purchases(self, shop):
+        user, (a, b, c, d, e) = shop
+        self.order(user, a, e)
+        RelatedProduct.objects.create(product=a, related=e, position=0, co_purchases=1)
+
+        response = Client().get('/product/hop-0/')
+        with CaptureQueriesContext(connection) as ctx:
+            assert list(response.context['related_products']) == [e]
+        assert len(ctx.captured_queries) == 1
+
+        response = Client().get('/product/hop-1/')
+        assert list(response.context['related_products']) == [a, c, d, e]
+
+
+@pytest.mark.django_db
+class TestCatalogImportExport:
+    @pytest.fixture(params=['bulk', 'copy'])
+    def use_copy(self, request):
+        if request.param == 'copy' and connection.vendor != 'postgresql':
+            pytest.skip("COPY is PostgreSQL-only")
+        return request.param == 'copy'
+
+    @pytest.fixture
+    def hops(self, db):
+        cat = Category.objects.create(name="Hops", slug="hops")
+        Product.objects.create(name="Citra", slug="citra", price=10, stock=5, category=cat,
+                               description="Tropical aroma hop")
+        return cat
+
+    @staticmethod
+    def run_import(text, use_copy, fmt='csv', chunk_size=2):
+        return catalog_io.import_catalog(io.StringIO(text), fmt, chunk_size=chunk_size,
+                                         use_copy=use_copy)
+
+    def test_creates_products_with_unique_slugs(self, hops, use_copy):
+        Category.objects.create(name="Malt", slug="malt")
+        result = self.run_import(
+            "name,category,price,stock\n"
+            "Citra,hops,12.50,3\n"
+            "Citra!,Hops,13,\n"
+            "Pale Ale Malt,MALT,2.10,40\n",
+            use_copy,
+        )
+
+        assert (result.created, result.updated, result.skipped) == (3, 0, 0)
+        products = {p.slug: p for p in Product.objects.select_related('category')}
+        assert products['citra'].price == 10
+        assert products['citra-2'].price == Decimal('12.50')
+        assert products['citra-3'].stock == 0
+        assert products['citra-3'].is_active
+        assert products['pale-ale-malt'].category.slug == 'malt'
+        assert products['pale-ale-malt'].description == ''
+
+    def test_sync_updates_only_given_columns(self, hops, use_copy):
+        Product.objects.create(name="Mosaic", slug="mosaic", price=20, stock=0, category=hops,
+                               description="Berry")
+        result = self.run_import(
+            "slug,price,stock\n"
+            "citra,11.00,\n"
+            "mosaic,20,7\n"
+            "mosaic,20.00,8\n"
+            "citra,10,5\n",
+            use_copy, chunk_size=10,
+        )
+
+        # Повторы slug в пачке сливаются; citra в итоге не изменилась
+        assert (result.created, result.updated, result.unchanged) == (0, 1, 1)
+        citra = Product.objects.get(slug='citra')
+        mosaic = Product.objects.get(slug='mosaic')
+        assert (citra.price, citra.stock, citra.description) == (10, 5, "Tropical aroma hop")
+        assert (mosaic.price, mosaic.stock, mosaic.name) == (20, 8, "Mosaic")
+
+    def test_repeated_slugs_apply_in_file_order_across_chunks(self, hops, use_copy):
+        result = self.run_import(
+            "slug,name,price,stock\n"
+            "citra,,11.00,\n"
+            "citra,Citra Cryo,,\n"
+            "citra,,,9\n",
+            use_copy, chunk_size=1,
+        )
+
+        assert (result.created, result.skipped) == (0, 0)
+        citra = Product.objects.get(slug='citra')
+        assert (citra.name, citra.price, citra.stock) == ("Citra Cryo", Decimal('11.00'), 9)
+
+    def test_invalid_rows_are_skipped_with_line_numbers(self, hops, use_copy):
+        result = self.run_import(
+            '{"slug": "citra", "price": "9.99", "is_active": false}\n'
+            '\n'
+            '{"name": "Galaxy", "category": "yeast", "price": 5}\n'
+            '{"slug": "simcoe", "price": "abc"}\n'
+            'not json\n'
+            '{"slug": "simcoe", "price": 7}\n'
+            '{"name": "Saaz", "category": "hops", "price": "4.5", "stock": -1}\n',
+            use_copy, fmt='jsonl',
+        )
+
+        assert (result.updated, result.created, result.skipped) == (1, 0, 5)
+        assert result.errors == [
+            (3, "Unknown category 'yeast'"),
+            (4, "Invalid price 'abc'"),
+            (5, "Empty or malformed row"),
+            (7, "Invalid stock -1"),
+            (6, "New product 'simcoe' requires name, category"),
+        ]
+        citra = Product.objects.get(slug='citra')
+        assert (citra.price, citra.is_active) == (Decimal('9.99'), False)
+
+    def test_import_invalidates_catalog_cache(self, hops, use_copy):
+        version = get_catalog_version()
+        self.run_import("slug,stock\ncitra,5\n", use_copy)
+        assert get_catalog_version() == version
+
+        self.run_import("slug,stock\ncitra,6\n", use_copy)
+        assert get_catalog_version() != version
+
+    def test_export_import_round_trip(self, hops, tmp_path):
+        Product.objects.create(name="Mosaic\tBlend", slug="mosaic", price=20, category=hops,
+                               description='Line one\nline "two"', is_active=False)
+        exported = {}
+        for fmt in catalog_io.FORMATS:
+            path = tmp_path / f'catalog.{fmt}'
+            call_command('catalog_export', str(path), stdout=io.StringIO())
+            exported[fmt] = path
+
+        jsonl = [json.loads(line) for line in exported['jsonl'].read_text().splitlines()]
+        assert jsonl[1] == {
+            'slug': 'mosaic', 'name': 'Mosaic\tBlend', 'category': 'hops',
+            'description': 'Line one\nline "two"', 'price': '20.00', 'stock': 0,
+            'is_active': False,
+        }
+
+        Product.objects.all().delete()
+        out = io.StringIO()
+        call_command('catalog_import', str(exported['csv']), stdout=out, stderr=io.StringIO())
+
+        assert out.getvalue().strip() == "Created 2, updated 0, unchanged 0, skipped 0"
+        mosaic = Product.objects.get(slug='mosaic')
+        assert (mosaic.name, mosaic.description, mosaic.is_active) == (
+            "Mosaic\tBlend", 'Line one\nline "two"', False,
+        )
+
+    def test_export_selected_fields_to_stdout(self, hops):
+        out = io.StringIO()
+        call_command('catalog_export', '--fields', 'slug,price,stock', '--format', 'csv',
+                     stdout=out, stderr=io.StringIO())
+
+        assert out.getvalue().splitlines() == ['slug,price,stock', 'citra,10.00,5']
@@ -1,11 +1,24 @@
-from django.db.models import Q, QuerySet
+from django.db.models import QuerySet
+from django.utils.decorators import method_decorator
+from django.utils.functional import SimpleLazyObject
 from django.views.generic import DetailView, ListView, TemplateView
+from django_filters.rest_framework import DjangoFilterBackend
+from drf_spectacular.utils import extend_schema
 from rest_framework import viewsets
+from rest_framework.decorators import action
 
-from .models import Category, Product
-from .serializers import ProductSerializer
+from config.pagination import HybridPagination, KeysetPagination
 
+from .cache import cache_catalog_response
+from .category_tree import get_category_tree
+from .facets import CatalogFilters, category_filter, get_facets, price_buckets
+from .filters import ProductFilterSet, ProductRangeFilterSet, ProductSearchFilter
+from .models import Product, RelatedProduct
+from .search import search_products, search_terms
+from .serializers import ProductSerializer, ReviewSerializer
 
+
+@method_decorator(cache_catalog_response, name='dispatch')
 class HomeView(TemplateView):
     template_name = 'base.html'
 
@@ -16,6 +29,7 @@ class HomeView(TemplateView):
         return context
 
 
+@method_decorator(cache_catalog_response, name='dispatch')
 class ProductListView(ListView):
     model = Product
     template_name = 'product_list.html'  # 👈 ИЗМЕНИТЬ С 'base.html'!
@@ -23,62 +37,169 @@ class ProductListView(ListView):
     paginate_by = 12
 
     def get_queryset(self):
-        queryset = Product.objects.filter(is_active=True).select_related('category')
-
-        search = self.request.GET.get('search')
+        # Стабильный порядок страниц; поиск заменяет его сортировкой по релевантности
+        queryset = Product.objects.filter(is_active=True).select_related('category').order_by('id')
+        filterset = ProductRangeFilterSet(self.request.GET, queryset=queryset)
+        queryset = filterset.qs
+        # Невалидные значения диапазонов не попадают в cleaned_data и игнорируются
+        ranges = filterset.form.cleaned_data
+
+        search = self.request.GET.get('search', '').strip()
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | Q(description__icontains=search)
-            )
+            queryset = search_products(queryset, search)
 
+        paths = None
         category = self.request.GET.get('category')
         if category:
-            queryset = queryset.filter(category__slug=category)
-
+            paths = self.category_paths(category.split(','))
+            queryset = queryset.filter(category_filter(paths)) if paths else queryset.none()
+
+        self.filters = CatalogFilters(
+            search=' '.join(search_terms(search)) if search else None,
+            category_paths=paths,
+            price_min=ranges.get('price_min'),
+            price_max=ranges.get('price_max'),
+            in_stock=ranges.get('in_stock'),
+        )
         return queryset
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
-        context['current_category'] = self.request.GET.get('category')
-        context['search_query'] = self.request.GET.get('search')
-        return context
+    @staticmethod
+    def category_paths(values):
+        """
+        Пути выбранных категорий по slug или названию из закэшированного
+        дерева; товары потом выбираются одним запросом по индексу path.
+        """
+        tree = get_category_tree()
+        return tuple(sorted({category.path for category in map(tree.find, values) if category}))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+        context['categories'] = get_category_tree().categories
         context['current_category'] = self.request.GET.get('category')
         context['search_query'] = self.request.GET.get('search')
         context['is_products_page'] = True
+        context.update(self.get_facet_context(get_facets(self.filters)))
         return context
 
-
+    def get_facet_context(self, facets):
+        """Пункты боковой панели: счётчик, выбран ли пункт и ссылка-переключатель."""
+        tree = get_category_tree()
+        params = self.request.GET
+        selected_slugs = [slug for slug in params.get('category', '').split(',') if slug]
+        selected_paths = self.filters.category_paths or ()
+
+        category_facets = []
+        for category in tree.categories:
+            selected = category.path in selected_paths
+            slugs = [slug for slug in selected_slugs if tree.find(slug) != category]
+            if not selected:
+                slugs.append(category.slug)
+            category_facets.append({
+                'category': category,
+                'depth': category.path.count('/') - 1,
+                'count': facets.categories.get(category.id, 0),
+                'selected': selected,
+                'query': _toggle_query(params, category=','.join(slugs)),
+            })
+
+        price_facets = []
+        for bucket, count in zip(price_buckets(), facets.price_buckets):
+            selected = (bucket.price_min == self.filters.price_min
+                        and bucket.price_max == self.filters.price_max)
+            bounds = {'price_min': None, 'price_max': None} if selected else {
+                'price_min': bucket.price_min, 'price_max': bucket.price_max,
+            }
+            price_facets.append({
+                'label': bucket.label, 'count': count, 'selected': selected,
+                'query': _toggle_query(params, **bounds),
+            })
+
+        in_stock_selected = self.filters.in_stock is True
+        return {
+            'category_facets': category_facets,
+            'price_facets': price_facets,
+            'in_stock_facet': {
+                'count': facets.in_stock,
+                'selected': in_stock_selected,
+                'query': _toggle_query(params, in_stock=None if in_stock_selected else 'true'),
+            },
+        }
+
+
+def _toggle_query(params, **changes) -> str:
+    """Строка запроса с изменёнными параметрами (None или '' - убрать) и первой страницей."""
+    query = params.copy()
+    query.pop('page', None)
+    for name, value in changes.items():
+        if value is None or value == '':
+            query.pop(name, None)
+        else:
+            query[name] = str(value)
+    return f'?{query.urlencode()}' if query else '?'
+
+
+@method_decorator(cache_catalog_response, name='dispatch')
 class ProductDetailView(DetailView):
     model = Product
+    queryset = Product.objects.select_related('category')
     template_name = 'product_detail.html'  # 👈 Это правильно!
     context_object_name = 'product'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Добавляем похожие товары из той же категории
-        context['related_products'] = Product.objects.filter(
-            category=self.object.category,
-            is_active=True
-        ).exclude(id=self.object.id)[:4]
+        # Ленивое значение: запрос выполняется, только если шаблон выводит блок
+        context['related_products'] = SimpleLazyObject(self.get_related_products)
+        # Три последних отзыва одним запросом по индексу (product, -created_at, -id)
+        context['latest_reviews'] = list(
+            self.object.reviews.select_related('user').order_by('-created_at', '-id')[:3]
+        )
         return context
 
+    def get_related_products(self, limit: int = 4):
+        """
+        Товары, которые покупают вместе с этим (RelatedProduct, одним запросом
+        по индексу product, position), а если их ещё нет - товары той же категории.
+        """
+        links = (
+            RelatedProduct.objects.filter(product=self.object, related__is_active=True)
+            .select_related('related')
+            .order_by('position')[:limit]
+        )
+        related = [link.related for link in links]
+        if related:
+            return related
+        return list(
+            Product.objects.filter(category=self.object.category, is_active=True)
+            .exclude(id=self.object.id)[:limit]
+        )
+
 
 class GuidesRecipesView(TemplateView):
     template_name = 'guides-recipes.html'
 
 
+class ReviewPagination(KeysetPagination):
+    """Новые отзывы первыми."""
+    ordering = ('-created_at', '-id')
+
+
+@method_decorator(cache_catalog_response, name='dispatch')
 class ProductViewSet(viewsets.ModelViewSet):
     """
     API эндпоинт для просмотра и поиска товаров.
     """
     serializer_class = ProductSerializer
-    filterset_fields = ['category', 'price']
-    search_fields = ['name', 'description']
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter]
+    pagination_class = HybridPagination
+    filterset_class = ProductFilterSet
 
     def get_queryset(self) -> QuerySet[Product]:
-        return Product.objects.filter(is_active=True).select_related('category')
\ No newline at end of file
+        return Product.objects.filter(is_active=True).select_related('category')
+
+    @extend_schema(responses=ReviewSerializer(many=True))
+    @action(detail=True, methods=['get'], pagination_class=ReviewPagination)
+    def reviews(self, request, pk=None):
+        """Отзывы о товаре, новые первыми, с пагинацией по курсору."""
+        product = self.get_object()
+        page = self.paginate_queryset(product.reviews.select_related('user'))
+        return self.get_paginated_response(ReviewSerializer(page, many=True).data)
@@ -0,0 +1,71 @@
+"""
+Агрегаты отзывов на строке товара: rating_count, rating_avg и гистограмма
+rating_1..rating_5.
+
+Каждое изменение отзыва превращается в дельты счётчиков гистограммы, которые
+применяются атомарным UPDATE ... SET rating_N = rating_N + d, после чего
+rating_count и rating_avg пересчитываются из гистограммы той же строки.
+Массовые операции над Review сигналов не шлют - после них нужно вызвать
+recalculate_rating_aggregates().
+"""
+from collections import Counter
+from typing import Dict, Iterable
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, FloatField, Value, When
+from django.db.models.functions import Cast
+
+from products.models import RATINGS, Product
+
+from .models import Review
+
+AVG_FIELD = DecimalField(max_digits=3, decimal_places=2)
+
+
+def apply_rating_deltas(product_id: int, deltas: Dict[int, int]) -> None:
+    """Изменить гистограмму товара на deltas ({оценка: +/-n}) и пересчитать итоги."""
+    deltas = {rating: delta for rating, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        Product.objects.filter(id=product_id).update(**{
+            f'rating_{rating}': F(f'rating_{rating}') + delta for rating, delta in deltas.items()
+        })
+        _update_totals(Product.objects.filter(id=product_id))
+
+
+def recalculate_rating_aggregates(product_ids: Iterable[int] = None) -> None:
+    """Полный пересчёт агрегатов по таблице отзывов (для миграций и массовых правок)."""
+    products = Product.objects.all()
+    reviews = Review.objects.all()
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        products = products.filter(id__in=product_ids)
+        reviews = reviews.filter(product_id__in=product_ids)
+
+    histograms: Dict[int, Counter] = {}
+    for row in reviews.values('product_id', 'rating').annotate(n=Count('id')).order_by():
+        histograms.setdefault(row['product_id'], Counter())[row['rating']] = row['n']
+
+    with transaction.atomic():
+        products.update(**{f'rating_{rating}': 0 for rating in RATINGS})
+        for product_id, histogram in histograms.items():
+            Product.objects.filter(id=product_id).update(**{
+                f'rating_{rating}': histogram.get(rating, 0) for rating in RATINGS
+            })
+        _update_totals(products)
+
+
+def _update_totals(products) -> None:
+    count = sum((F(f'rating_{rating}') for rating in RATINGS), Value(0))
+    weighted = sum((F(f'rating_{rating}') * rating for rating in RATINGS), Value(0))
+    products.update(
+        rating_count=count,
+        rating_avg=Case(
+            When(**{f'rating_{rating}': 0 for rating in RATINGS}, then=Value(0)),
+            # Делим в float: сумма не помещается в numeric(3, 2), а SQLite
+            # делит целые нацело; колонка сама округляет до сотых
+            default=Cast(weighted, FloatField()) / count,
+            output_field=AVG_FIELD,
+        ),
+    )
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:31
+
+import django.core.validators
+from django.conf import settings
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_aggregates(apps, schema_editor):
+    """Посчитать агрегаты оценок для уже существующих отзывов."""
+    Product = apps.get_model('products', 'Product')
+    Review = apps.get_model('reviews', 'Review')
+
+    histograms = {}
+    rows = Review.objects.values('product_id', 'rating').annotate(n=Count('id')).order_by()
+    for row in rows:
+        histograms.setdefault(row['product_id'], {})[row['rating']] = row['n']
+
+    for product_id, histogram in histograms.items():
+        count = sum(histogram.values())
+        weighted = sum(rating * n for rating, n in histogram.items())
+        Product.objects.filter(id=product_id).update(
+            rating_count=count,
+            rating_avg=(Decimal(weighted) / count).quantize(Decimal('0.01')),
+            **{f'rating_{rating}': histogram.get(rating, 0) for rating in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_review_aggregates'),
+        ('reviews', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='review',
+            name='rating',
+            field=models.PositiveSmallIntegerField(
+                choices=[(1, '1'), (2, '2'), (3, '3'), (4, '4'), (5, '5')],
+                validators=[
+                    django.core.validators.MinValueValidator(1),
+                    django.core.validators.MaxValueValidator(5),
+                ],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(
+                fields=['product', '-created_at', '-id'], name='reviews_product_created_idx'
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.CheckConstraint(
+                condition=models.Q(('rating__gte', 1), ('rating__lte', 5)), name='review_rating_1_5'
+            ),
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
@@ -1,17 +1,35 @@
 from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
-from products.models import Product
+from products.models import RATINGS, Product
 
 User = settings.AUTH_USER_MODEL
 
 
 class Review(models.Model):
+    RATING_CHOICES = [(rating, str(rating)) for rating in RATINGS]
+
     product = models.ForeignKey(Product, related_name="reviews", on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    rating = models.PositiveSmallIntegerField()
+    rating = models.PositiveSmallIntegerField(
+        choices=RATING_CHOICES, validators=[MinValueValidator(1), MaxValueValidator(5)]
+    )
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Последние отзывы товара и курсоры /api/products/{id}/reviews/
+            models.Index(
+                fields=['product', '-created_at', '-id'], name='reviews_product_created_idx'
+            ),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(rating__gte=1, rating__lte=5), name='review_rating_1_5'
+            ),
+        ]
+
     def __str__(self):
         return f"Review {self.rating}/5"
@@ -0,0 +1,38 @@
+"""Сигналы приложения отзывов: агрегаты оценок на товаре и версия кэша каталога."""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from products.cache import bump_catalog_version
+
+from .aggregates import apply_rating_deltas
+from .models import Review
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    """Запомнить товар и оценку до правки, чтобы вычесть их из агрегатов."""
+    instance._previous_rating = None
+    if instance.pk is not None:
+        instance._previous_rating = (
+            Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    if previous is not None and previous[0] != instance.product_id:
+        apply_rating_deltas(previous[0], {previous[1]: -1})
+        previous = None
+
+    deltas = {instance.rating: 1}
+    if previous is not None:
+        deltas[previous[1]] = deltas.get(previous[1], 0) - 1
+    apply_rating_deltas(instance.product_id, deltas)
+    bump_catalog_version()
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    apply_rating_deltas(instance.product_id, {instance.rating: -1})
+    bump_catalog_version()
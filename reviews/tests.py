@@ -1,3 +1,83 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+import pytest
+
+from products.models import Category, Product
+from users.models import User
+
+from .aggregates import recalculate_rating_aggregates
+from .models import Review
+
+
+@pytest.fixture
+def product(db):
+    cat = Category.objects.create(name="Hops", slug="hops")
+    return Product.objects.create(name="Citra", slug="citra", price=10, category=cat)
+
+
+@pytest.fixture
+def author(db):
+    return User.objects.create_user(username='critic', password='secret')
+
+
+def aggregates(product):
+    product.refresh_from_db()
+    return product.rating_count, product.rating_avg, product.rating_histogram
+
+
+@pytest.mark.django_db
+class TestRatingAggregates:
+    def test_create_updates_count_average_and_histogram(self, product, author):
+        Review.objects.create(product=product, user=author, rating=5, text="Great")
+        Review.objects.create(product=product, user=author, rating=4, text="Good")
+        Review.objects.create(product=product, user=author, rating=4, text="Fine")
+
+        assert aggregates(product) == (
+            3, Decimal('4.33'), {1: 0, 2: 0, 3: 0, 4: 2, 5: 1}
+        )
+
+    def test_edit_moves_rating_between_buckets(self, product, author):
+        review = Review.objects.create(product=product, user=author, rating=2, text="Meh")
+
+        review.rating = 5
+        review.save()
+
+        assert aggregates(product) == (1, Decimal('5.00'), {1: 0, 2: 0, 3: 0, 4: 0, 5: 1})
+
+    def test_moving_review_to_another_product(self, product, author):
+        other = Product.objects.create(name="Mosaic", slug="mosaic", price=10,
+                                       category=product.category)
+        review = Review.objects.create(product=product, user=author, rating=3, text="Ok")
+
+        review.product = other
+        review.save()
+
+        assert aggregates(product)[:2] == (0, Decimal('0.00'))
+        assert aggregates(other)[:2] == (1, Decimal('3.00'))
+
+    def test_delete_decrements(self, product, author):
+        review = Review.objects.create(product=product, user=author, rating=1, text="Bad")
+        Review.objects.create(product=product, user=author, rating=3, text="Ok")
+
+        review.delete()
+
+        assert aggregates(product) == (1, Decimal('3.00'), {1: 0, 2: 0, 3: 1, 4: 0, 5: 0})
+
+    def test_product_edit_keeps_aggregates(self, product, author):
+        Review.objects.create(product=product, user=author, rating=4, text="Good")
+        # Экземпляр загружен до отзыва (форма админки, PUT в API): агрегаты в нём нулевые
+        product.name = "Citra 2026"
+        product.save()
+
+        assert aggregates(product) == (1, Decimal('4.00'), {1: 0, 2: 0, 3: 0, 4: 1, 5: 0})
+        assert product.name == "Citra 2026"
+
+    def test_recalculate_matches_incremental(self, product, author):
+        Review.objects.bulk_create([
+            Review(product=product, user=author, rating=rating, text="") for rating in (1, 5, 5)
+        ])
+        assert aggregates(product)[0] == 0  # bulk_create сигналов не шлёт
+
+        recalculate_rating_aggregates([product.id])
+
+        assert aggregates(product) == (3, Decimal('3.67'), {1: 1, 2: 0, 3: 0, 4: 0, 5: 2})
@@ -1,3 +1,122 @@
-from django.test import TestCase
+import base64
+import json
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+import pytest
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from orders.models import Order
+from orders.stats import rebuild
+
+from .models import User
+
+
+@pytest.fixture
+def customer(db):
+    return User.objects.create_user(username='wholesale', password='secret')
+
+
+def place_orders(user, count):
+    """count заказов с разными датами, новые - с большими id."""
+    start = timezone.now() - timedelta(days=count)
+    orders = Order.objects.bulk_create([Order(user=user, total_price=Decimal('10.00'))
+                                        for _ in range(count)])
+    for index, order in enumerate(orders):
+        order.created_at = start + timedelta(hours=index)
+    Order.objects.bulk_update(orders, ['created_at'])
+    rebuild([user.id])
+    return orders
+
+
+def client_for(user):
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+@pytest.mark.django_db
+class TestAccountOrderHistory:
+    @pytest.mark.parametrize('url', ['/users/account/', '/users/profile/'])
+    def test_cursor_pages_walk_history_newest_first(self, customer, url):
+        orders = place_orders(customer, 45)
+        place_orders(User.objects.create_user(username='other'), 3)
+        client = client_for(customer)
+
+        pages = [client.get(url).context]
+        while pages[-1]['next_page_url']:
+            pages.append(client.get(pages[-1]['next_page_url']).context)
+
+        assert [len(page['orders']) for page in pages] == [20, 20, 5]
+        seen = [order.id for page in pages for order in page['orders']]
+        assert seen == [order.id for order in reversed(orders)]
+        assert pages[0]['previous_page_url'] is None
+        back = client.get(pages[-1]['previous_page_url']).context
+        assert [order.id for order in back['orders']] == seen[20:40]
+
+    def test_header_reads_stats_row(self, customer):
+        orders = place_orders(customer, 3)
+        Order.objects.filter(id=orders[0].id).update(status='cancelled')
+        rebuild([customer.id])
+
+        response = client_for(customer).get('/users/account/')
+
+        stats = response.context['order_stats']
+        assert (stats.order_count, stats.total_spent) == (3, Decimal('20.00'))
+        assert b'$20.00' in response.content
+
+    def test_no_orders(self, customer):
+        response = client_for(customer).get('/users/account/')
+
+        assert response.context['order_stats'].order_count == 0
+        assert b"You haven't placed any orders yet." in response.content
+
+    def test_invalid_cursor_is_not_found(self, customer):
+        response = client_for(customer).get('/users/account/', {'cursor': 'garbage'})
+
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize('url', ['/users/account/', '/users/profile/'])
+    @pytest.mark.parametrize('archived', ['', '1'])
+    def test_cursor_with_invalid_values_is_not_found(self, customer, url, archived):
+        place_orders(customer, 3)
+        payload = json.dumps({'v': ['abc', None], 'r': False}).encode()
+        cursor = base64.urlsafe_b64encode(payload).decode()
+
+        response = client_for(customer).get(url, {'cursor': cursor, 'archived': archived})
+
+        assert response.status_code == 404
+
+    def test_queries_do_not_grow_with_history(self, customer):
+        client = client_for(customer)
+        counts = []
+        for added in (5, 495):
+            place_orders(customer, added)
+            client.get('/users/account/')
+            with CaptureQueriesContext(connection) as ctx:
+                client.get('/users/account/')
+            counts.append(len(ctx.captured_queries))
+
+        assert counts[0] == counts[1]
+
+    def test_archived_history(self, customer):
+        from orders.archive import archive
+
+        orders = place_orders(customer, 3)
+        Order.objects.filter(id__in=[orders[0].id, orders[1].id]).update(status='delivered')
+        archive(before=timezone.now())
+        client = client_for(customer)
+
+        response = client.get('/users/account/')
+        assert [order.id for order in response.context['orders']] == [orders[2].id]
+        assert b'?archived=1' in response.content
+        assert response.context['order_stats'].order_count == 3
+
+        response = client.get('/users/account/', {'archived': 1})
+        assert [order.id for order in response.context['orders']] == [
+            orders[1].id, orders[0].id
+        ]
+        assert b'Back to recent orders' in response.content
@@ -2,12 +2,17 @@
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
+from django.http import Http404
 from django.shortcuts import render, redirect
 from django.urls import reverse_lazy
 from django.views.decorators.http import require_POST
 from django.views.generic import CreateView, TemplateView
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
 
-from orders.models import Order
+from config.pagination import KeysetPagination
+from orders.models import ArchivedOrder, Order, UserOrderStats
+from orders.views import OrderPagination
 from .forms import RegisterForm
 
 
@@ -78,25 +83,50 @@ def logout_view(request):
     return redirect('home')
 
 
-class ProfileView(LoginRequiredMixin, TemplateView):
-    template_name = 'account.html'
+class OrderHistoryPagination(KeysetPagination):
+    """История заказов в кабинете: та же сортировка и индекс, что у курсоров API."""
+    ordering = OrderPagination.ordering
+    page_size = 20
+
+
+class OrderHistoryMixin:
+    """
+    Страница истории заказов по курсору (?cursor=) и сводка UserOrderStats
+    для шапки - вместо всех заказов пользователя и агрегации по ним.
+    ?archived=1 - та же история по архиву заказов (orders.archive).
+    """
+    pagination_class = OrderHistoryPagination
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['orders'] = Order.objects.filter(user=self.request.user).order_by('-created_at')
+        user = self.request.user
+        paginator = self.pagination_class()
+        archived = self.request.GET.get('archived') in ('1', 'true')
+        orders = (ArchivedOrder if archived else Order).objects.filter(user=user).only(
+            'id', 'status', 'total_price', 'created_at'
+        )
+        try:
+            context['orders'] = paginator.paginate_queryset(orders, Request(self.request))
+        except NotFound:
+            raise Http404(paginator.invalid_cursor_message)
+        context['next_page_url'] = paginator.get_next_link()
+        context['previous_page_url'] = paginator.get_previous_link()
+        context['archived'] = archived
+        context['has_archived_orders'] = (
+            not archived and ArchivedOrder.objects.filter(user=user).exists()
+        )
+        context['order_stats'] = (
+            UserOrderStats.objects.filter(user=user).first() or UserOrderStats(user=user)
+        )
         return context
 
 
-class AccountView(LoginRequiredMixin, TemplateView):
+class ProfileView(LoginRequiredMixin, OrderHistoryMixin, TemplateView):
     template_name = 'account.html'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        # Загружаем заказы ТОЛЬКО текущего пользователя
-        context['orders'] = Order.objects.filter(
-            user=self.request.user
-        ).order_by('-created_at')
-        return context
+
+class AccountView(LoginRequiredMixin, OrderHistoryMixin, TemplateView):
+    template_name = 'account.html'
 
     def post(self, request):
         """Обновление информации пользователя"""